@@ -0,0 +1,121 @@
+"""
+This script benchmarks the RP_ENTITY_ID validation paths on synthetic records.
+
+It times the per-record path (`validate_rp_entity_id` called on each record), the
+`RecordValidator` bulk path and, when NumPy is installed, the columnar `validate_record_batch`,
+and checks that all of them return the same errors. It then prints the per-rule timing
+counters of a RecordValidator.
+
+Usage:
+    python benchmarks/validation_benchmark.py [--records N] [--repeat R]
+"""
+
+import argparse
+import random
+import string
+import sys
+import timeit
+from pathlib import Path
+
+# The benchmark runs from a checkout, importing the application like the tests do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# pylint: disable=wrong-import-position
+from src.helpers.columnar import batch_records, np, validate_record_batch
+from src.utils.validation import RecordValidator, validate_rp_entity_id
+
+
+def make_records(count, error_rate=0.05, seed=0):
+    """
+    Builds synthetic feed records, a share of which have an invalid field.
+
+    Args:
+        count (int): The number of records.
+        error_rate (float): The share of records with an error.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        list: The records.
+    """
+    rng = random.Random(seed)
+    alphabet = string.ascii_uppercase + string.digits
+    invalid_values = [None, "", "   ", "abc123", "ABC1234", " AB12 ", 12345]
+    records = []
+
+    for position in range(count):
+        record = {
+            "RP_DOCUMENT_ID": f"DOC{position // 10}",
+            "RP_ENTITY_ID": "".join(rng.choices(alphabet, k=6)),
+            "DOCUMENT_RECORD_INDEX": position % 10 + 1,
+            "DOCUMENT_RECORD_COUNT": 10,
+        }
+        if rng.random() < error_rate:
+            field = rng.choice(["RP_DOCUMENT_ID", "RP_ENTITY_ID"])
+            record[field] = rng.choice(invalid_values)
+        records.append(record)
+
+    return records
+
+
+def per_record(records):
+    """
+    Validates the records one at a time, the way the pipeline used to.
+
+    Args:
+        records (list): The records.
+
+    Returns:
+        list: The errors.
+    """
+    errors = []
+    for record in records:
+        error = validate_rp_entity_id(record)
+        if error:
+            errors.append(error)
+    return errors
+
+
+def main():
+    """
+    Runs the benchmark and prints the best time of each validation path.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the RP_ENTITY_ID validation")
+    parser.add_argument("--records", type=int, default=200000, help="Number of records")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+    args = parser.parse_args()
+
+    records = make_records(args.records)
+    validator = RecordValidator()
+    paths = {
+        "per record": lambda: per_record(records),
+        "RecordValidator": lambda: validator.validate(records),
+    }
+    if np is not None:
+        batches = list(batch_records(records))
+        paths["columnar batches"] = lambda: [
+            error for batch in batches for error in validate_record_batch(batch)
+        ]
+
+    expected = per_record(records)
+    baseline = None
+    print(f"{args.records} records, {len(expected)} errors, best of {args.repeat} runs")
+
+    for name, path in paths.items():
+        if path() != expected:
+            raise AssertionError(f"{name} returned different errors")
+        best = min(timeit.repeat(path, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f"{name:>18}: {best * 1000:8.1f} ms ({baseline / best:.2f}x)")
+
+    # The time spent in each rule, measured by a validator with timing counters
+    timed_validator = RecordValidator(timing=True)
+    timed_validator.validate(records)
+    for name, counters in timed_validator.counters.items():
+        print(
+            f"rule {name}: {counters['checks']} checks, {counters['errors']} errors, "
+            f"{counters['seconds'] * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -5,37 +5,513 @@ The DataProcessor class includes methods for validating document IDs, counting d
 checking for missing or invalid document record indices, handling duplicate entries, and identifying
 and logging any records with inconsistent counts or invalid indices.
 
+Records can either be handed over as a list and processed with `process_analytics`, or streamed
+from any iterable with `process_stream`. Both run every check in a single pass over the records.
+
+The PartialAnalytics class holds the same analysis as a mergeable state: it can be built on any
+shard of the feed, and merging the shards in order gives the results of a single run.
+
+Both keep the first record of every document index to tell identical and different duplicates
+apart. With `store_digests=True` they keep a 16-byte digest of the record instead. With
+`compact=True`, DataProcessor stores each document in a DocumentRecord, which tracks its
+indices in a bitmap (IndexSet) instead of Python sets.
+
+`DataProcessor.process_batch` processes a columnar RecordBatch (see `helpers.columnar`) at once,
+storing the records of documents without errors in bulk.
+
+An EvictionPolicy makes DataProcessor finalize documents while streaming, once they're complete
+or haven't been seen for a while, so that long-running ingestion doesn't keep every document.
+
 Attributes:
-    records (list): List of JSON records.
+    records (iterable): JSON records.
     document_records (dict): Dictionary to store document records.
     results (dict): Dictionary to store the results of the analysis.
 """
 
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+
+# The types of the values `normalize_digest_value` returns as they are
+DIGEST_PLAIN_TYPES = frozenset((str, int, type(None)))
+
+
+def record_digest(record):
+    """
+    Computes a stable digest of a record's content.
+
+    The record is serialized as canonical JSON (sorted keys, no whitespace), so records that
+    compare equal get the same digest whatever their key order. Values are normalized first
+    (see `normalize_digest_value`), so digests compare records like `==` does: `1`, `1.0` and
+    `True` are the same value.
+
+    Records that carry a precomputed `fingerprint` (such as the projected records of the
+    loader) are digested as that fingerprint.
+
+    Args:
+        record (dict): The record to digest.
+
+    Returns:
+        bytes: The 16-byte BLAKE2b digest of the record, or its fingerprint.
+    """
+    fingerprint = getattr(record, "fingerprint", None)
+    if fingerprint is not None:
+        return fingerprint
+
+    canonical = json.dumps(
+        normalize_digest_value(record),
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+def normalize_digest_value(value):
+    """
+    Normalizes a value of a record, so values that compare equal serialize the same way.
+
+    Integral floats (including `-0.0`) and booleans become integers, as `1 == 1.0 == True`.
+    NaN is kept, and serialized as `NaN`: the JSON decoders either reject it or parse every
+    NaN into the same float object, which records compare equal to (a container compares its
+    items by identity first), so two records holding NaN are as identical as their digests.
+
+    Args:
+        value: A value of a record, nested dictionaries and lists included.
+
+    Returns:
+        The normalized value. The other values are returned as they are.
+    """
+    value_type = type(value)
+    if value_type is float:
+        return int(value) if value.is_integer() else value
+    if value_type is bool:
+        return int(value)
+    # Most values are plain, they skip the call
+    if value_type is dict:
+        return {
+            key: item if type(item) in DIGEST_PLAIN_TYPES else normalize_digest_value(item)
+            for key, item in value.items()
+        }
+    if value_type is list or value_type is tuple:
+        return [
+            item if type(item) in DIGEST_PLAIN_TYPES else normalize_digest_value(item)
+            for item in value
+        ]
+    return value
+
+
+def is_valid_document_id(document_id):
+    """
+    Checks whether a document ID is a non-empty string.
+
+    Args:
+        document_id: The 'RP_DOCUMENT_ID' value of a record.
+
+    Returns:
+        bool: True if the document ID is valid, False otherwise.
+    """
+    return isinstance(document_id, str) and bool(document_id.strip())
+
+
+def is_invalid_document_count(record_count):
+    """
+    Checks whether a 'DOCUMENT_RECORD_COUNT' must be logged as an invalid document count.
+
+    Integers (and strings of digits) are invalid when they are zero or negative. Any other
+    value, including booleans, floats and non-numeric strings, is invalid.
+
+    Args:
+        record_count: The 'DOCUMENT_RECORD_COUNT' value of a record.
+
+    Returns:
+        bool: True if the count is invalid, False otherwise.
+    """
+    if isinstance(record_count, int) and not isinstance(record_count, bool):
+        return record_count <= 0
+    if isinstance(record_count, str) and record_count.isdigit():
+        return int(record_count) <= 0
+    return True
+
+
+def is_valid_record_count(record_count):
+    """
+    Checks whether a 'DOCUMENT_RECORD_COUNT' can be used as the expected count of a document.
+
+    Args:
+        record_count: The 'DOCUMENT_RECORD_COUNT' value of a record.
+
+    Returns:
+        bool: True if the count is a positive integer, False otherwise.
+    """
+    return isinstance(record_count, int) and not isinstance(record_count, bool) and record_count > 0
+
+
+def convert_record_index(record_index):
+    """
+    Converts a 'DOCUMENT_RECORD_INDEX' to an integer.
+
+    Args:
+        record_index: The 'DOCUMENT_RECORD_INDEX' value of a record.
+
+    Returns:
+        tuple: A tuple containing:
+            - int: The converted index, or None if it can't be converted.
+            - str: The 'invalid_type' error message, or None if the index was converted.
+    """
+    error = f"Expected: int, Found: {type(record_index).__name__} for index: {record_index}"
+    if isinstance(record_index, bool):
+        return None, error
+    if isinstance(record_index, int):
+        return record_index, None
+    try:
+        return int(record_index), None
+    except (ValueError, TypeError):
+        return None, error
+
+
+class IndexSet:
+    """
+    A set of record indices backed by a bitmap.
+
+    Non-negative integers are stored as bits of a bytearray, which grows as indices are added
+    in order. Any other value (negative integers, strings, floats, or integers far beyond the
+    bitmap) is kept in a regular set, so the class behaves like the set it replaces.
+
+    Attributes:
+        bits (bytearray): The bitmap; bit `i` is set if index `i` is present.
+        overflow (set): The values that aren't stored in the bitmap, or None if there are none.
+        size (int): The number of indices in the set.
+    """
+
+    __slots__ = ("bits", "overflow", "size")
+
+    # Integers up to this far beyond the bitmap make it grow instead of going to `overflow`
+    GROWTH_SLACK = 64
+
+    def __init__(self):
+        """
+        Initializes an empty IndexSet.
+        """
+        self.bits = bytearray()
+        self.overflow = None
+        self.size = 0
+
+    def reserve(self, expected_count):
+        """
+        Grows the bitmap so it can hold the indices 0 to `expected_count`.
+
+        Args:
+            expected_count (int): The highest index expected.
+        """
+        size = (expected_count >> 3) + 1
+        if size > len(self.bits):
+            self.bits.extend(bytes(size - len(self.bits)))
+
+    def add(self, index):
+        """
+        Adds an index to the set.
+
+        Args:
+            index: The index to add.
+        """
+        if isinstance(index, int) and not isinstance(index, bool) and index >= 0:
+            capacity = len(self.bits) << 3
+            if index < capacity + max(capacity, self.GROWTH_SLACK):
+                self.reserve(index)
+                if not self.bits[index >> 3] >> (index & 7) & 1:
+                    self.bits[index >> 3] |= 1 << (index & 7)
+                    self.size += 1
+                return
+        if self.overflow is None:
+            self.overflow = set()
+        if index not in self.overflow:
+            self.overflow.add(index)
+            self.size += 1
+
+    def update(self, indices):
+        """
+        Adds several indices to the set.
+
+        Args:
+            indices (iterable): The indices to add.
+        """
+        bits = self.bits
+        for index in indices:
+            # Indices within the bitmap are set inline, anything else goes through `add`
+            # pylint: disable-next=unidiomatic-typecheck
+            if type(index) is int and 0 <= index < len(bits) << 3:
+                bit = 1 << (index & 7)
+                if not bits[index >> 3] & bit:
+                    bits[index >> 3] |= bit
+                    self.size += 1
+            else:
+                self.add(index)
+
+    def __contains__(self, index):
+        if (
+            isinstance(index, int)
+            and not isinstance(index, bool)
+            and 0 <= index < len(self.bits) << 3
+            and self.bits[index >> 3] >> (index & 7) & 1
+        ):
+            return True
+        return self.overflow is not None and index in self.overflow
+
+    def __iter__(self):
+        yield from self.iter_bits(int.from_bytes(self.bits, "little"))
+        if self.overflow is not None:
+            yield from self.overflow
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def iter_bits(value):
+        """
+        Yields the positions of the set bits of an integer, in ascending order.
+
+        Args:
+            value (int): The integer.
+
+        Yields:
+            int: The position of each set bit.
+        """
+        while value:
+            lowest_bit = value & -value
+            yield lowest_bit.bit_length() - 1
+            value ^= lowest_bit
+
+    def integer_overflow(self):
+        """
+        Returns the integers stored outside the bitmap.
+
+        Returns:
+            list: The (non-boolean) integers of `overflow`.
+        """
+        if self.overflow is None:
+            return []
+        return [
+            index
+            for index in self.overflow
+            if isinstance(index, int) and not isinstance(index, bool)
+        ]
+
+    def missing(self, expected_count):
+        """
+        Computes the indices from 1 to `expected_count` that aren't in the set.
+
+        The bitmap is compared against the expected range as a single integer, so no
+        range of indices is materialized.
+
+        Args:
+            expected_count (int): The expected number of records.
+
+        Returns:
+            list: The missing indices, sorted.
+        """
+        present = int.from_bytes(self.bits, "little")
+        for index in self.integer_overflow():
+            if 1 <= index <= expected_count:
+                present |= 1 << index
+
+        expected = (1 << (expected_count + 1)) - 2  # Bits 1 to expected_count
+        return list(self.iter_bits(expected & ~present))
+
+    def greater_than(self, expected_count):
+        """
+        Computes the integer indices greater than `expected_count`.
+
+        Args:
+            expected_count (int): The expected number of records.
+
+        Returns:
+            list: The extra indices, sorted.
+        """
+        extra = [
+            index + expected_count + 1
+            for index in self.iter_bits(int.from_bytes(self.bits, "little") >> (expected_count + 1))
+        ]
+        extra.extend(index for index in self.integer_overflow() if index > expected_count)
+        return sorted(extra)
+
+
+class DocumentRecord:
+    """
+    A compact document record, used by DataProcessor when `compact=True`.
+
+    It holds the same fields as the dictionary layout of `document_records` in slots, and
+    supports the same item access (`record["indices"]`) so every DataProcessor method works
+    on either. Indices are tracked in an IndexSet, and the duplicate counters and out-of-range
+    log are only allocated once needed.
+
+    Attributes:
+        indices (IndexSet): The indices stored for the document.
+        expected_count (int): The expected number of records, or None.
+        data (dict): The first record (or digest) of each index.
+        identical_duplicates (dict): Identical duplicate counts per index.
+        different_duplicates (dict): Different duplicate counts per index.
+        logged_out_of_range (set): Out-of-range indices already logged.
+    """
+
+    __slots__ = (
+        "indices",
+        "expected_count",
+        "data",
+        "identical_duplicates",
+        "different_duplicates",
+        "logged_out_of_range",
+    )
+
+    def __init__(self):
+        """
+        Initializes an empty DocumentRecord.
+        """
+        self.indices = IndexSet()
+        self.expected_count = None
+        self.data = {}
+        self.identical_duplicates = None
+        self.different_duplicates = None
+        self.logged_out_of_range = None
+
+    def __getitem__(self, key):
+        value = getattr(self, key)
+        if value is None and key != "expected_count":
+            # Allocate the lazily created containers on first access
+            value = set() if key == "logged_out_of_range" else {}
+            setattr(self, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+        if key == "expected_count" and value:
+            self.indices.reserve(value)
+
+
+class EvictionPolicy:
+    """
+    Describes when DataProcessor finalizes a document before the end of the stream.
+
+    A finalized document has its missing and extra indices computed right away, and its state
+    is dropped from `document_records`. Only its ID is kept, so it's still counted once as a
+    distinct story. Records of a finalized document that arrive later can't be checked against
+    the dropped state anymore: they're counted in `results['late_records']` instead.
+
+    Attributes:
+        evict_completed (bool): Finalize a document once all of its indices have been seen.
+        max_record_distance (int): Finalize a document once this many records were processed
+            since its last record, or None.
+        max_idle_seconds (float): Finalize a document once this many seconds passed since its
+            last record, or None.
+        on_document_evicted (callable): Called with `(document_id, document_results)` for each
+            finalized document, where `document_results` holds the entries of that document
+            (same keys as the results of `process_analytics`). These entries are then removed
+            from the processor's results. If None, they're kept in the processor's results.
+    """
+
+    __slots__ = (
+        "evict_completed",
+        "max_record_distance",
+        "max_idle_seconds",
+        "on_document_evicted",
+    )
+
+    def __init__(
+        self,
+        evict_completed=True,
+        max_record_distance=None,
+        max_idle_seconds=None,
+        on_document_evicted=None,
+    ):
+        """
+        Initializes the EvictionPolicy class.
+
+        Args:
+            evict_completed (bool): Finalize a document once all of its indices have been seen.
+            max_record_distance (int, optional): Finalize a document once this many records were
+                processed since its last record.
+            max_idle_seconds (float, optional): Finalize a document once this many seconds passed
+                since its last record.
+            on_document_evicted (callable, optional): Receives the results of each finalized
+                document, see the class docstring.
+        """
+        self.evict_completed = evict_completed
+        self.max_record_distance = max_record_distance
+        self.max_idle_seconds = max_idle_seconds
+        self.on_document_evicted = on_document_evicted
+
 
 class DataProcessor:
     """
     A class to process and analyze document records.
 
     Attributes:
-        records (list): List of JSON records to be processed.
+        records (iterable): JSON records to be processed.
         document_records (dict): Dictionary to store document records, including indices and counts.
         results (dict): Dictionary to store the results of the analysis, including missing indices, duplicates, and errors.
+        logged_invalid_document_ids (set): Invalid document IDs already logged while streaming.
+        store_digests (bool): Whether duplicates are compared by digest instead of full record.
+        compact (bool): Whether documents are stored as DocumentRecord instead of dictionaries.
+        eviction (EvictionPolicy): When documents are finalized before the end of the stream.
+        evicted_document_ids (set): The IDs of the documents already finalized.
+        document_last_seen (OrderedDict): The position and time of the last record of each
+            tracked document, least recently seen first. Only used with `eviction`.
+        records_processed (int): The number of records with a valid document ID processed so far.
+            Only counted with `eviction`.
+        validator (RecordValidator): Validates the RP_DOCUMENT_ID and RP_ENTITY_ID of each
+            record processed.
+        validation_errors (list): The validation errors, in feed order. Only filled with
+            `validator`.
     """
 
-    def __init__(self, records):
+    def __init__(
+        self, records, store_digests=False, compact=False, eviction=None, validator=None
+    ):
         """
         Initializes the DataProcessor class with the provided records.
 
         Args:
-            records (list): List of JSON records to be processed.
+            records (iterable): JSON records to be processed. Any iterable works, including generators.
+            store_digests (bool): If True, `document_records[...]['data']` stores a digest of each
+                first record (see `record_digest`) instead of the record itself.
+            compact (bool): If True, `document_records` values are DocumentRecord instances,
+                which track indices in a bitmap instead of sets and dictionaries.
+            eviction (EvictionPolicy, optional): If set, documents are finalized and dropped
+                while streaming, see EvictionPolicy.
+            validator (RecordValidator, optional): If set, each record is also validated
+                while it's processed, see `utils.validation.RecordValidator`. Its errors are
+                collected in `validation_errors`, so no second pass over the records is needed.
 
         Attributes:
-            records (list): List of JSON records to be processed.
+            records (iterable): JSON records to be processed.
             document_records (dict): Dictionary to store document records, including indices and counts.
             results (dict): Dictionary to store the results of the analysis, including missing indices, duplicates, and errors.
+            logged_invalid_document_ids (set): Invalid document IDs already logged while streaming.
+            store_digests (bool): Whether duplicates are compared by digest instead of full record.
+            compact (bool): Whether documents are stored as DocumentRecord instead of dictionaries.
+            eviction (EvictionPolicy): When documents are finalized before the end of the stream.
+            evicted_document_ids (set): The IDs of the documents already finalized.
+            document_last_seen (OrderedDict): The position and time of the last record of each
+                tracked document. Only used with `eviction`.
+            records_processed (int): The number of records with a valid document ID processed
+                so far. Only counted with `eviction`.
+            validator (RecordValidator): Validates the records processed.
+            validation_errors (list): The validation errors, in feed order.
         """
         self.records = records
+        self.store_digests = store_digests
+        self.compact = compact
+        self.eviction = eviction
+        self.evicted_document_ids = set()
+        self.document_last_seen = OrderedDict()
+        self.records_processed = 0
+        self.validator = validator
+        self.validation_errors = []
         self.document_records = {}
+        self.logged_invalid_document_ids = set()
         self.results = {
             "missing": {},
             "identical_duplicates": {},
@@ -69,41 +545,284 @@ class DataProcessor:
             - Modifies `self.results` with analysis outcomes.
             - Modifies `self.document_records` to keep track of document counts, indices, and duplicates.
         """
+        return self.process_stream(self.records)
 
-        self.identify_invalid_document_ids()
+    def process_stream(self, records):
+        """
+        Processes an iterable of JSON records in a single pass and returns the analysis results.
 
-        # Count distinct stories after ensuring all document IDs are valid strings
+        Unlike walking a list several times, every check (invalid document IDs, distinct stories,
+        counts, indices and duplicates) is done while visiting each record once, so `records` can
+        be a generator reading straight from a file. Memory grows with the number of documents
+        being tracked, not with the number of records.
 
-        self.count_distinct_stories()
+        Args:
+            records (iterable): JSON records to be processed.
 
-        for record in self.records:
-            document_id = self.get_field(record, "RP_DOCUMENT_ID")
+        Returns:
+            dict: The same results dictionary returned by `process_analytics`.
 
-            # Initialize document record if valid and not already present.
-            # If the document ID is valid and not already initialized, the document record will be created.
-            # If the document ID is invalid or already exists, it will be skipped.
-            # The existing document record will remain untouched if it was already initialized.
+        Side Effects:
+            - Modifies `self.results` with analysis outcomes.
+            - Modifies `self.document_records` to keep track of document counts, indices, and duplicates.
+        """
+        for record in records:
+            self.process_record(record)
 
-            if not self.initialize_document_record(document_id):
-                # Skip this record if document ID is invalid or already exists.
-                # (should've been controlled already)
-                continue
+        return self.finalize_analytics()
+
+    def process_record(self, record):
+        """
+        Runs every per-record check on a single JSON record.
+
+        Args:
+            record (dict): The record to process.
+
+        Side Effects:
+            - Logs invalid document IDs to `self.results['indexing_errors']['invalid_document_ids']`.
+            - Updates `self.results['distinct_stories_count']` when a new document ID is seen.
+            - Modifies `self.document_records` and `self.results` like `process_analytics`.
+            - Appends the validation errors of the record to `self.validation_errors`.
+        """
+        if self.validator:
+            self.validation_errors.extend(self.validator.record_errors(record))
+
+        self.analyze_record(record)
+
+    def analyze_record(self, record):
+        """
+        Runs the analytics checks on a single JSON record, without validating it.
+
+        Args:
+            record (dict): The record to process.
+
+        Side Effects:
+            - Modifies `self.document_records` and `self.results` like `process_record`.
+        """
+        document_id = self.get_field(record, "RP_DOCUMENT_ID")
+
+        # Records with an invalid document ID are logged once per ID and skipped
+        if self.log_invalid_document_id(record, self.logged_invalid_document_ids):
+            return
 
-            # Get DOCUMENT_RECORD_INDEX and DOCUMENT_RECORD_COUNT
-            # Use the getter methods to fetch the indices and counts
-            record_index = self.get_field(record, "DOCUMENT_RECORD_INDEX")
-            record_count = self.get_field(record, "DOCUMENT_RECORD_COUNT")
+        if self.eviction:
+            self.records_processed += 1
 
-            self.check_and_log_document_count(record_count, document_id)
-            self.handle_document_count(record_count, document_id)
+            # Documents that were already finalized can't be checked anymore
+            if document_id in self.evicted_document_ids:
+                late_records = self.results.setdefault("late_records", {})
+                late_records[document_id] = late_records.get(document_id, 0) + 1
+                return
 
-            # Validate DOCUMENT_RECORD_INDEX
-            if not self.validate_index(record_index, document_id):
-                continue  # Skip if the index is invalid.
+        # A document ID seen for the first time is a new distinct story
+        if document_id not in self.document_records:
+            self.results["distinct_stories_count"] += 1
+
+        # Initialize document record if valid and not already present.
+        # The existing document record will remain untouched if it was already initialized.
+        self.initialize_document_record(document_id)
+
+        # Get DOCUMENT_RECORD_INDEX and DOCUMENT_RECORD_COUNT
+        # Use the getter methods to fetch the indices and counts
+        record_index = self.get_field(record, "DOCUMENT_RECORD_INDEX")
+        record_count = self.get_field(record, "DOCUMENT_RECORD_COUNT")
 
-            # Handle duplicate indices
+        self.check_and_log_document_count(record_count, document_id)
+        self.handle_document_count(record_count, document_id)
+
+        # Validate DOCUMENT_RECORD_INDEX, and handle duplicate indices if it's valid
+        if self.validate_index(record_index, document_id):
             self.handle_duplicates(record, record_index, document_id)
 
+        if self.eviction:
+            self.apply_eviction(document_id)
+
+    def process_batch(self, batch):
+        """
+        Processes a batch of records, with the same results as processing them one at a time.
+
+        The batch groups its records by document (see `RecordBatch.document_groups`). Documents
+        whose records of the batch can't produce any error (a single valid count, distinct
+        indices in range that weren't seen before) have them stored in bulk. The other records
+        go through `process_record`, in feed order.
+
+        Args:
+            batch (RecordBatch): The batch to process.
+
+        Side Effects:
+            - Modifies `self.results` and `self.document_records` like `process_record`.
+            - Appends the validation errors of the batch to `self.validation_errors`.
+        """
+        # Finalizing documents depends on the record order, process the records one by one
+        if self.eviction:
+            for record in batch.records:
+                self.process_record(record)
+            return
+
+        if self.validator:
+            self.validation_errors.extend(self.validator.validate(batch))
+
+        groups = batch.document_groups()
+
+        # Initialize the new documents first, so that they're kept in order of first appearance
+        new_document_ids = set()
+        for document_id, _, _, _ in groups:
+            if document_id not in self.document_records:
+                self.results["distinct_stories_count"] += 1
+                self.initialize_document_record(document_id)
+                new_document_ids.add(document_id)
+
+        valid_positions = set()
+        pending_positions = []
+        for document_id, positions, record_count, record_indices in groups:
+            valid_positions.update(positions)
+            doc_data = self.document_records[document_id]
+            if record_count is None or (
+                document_id not in new_document_ids
+                and (
+                    doc_data["expected_count"] not in (None, record_count)
+                    or any(index in doc_data["indices"] for index in record_indices)
+                )
+            ):
+                pending_positions.extend(positions)
+                continue
+
+            doc_data["expected_count"] = record_count
+            records = [batch.records[position] for position in positions]
+            if self.store_digests:
+                records = [record_digest(record) for record in records]
+            doc_data["data"].update(zip(record_indices, records))
+            doc_data["indices"].update(record_indices)
+
+        # Records with an invalid document ID are logged by `analyze_record` too
+        pending_positions.extend(
+            position for position in range(len(batch)) if position not in valid_positions
+        )
+        for position in sorted(pending_positions):
+            self.analyze_record(batch.records[position])
+
+    def apply_eviction(self, document_id):
+        """
+        Finalizes the documents that the eviction policy considers done after a record.
+
+        Args:
+            document_id (str): The ID of the document the last record belongs to.
+
+        Side Effects:
+            - Finalizes the current document if it's complete and `evict_completed` is set.
+            - Finalizes the documents that were last seen too many records or seconds ago.
+        """
+        now = time.monotonic()
+        if document_id in self.document_records:
+            if self.eviction.evict_completed and self.is_document_complete(document_id):
+                self.evict_document(document_id)
+            else:
+                self.document_last_seen[document_id] = (self.records_processed, now)
+                self.document_last_seen.move_to_end(document_id)
+
+        # Documents are ordered by last record, so only the oldest ones need to be checked
+        max_record_distance = self.eviction.max_record_distance
+        max_idle_seconds = self.eviction.max_idle_seconds
+        while self.document_last_seen:
+            oldest_document_id, (position, seen_at) = next(iter(self.document_last_seen.items()))
+            distance = self.records_processed - position
+            if (max_record_distance is None or distance < max_record_distance) and (
+                max_idle_seconds is None or now - seen_at < max_idle_seconds
+            ):
+                break
+            self.evict_document(oldest_document_id)
+
+    def is_document_complete(self, document_id):
+        """
+        Checks if every index from 1 to the expected count of a document was seen.
+
+        Args:
+            document_id (str): The ID of the document to check.
+
+        Returns:
+            bool: True if the document is complete, False otherwise.
+        """
+        doc_data = self.document_records[document_id]
+        expected_count = doc_data["expected_count"]
+
+        # Only walk the indices once there are enough of them
+        if expected_count is None or len(doc_data["indices"]) < expected_count:
+            return False
+        return all(index in doc_data["indices"] for index in range(1, expected_count + 1))
+
+    def document_status(self, document_id):
+        """
+        Describes how far along a document is.
+
+        Args:
+            document_id (str): The ID of a document seen by the processor.
+
+        Returns:
+            str: "finalized" if the document was evicted, "no_count" if none of its records had
+            a valid DOCUMENT_RECORD_COUNT yet, else "complete" or "incomplete" depending on
+            whether every index from 1 to the expected count was seen.
+        """
+        if document_id in self.evicted_document_ids:
+            return "finalized"
+        if self.document_records[document_id]["expected_count"] is None:
+            return "no_count"
+        return "complete" if self.is_document_complete(document_id) else "incomplete"
+
+    def evict_document(self, document_id):
+        """
+        Finalizes a document and drops its state.
+
+        Args:
+            document_id (str): The ID of the document to finalize.
+
+        Side Effects:
+            - Logs the missing and extra indices of the document.
+            - Removes the document from `self.document_records` and adds it to
+              `self.evicted_document_ids`.
+            - Passes the results of the document to `on_document_evicted`, if set, and removes
+              them from `self.results`.
+        """
+        doc_data = self.document_records.pop(document_id)
+        self.document_last_seen.pop(document_id, None)
+        self.evicted_document_ids.add(document_id)
+        self.identify_document_missing_indices(document_id, doc_data)
+
+        if self.eviction.on_document_evicted:
+            self.eviction.on_document_evicted(document_id, self.pop_document_results(document_id))
+
+    def pop_document_results(self, document_id):
+        """
+        Removes the results of a single document from `self.results`.
+
+        Args:
+            document_id (str): The ID of the document.
+
+        Returns:
+            dict: The entries of the document, keyed like `self.results`. Only the keys with an
+                entry for the document are present.
+        """
+        document_results = {}
+        for key, value in self.results.items():
+            if isinstance(value, dict) and document_id in value:
+                document_results[key] = {document_id: value.pop(document_id)}
+        return document_results
+
+    def finalize_analytics(self):
+        """
+        Completes the analysis once every record has been processed.
+
+        Returns:
+            dict: The analysis results.
+
+        Side Effects:
+            - Logs missing and extra indices through `identify_missing_indices`.
+        """
+        # Documents still tracked by an eviction policy are finalized one by one,
+        # so that `on_document_evicted` sees every document
+        if self.eviction:
+            for document_id in list(self.document_records):
+                self.evict_document(document_id)
+
         # Now call the `identify_missing_indices` method to log missing, extra
         # indices, and duplicates
         self.identify_missing_indices()
@@ -149,24 +868,44 @@ class DataProcessor:
         logged_invalid_document_ids = set()
 
         for record in self.records:
-            document_id = record.get("RP_DOCUMENT_ID")
+            self.log_invalid_document_id(record, logged_invalid_document_ids)
 
-            # Check if the document ID is not a non-empty string (i.e., None or
-            # empty string)
-            if not document_id or not isinstance(document_id, str) or not document_id.strip():
-                # Log invalid document IDs along with their RP_ENTITY_ID
-                rp_entity_id = self.get_field(record, "RP_ENTITY_ID")
+    def log_invalid_document_id(self, record, logged_invalid_document_ids):
+        """
+        Logs the record's document ID if it is invalid (non-string or empty).
 
-                # Ensure this record is only logged once
-                if document_id not in logged_invalid_document_ids:
-                    self.results["indexing_errors"].setdefault("invalid_document_ids", []).append(
-                        {
-                            "RP_DOCUMENT_ID": document_id,
-                            "RP_ENTITY_ID": rp_entity_id,
-                            "record": record,
-                        }
-                    )
-                    logged_invalid_document_ids.add(document_id)
+        Args:
+            record (dict): The record to check.
+            logged_invalid_document_ids (set): Invalid document IDs that were already logged.
+
+        Returns:
+            bool: True if the document ID is invalid, False otherwise.
+
+        Side Effects:
+            - Logs invalid document IDs to `self.results['indexing_errors']['invalid_document_ids']`.
+            - Adds newly logged document IDs to `logged_invalid_document_ids`.
+        """
+        document_id = record.get("RP_DOCUMENT_ID")
+
+        # Check if the document ID is not a non-empty string (i.e., None or
+        # empty string)
+        if is_valid_document_id(document_id):
+            return False
+
+        # Log invalid document IDs along with their RP_ENTITY_ID
+        rp_entity_id = self.get_field(record, "RP_ENTITY_ID")
+
+        # Ensure this record is only logged once
+        if document_id not in logged_invalid_document_ids:
+            self.results["indexing_errors"].setdefault("invalid_document_ids", []).append(
+                {
+                    "RP_DOCUMENT_ID": document_id,
+                    "RP_ENTITY_ID": rp_entity_id,
+                    "record": record,
+                }
+            )
+            logged_invalid_document_ids.add(document_id)
+        return True
 
     def initialize_document_record(self, document_id):
         """
@@ -180,12 +919,14 @@ class DataProcessor:
             bool: True if the document ID is valid and was initialized, False if the document ID is invalid.
         """
         # Skip invalid document IDs (non-strings or empty strings)
-        if not isinstance(document_id, str) or not document_id.strip():
+        if not is_valid_document_id(document_id):
             return False  # Invalid document ID, do not initialize.
 
         # Initialize the document record if it's not already present.
         # If the document ID already exists, it will not be modified.
-        if document_id not in self.document_records:
+        if document_id not in self.document_records and self.compact:
+            self.document_records[document_id] = DocumentRecord()
+        elif document_id not in self.document_records:
             self.document_records[document_id] = {
                 "indices": set(),
                 "expected_count": None,
@@ -213,27 +954,9 @@ class DataProcessor:
             - Logs invalid document counts to `self.results['invalid_document_counts']` under the document's ID.
         """
 
-        # Check if record_count is an integer and valid (positive, non-zero)
-        if isinstance(record_count, int) and not isinstance(record_count, bool):
-            if record_count <= 0:  # Check if it's zero or negative
-                self.results["invalid_document_counts"].setdefault(document_id, []).append(
-                    record_count
-                )
-            # Exit after logging if it's a valid integer or an invalid
-            # (non-positive) integer
-            return
-
-        # Check if record_count is a string representation of an integer
-        if isinstance(record_count, str) and record_count.isdigit():
-            converted_count = int(record_count)
-            if converted_count <= 0:  # Check if converted record count is non-positive
-                self.results["invalid_document_counts"].setdefault(document_id, []).append(
-                    record_count
-                )  # Log the original string
-            return
-
-        # Log non-numeric values (string or other type) as invalid
-        self.results["invalid_document_counts"].setdefault(document_id, []).append(record_count)
+        # Positive integers (or strings of digits) are valid, anything else is logged
+        if is_invalid_document_count(record_count):
+            self.results["invalid_document_counts"].setdefault(document_id, []).append(record_count)
 
     def handle_document_count(self, record_count, document_id):
         """
@@ -257,11 +980,7 @@ class DataProcessor:
         - Logs count mismatches to `self.results['indexing_errors']`.
         """
 
-        if (
-            isinstance(record_count, int)
-            and not isinstance(record_count, bool)
-            and record_count > 0
-        ):
+        if is_valid_record_count(record_count):
             expected_count = self.document_records[document_id]["expected_count"]
             if expected_count is None:
                 self.document_records[document_id]["expected_count"] = record_count
@@ -290,23 +1009,12 @@ class DataProcessor:
             - Logs invalid indices and out-of-range errors to `self.results['indexing_errors']`.
         """
 
-        if isinstance(record_index, bool) or not isinstance(record_index, int):
-            try:
-                if isinstance(record_index, bool):
-                    self.results["indexing_errors"].setdefault(document_id, {}).setdefault(
-                        "invalid_type", []
-                    ).append(
-                        f"Expected: int, Found: {type(record_index).__name__} for index: {record_index}"
-                    )
-                    return False
-                record_index = int(record_index)
-            except (ValueError, TypeError):
-                self.results["indexing_errors"].setdefault(document_id, {}).setdefault(
-                    "invalid_type", []
-                ).append(
-                    f"Expected: int, Found: {type(record_index).__name__} for index: {record_index}"
-                )
-                return False
+        record_index, error = convert_record_index(record_index)
+        if error:
+            self.results["indexing_errors"].setdefault(document_id, {}).setdefault(
+                "invalid_type", []
+            ).append(error)
+            return False
 
         # Ensure the index is within range
         expected_count = self.document_records[document_id]["expected_count"]
@@ -332,7 +1040,8 @@ class DataProcessor:
         - If the existing data matches the current record, it increments the identical duplicate count.
         - If the existing data differs, it increments the different duplicate count.
 
-        If the `record_index` is not present, the method stores the current record in `self.document_records`.
+        If the `record_index` is not present, the method stores the current record (or its digest,
+        see `store_digests`) in `self.document_records`.
 
         Side Effects:
             - Updates `self.document_records` to track duplicate counts and store new records.
@@ -341,6 +1050,10 @@ class DataProcessor:
         # Retrieve the data for the given document ID
         doc_data = self.document_records[document_id]
 
+        # Compare digests instead of full records if requested
+        if self.store_digests:
+            record = record_digest(record)
+
         # Check if the current record index already exists in the document's data
         if record_index in doc_data["data"]:
             # If the record index exists, fetch the existing record
@@ -369,7 +1082,7 @@ class DataProcessor:
 
         # If the record index doesn't exist in the document's data, store the current record
         else:
-            # Add the new record to the data dictionary under the record index
+            # Add the new record (or its digest) to the data dictionary under the record index
             doc_data["data"][record_index] = record
 
             # Add the record index to the set of indices for the document
@@ -392,29 +1105,53 @@ class DataProcessor:
         """
 
         for document_id, doc_data in self.document_records.items():
-            expected_count = doc_data["expected_count"]
-            if expected_count is not None:
-                # Filter out invalid indices before calculating missing indices
-                valid_indices = {
-                    index
-                    for index in doc_data["indices"]
-                    if isinstance(index, int) and not isinstance(index, bool)
-                }
+            self.identify_document_missing_indices(document_id, doc_data)
 
-                # Identify indices outside the expected range (extra indices)
-                extra_indices = {index for index in valid_indices if index > expected_count}
-                if extra_indices:
-                    # Log the extra indices, which are larger than the expected count
-                    self.results.setdefault("extra_indices", {}).setdefault(document_id, []).extend(
-                        extra_indices
-                    )
+    def identify_document_missing_indices(self, document_id, doc_data):
+        """
+        Identifies and logs the missing and extra record indices of a single document.
 
-                # Calculate missing indices (indices expected but not present)
-                missing_indices = set(range(1, expected_count + 1)) - valid_indices
-                if missing_indices:
-                    self.results.setdefault("missing", {})[document_id] = list(
-                        sorted(missing_indices)
-                    )
+        Args:
+            document_id (str): The ID of the document.
+            doc_data (dict): The document record, as stored in `self.document_records`.
+
+        Side Effects:
+            - Logs missing indices to `self.results['missing']`.
+            - Logs unexpected indices to `self.results['extra_indices']`.
+        """
+        expected_count = doc_data["expected_count"]
+        if expected_count is not None and isinstance(doc_data["indices"], IndexSet):
+            # Compact records compute both from the bitmap, in ascending order
+            extra_indices = doc_data["indices"].greater_than(expected_count)
+            if extra_indices:
+                self.results.setdefault("extra_indices", {}).setdefault(document_id, []).extend(
+                    extra_indices
+                )
+            missing_indices = doc_data["indices"].missing(expected_count)
+            if missing_indices:
+                self.results.setdefault("missing", {})[document_id] = missing_indices
+        elif expected_count is not None:
+            # Filter out invalid indices before calculating missing indices
+            valid_indices = {
+                index
+                for index in doc_data["indices"]
+                if isinstance(index, int) and not isinstance(index, bool)
+            }
+
+            # Identify indices outside the expected range (extra indices)
+            extra_indices = {index for index in valid_indices if index > expected_count}
+            if extra_indices:
+                # Log the extra indices, which are larger than the expected count
+                self.results.setdefault("extra_indices", {}).setdefault(document_id, []).extend(
+                    extra_indices
+                )
+
+            # Calculate missing indices (indices expected but not present)
+            missing_indices = set(range(1, expected_count + 1)) - valid_indices
+            if missing_indices:
+                self.results.setdefault("missing", {})[document_id] = list(
+                    sorted(missing_indices)
+                )
 
     def get_field(self, record, field_name):
         """
@@ -429,3 +1166,471 @@ class DataProcessor:
             The field value if it exists, or the default value.
         """
         return record.get(field_name)
+
+
+class IndexLog:
+    """
+    Records the occurrences of each record index of a document, in order of first appearance.
+
+    For every raw 'DOCUMENT_RECORD_INDEX' value it keeps its integer conversion, the content and
+    position of its first record, and how many times every other content was seen afterwards.
+    Each other content also keeps the position and raw index of its first occurrence. This is
+    enough to recompute out-of-range errors and duplicates for any expected count, in the order
+    a single pass logs them.
+
+    Attributes:
+        entries (dict): Maps each raw index to `[index, first_content, first_position,
+            other_contents]`, where `other_contents` is a list of `[content, occurrences,
+            position, record_index]` lists, in order of first occurrence.
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self):
+        """
+        Initializes an empty IndexLog.
+        """
+        self.entries = {}
+
+    def add(self, record_index, index, content, position, occurrences=1):
+        """
+        Records occurrences of a record index.
+
+        Args:
+            record_index: The raw 'DOCUMENT_RECORD_INDEX' value.
+            index (int): The index converted to an integer.
+            content: The content used to tell identical and different duplicates apart.
+            position (int): The position of the first of these records in the feed.
+            occurrences (int): How many times `content` was seen.
+        """
+        entry = self.entries.get(record_index)
+        if entry is None:
+            self.entries[record_index] = [index, content, position, []]
+            occurrences -= 1
+            if not occurrences:
+                return
+            entry = self.entries[record_index]
+
+        for other in entry[3]:
+            if other[0] == content:
+                other[1] += occurrences
+                return
+        entry[3].append([content, occurrences, position, record_index])
+
+    def add_entry(self, record_index, entry, offset=0):
+        """
+        Appends the occurrences of an entry of another IndexLog.
+
+        Args:
+            record_index: The raw index the entry is keyed by.
+            entry (list): The entry, see `entries`.
+            offset (int): Added to the positions of the entry.
+        """
+        index, first_content, first_position, other_contents = entry
+        self.add(record_index, index, first_content, first_position + offset)
+        for content, occurrences, position, content_index in other_contents:
+            # The raw index of the occurrence is kept, e.g. 2.0 for a record first seen as 2
+            self.add(content_index, index, content, position + offset, occurrences)
+
+    def extend(self, other, offset=0):
+        """
+        Appends the occurrences of another IndexLog, as if its records came after these ones.
+
+        Args:
+            other (IndexLog): The log to append.
+            offset (int): Added to the positions of `other`.
+        """
+        for record_index, entry in other.entries.items():
+            self.add_entry(record_index, entry, offset)
+
+
+class DocumentPartial:
+    """
+    The mergeable state of a single document within a shard of the feed.
+
+    Records seen before the document has a valid expected count are accepted regardless of
+    their index (`unchecked`). Later records are range checked (`checked`). Merging two
+    partials replays that rule, so the outcome doesn't depend on where the feed was split.
+
+    Every finding keeps the position of the record that first caused it, so that the results
+    list them in the order a single pass logs them.
+
+    Attributes:
+        first_position (int): The position of the first record of the document.
+        expected_count (int): The first valid 'DOCUMENT_RECORD_COUNT', or None.
+        count_runs (list): Run-length encoded `[count, occurrences, position]` valid record
+            counts, with the position of the first record of each run.
+        invalid_counts (list): `(position, count)` tuples of the invalid record counts, in order.
+        invalid_types (list): `(position, message)` tuples of the 'invalid_type' errors, in
+            order.
+        unchecked (IndexLog): Indices seen before `expected_count` was known.
+        checked (IndexLog): Indices seen once `expected_count` was known.
+    """
+
+    __slots__ = (
+        "first_position",
+        "expected_count",
+        "count_runs",
+        "invalid_counts",
+        "invalid_types",
+        "unchecked",
+        "checked",
+    )
+
+    def __init__(self):
+        """
+        Initializes an empty DocumentPartial.
+        """
+        self.first_position = None
+        self.expected_count = None
+        self.count_runs = []
+        self.invalid_counts = []
+        self.invalid_types = []
+        self.unchecked = IndexLog()
+        self.checked = IndexLog()
+
+    def add_count(self, record_count, position, occurrences=1):
+        """
+        Records occurrences of a valid record count.
+
+        Args:
+            record_count (int): A positive 'DOCUMENT_RECORD_COUNT'.
+            position (int): The position of the first of these records in the feed.
+            occurrences (int): How many records in a row had this count.
+        """
+        if self.expected_count is None:
+            self.expected_count = record_count
+        if self.count_runs and self.count_runs[-1][0] == record_count:
+            self.count_runs[-1][1] += occurrences
+        else:
+            self.count_runs.append([record_count, occurrences, position])
+
+    def add_record(self, record, content, position):
+        """
+        Applies a record of this document.
+
+        Args:
+            record (dict): The record to apply.
+            content: The record itself or its digest, used to tell duplicates apart.
+            position (int): The position of the record in the feed.
+        """
+        if self.first_position is None:
+            self.first_position = position
+
+        record_count = record.get("DOCUMENT_RECORD_COUNT")
+        record_index = record.get("DOCUMENT_RECORD_INDEX")
+
+        if is_invalid_document_count(record_count):
+            self.invalid_counts.append((position, record_count))
+        if is_valid_record_count(record_count):
+            self.add_count(record_count, position)
+
+        index, error = convert_record_index(record_index)
+        if error:
+            self.invalid_types.append((position, error))
+            return
+
+        index_log = self.unchecked if self.expected_count is None else self.checked
+        index_log.add(record_index, index, content, position)
+
+    def merge(self, other, offset=0):
+        """
+        Appends another partial of the same document, as if its records came after these ones.
+
+        Args:
+            other (DocumentPartial): The partial to append. It must not be used afterwards.
+            offset (int): Added to the positions of `other`.
+        """
+        if self.first_position is None:
+            self.first_position = other.first_position + offset
+
+        if self.expected_count is None:
+            # Nothing was range checked yet, so the other partial's phases carry over
+            self.unchecked.extend(other.unchecked, offset)
+            self.checked.extend(other.checked, offset)
+        else:
+            # Everything the other partial saw is now checked against our expected count
+            self.checked.extend(other.unchecked, offset)
+            self.checked.extend(other.checked, offset)
+
+        for record_count, occurrences, position in other.count_runs:
+            self.add_count(record_count, position + offset, occurrences)
+        self.invalid_counts.extend(
+            (position + offset, record_count) for position, record_count in other.invalid_counts
+        )
+        self.invalid_types.extend(
+            (position + offset, error) for position, error in other.invalid_types
+        )
+
+    def collect_results(self, document_id, results, logged):
+        """
+        Adds the findings of this document to a `process_analytics`-shaped results dictionary.
+
+        The missing and extra indices are added to `results` right away. The entries a single
+        pass adds as soon as their first record is seen are appended to `logged` instead, for
+        the caller to add them in feed order.
+
+        Args:
+            document_id (str): The ID of the document.
+            results (dict): The results dictionary to update.
+            logged (list): Receives `(position, key, document_id, value)` tuples, meaning that
+                `results[key][document_id]` is `value`, first logged at `position`.
+        """
+        expected_count = self.expected_count
+        indexing_errors = []
+
+        if self.invalid_counts:
+            logged.append(
+                (
+                    self.invalid_counts[0][0],
+                    "invalid_document_counts",
+                    document_id,
+                    [record_count for _, record_count in self.invalid_counts],
+                )
+            )
+
+        count_mismatch = []
+        for record_count, occurrences, position in self.count_runs:
+            if record_count != expected_count:
+                if not count_mismatch:
+                    mismatch_position = position
+                count_mismatch.extend([record_count] * occurrences)
+        if count_mismatch:
+            indexing_errors.append((mismatch_position, "count_mismatch", count_mismatch))
+        if self.invalid_types:
+            indexing_errors.append(
+                (
+                    self.invalid_types[0][0],
+                    "invalid_type",
+                    [error for _, error in self.invalid_types],
+                )
+            )
+
+        # Checked indices outside 1..expected_count are logged once and otherwise ignored.
+        # Both phases are merged per raw index, unchecked records coming first.
+        accepted_log = IndexLog()
+        accepted_log.extend(self.unchecked)
+        out_of_range = {}
+        for record_index, entry in self.checked.entries.items():
+            index = entry[0]
+            if index < 1 or index > expected_count:
+                out_of_range.setdefault(index, entry[2])
+                continue
+            accepted_log.add_entry(record_index, entry)
+        if out_of_range:
+            indexing_errors.append(
+                (min(out_of_range.values()), "out_of_range", list(out_of_range))
+            )
+        if indexing_errors:
+            indexing_errors.sort(key=lambda error: error[0])
+            logged.append(
+                (
+                    indexing_errors[0][0],
+                    "indexing_errors",
+                    document_id,
+                    {kind: errors for _, kind, errors in indexing_errors},
+                )
+            )
+
+        # Count the duplicates of each first record. Every index is logged under the raw index
+        # of its first duplicate, once that duplicate is seen.
+        duplicates = {"identical_duplicates": [], "different_duplicates": []}
+        for _, first_content, _, other_contents in accepted_log.entries.values():
+            index_duplicates = {}
+            for content, occurrences, position, content_index in other_contents:
+                key = (
+                    "identical_duplicates" if content == first_content else "different_duplicates"
+                )
+                if key in index_duplicates:
+                    index_duplicates[key][2] += occurrences
+                else:
+                    index_duplicates[key] = [position, content_index, occurrences]
+            for key, duplicate in index_duplicates.items():
+                duplicates[key].append(duplicate)
+        for key, document_duplicates in duplicates.items():
+            if document_duplicates:
+                document_duplicates.sort(key=lambda duplicate: duplicate[0])
+                logged.append(
+                    (
+                        document_duplicates[0][0],
+                        key,
+                        document_id,
+                        {
+                            record_index: occurrences
+                            for _, record_index, occurrences in document_duplicates
+                        },
+                    )
+                )
+
+        if expected_count is not None:
+            valid_indices = {
+                record_index
+                for record_index in accepted_log.entries
+                if isinstance(record_index, int) and not isinstance(record_index, bool)
+            }
+            extra_indices = {index for index in valid_indices if index > expected_count}
+            if extra_indices:
+                results.setdefault("extra_indices", {}).setdefault(document_id, []).extend(
+                    extra_indices
+                )
+            missing_indices = [
+                index for index in range(1, expected_count + 1) if index not in valid_indices
+            ]
+            if missing_indices:
+                results["missing"][document_id] = missing_indices
+
+
+class PartialAnalytics:
+    """
+    Mergeable analysis state that can be built on any shard of the feed.
+
+    Merging is associative: building partials on consecutive shards and merging them in feed
+    order gives exactly the same results as a single DataProcessor run over the concatenated
+    records, in the same order, so the work can be split across processes or machines.
+
+    Partials can also be built on interleaved shards, e.g. partitioned by document, by giving
+    every record its position in the feed and merging them with `offset=0`.
+
+    Attributes:
+        documents (dict): Maps each valid document ID to its DocumentPartial.
+        invalid_document_ids (dict): Maps each invalid document ID to a `(position, entry)`
+            tuple, with its first logged entry and the position of its record.
+        store_digests (bool): Whether duplicates are compared by digest instead of full record.
+            Partials can only be merged with partials using the same setting.
+        next_position (int): The position of the next record, one past the last position seen.
+    """
+
+    def __init__(self, store_digests=False):
+        """
+        Initializes an empty PartialAnalytics.
+
+        Args:
+            store_digests (bool): If True, a digest of each first record is kept instead of the
+                record itself (see `record_digest`).
+        """
+        self.documents = {}
+        self.invalid_document_ids = {}
+        self.store_digests = store_digests
+        self.next_position = 0
+
+    @classmethod
+    def from_records(cls, records, store_digests=False):
+        """
+        Builds a PartialAnalytics from an iterable of records.
+
+        Args:
+            records (iterable): JSON records.
+            store_digests (bool): Whether duplicates are compared by digest instead of full record.
+
+        Returns:
+            PartialAnalytics: The partial state of these records.
+        """
+        partial = cls(store_digests)
+        for record in records:
+            partial.add_record(record)
+        return partial
+
+    def add_record(self, record, position=None):
+        """
+        Applies a single record.
+
+        Args:
+            record (dict): The record to apply.
+            position (int, optional): The position of the record in the feed. Defaults to
+                `next_position`, for records added in feed order.
+        """
+        if position is None:
+            position = self.next_position
+        self.next_position = position + 1
+
+        document_id = record.get("RP_DOCUMENT_ID")
+
+        if not is_valid_document_id(document_id):
+            if document_id not in self.invalid_document_ids:
+                self.invalid_document_ids[document_id] = (
+                    position,
+                    {
+                        "RP_DOCUMENT_ID": document_id,
+                        "RP_ENTITY_ID": record.get("RP_ENTITY_ID"),
+                        "record": record,
+                    },
+                )
+            return
+
+        document = self.documents.get(document_id)
+        if document is None:
+            document = self.documents[document_id] = DocumentPartial()
+        document.add_record(
+            record, record_digest(record) if self.store_digests else record, position
+        )
+
+    def merge(self, other, offset=None):
+        """
+        Merges another partial into this one, as if its records came after these ones.
+
+        Args:
+            other (PartialAnalytics): The partial to merge. It must not be used afterwards.
+            offset (int, optional): Added to the positions of `other`. Defaults to
+                `next_position`, for a partial built on the records following these ones. Pass
+                0 for partials whose records were added with their feed positions.
+
+        Returns:
+            PartialAnalytics: This partial, to allow chaining.
+        """
+        if offset is None:
+            offset = self.next_position
+
+        for document_id, document in other.documents.items():
+            if document_id in self.documents:
+                self.documents[document_id].merge(document, offset)
+            elif offset:
+                self.documents[document_id] = DocumentPartial()
+                self.documents[document_id].merge(document, offset)
+            else:
+                self.documents[document_id] = document
+
+        for document_id, (position, entry) in other.invalid_document_ids.items():
+            logged = self.invalid_document_ids.get(document_id)
+            if logged is None or position + offset < logged[0]:
+                self.invalid_document_ids[document_id] = (position + offset, entry)
+
+        self.next_position = max(self.next_position, other.next_position + offset)
+        return self
+
+    def results(self):
+        """
+        Computes the `process_analytics`-shaped results of this partial.
+
+        Returns:
+            dict: The same results a DataProcessor would return for these records, in the same
+                order.
+        """
+        results = DataProcessor([]).results
+        results["distinct_stories_count"] = len(self.documents)
+
+        logged = []
+        if self.invalid_document_ids:
+            invalid_document_ids = sorted(
+                self.invalid_document_ids.values(), key=lambda logged_id: logged_id[0]
+            )
+            logged.append(
+                (
+                    invalid_document_ids[0][0],
+                    "indexing_errors",
+                    "invalid_document_ids",
+                    [entry for _, entry in invalid_document_ids],
+                )
+            )
+
+        # Documents are finalized in order of first appearance, like DataProcessor does
+        for document_id, document in sorted(
+            self.documents.items(), key=lambda item: item[1].first_position
+        ):
+            document.collect_results(document_id, results, logged)
+
+        # The other entries are added in the order a single pass logs them
+        logged.sort(key=lambda entry: entry[0])
+        for _, key, document_id, value in logged:
+            results[key][document_id] = value
+
+        return results
@@ -0,0 +1,285 @@
+"""
+This module holds records in columnar batches, and runs the validation and the per-document
+grouping over whole batches with NumPy.
+
+A RecordBatch keeps one array per field the analytics read (RP_DOCUMENT_ID, RP_ENTITY_ID,
+DOCUMENT_RECORD_INDEX and DOCUMENT_RECORD_COUNT) next to the records themselves.
+`validate_record_batch` returns the same errors as `validate_rp_entity_ids`, and
+`DataProcessor.process_batch` uses `RecordBatch.document_groups` to store the records of
+documents without errors in bulk.
+
+NumPy is optional: the rest of the application works without it, but building a RecordBatch
+raises an ImportError.
+"""
+
+import re
+from operator import attrgetter
+from .projection import PROJECTED_FIELDS, ProjectedRecord
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the installed packages
+    np = None
+
+# Records per batch built by `batch_records`
+BATCH_SIZE = 10000
+
+# Counts and indices at least this large aren't converted to 64-bit integers
+MAX_INTEGER = 2**62
+
+RP_ENTITY_ID_PATTERN = re.compile(r"^[A-Z0-9]{6}$")
+
+
+def require_numpy():
+    """
+    Raises an error if NumPy is not installed.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    if np is None:
+        raise ImportError("Columnar record batches require NumPy: pip install numpy")
+
+
+class RecordBatch:
+    """
+    A batch of records with one array per analytics field.
+
+    Attributes:
+        records (list): The records of the batch, in feed order.
+        document_ids (numpy.ndarray): The RP_DOCUMENT_ID of each record (object array).
+        entity_ids (numpy.ndarray): The RP_ENTITY_ID of each record (object array).
+        indices (numpy.ndarray): The DOCUMENT_RECORD_INDEX of each record (object array).
+        counts (numpy.ndarray): The DOCUMENT_RECORD_COUNT of each record (object array).
+    """
+
+    __slots__ = ("records", "document_ids", "entity_ids", "indices", "counts")
+
+    def __init__(self, records):
+        """
+        Builds the columns of a batch of records.
+
+        Args:
+            records (list): Records (dictionaries or projected records).
+
+        Raises:
+            ImportError: If NumPy is not installed.
+        """
+        require_numpy()
+        self.records = records
+
+        # The fields of projected records are read as attributes, missing ones are None
+        if all(type(record) is ProjectedRecord for record in records):
+            columns = [list(map(attrgetter(field), records)) for field in PROJECTED_FIELDS]
+        else:
+            columns = [[record.get(field) for record in records] for field in PROJECTED_FIELDS]
+        self.document_ids, self.entity_ids, self.indices, self.counts = map(
+            object_column, columns
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def document_groups(self):
+        """
+        Groups the records of the batch by valid document ID.
+
+        For each document, the group tells if its records can be stored in bulk: all of them
+        share the same positive integer count, and their indices are distinct integers from 1
+        to that count. Such records can't produce any error on their own, apart from being
+        duplicates of records of previous batches.
+
+        Returns:
+            list: `(document_id, positions, count, indices)` tuples in order of first
+            appearance, where `positions` are the positions of the document's records in the
+            batch. `count` and `indices` (a list) are None unless the records can be stored
+            in bulk. Records with an invalid document ID aren't part of any group.
+        """
+        positions_by_document = {}
+        for position, document_id in enumerate(self.document_ids.tolist()):
+            if isinstance(document_id, str) and document_id.strip():
+                positions_by_document.setdefault(document_id, []).append(position)
+        if not positions_by_document:
+            return []
+
+        # Sort the records by group (and by index within a group) to check groups at once
+        group_sizes = np.fromiter(map(len, positions_by_document.values()), dtype=np.int64)
+        group_of_record = np.repeat(np.arange(len(group_sizes)), group_sizes)
+        positions = np.fromiter(
+            (position for group in positions_by_document.values() for position in group),
+            dtype=np.int64,
+            count=int(group_sizes.sum()),
+        )
+        counts, counts_valid = integer_column(self.counts[positions])
+        indices, indices_valid = integer_column(self.indices[positions])
+        indices_valid &= (indices >= 1) & (indices <= counts)
+
+        starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+        bulk = np.logical_and.reduceat(counts_valid & indices_valid, starts)
+        bulk &= np.minimum.reduceat(counts, starts) == np.maximum.reduceat(counts, starts)
+
+        order = np.lexsort((indices, group_of_record))
+        repeated = (np.diff(indices[order]) == 0) & (np.diff(group_of_record[order]) == 0)
+        bulk[group_of_record[order][1:][repeated]] = False
+
+        groups = []
+        for group, (document_id, document_positions) in enumerate(positions_by_document.items()):
+            if bulk[group]:
+                group_indices = [self.indices[position] for position in document_positions]
+                groups.append(
+                    (document_id, document_positions, int(counts[starts[group]]), group_indices)
+                )
+            else:
+                groups.append((document_id, document_positions, None, None))
+        return groups
+
+
+def object_column(values):
+    """
+    Builds a one-dimensional object array, even from sequences of sequences.
+
+    Args:
+        values (iterable): The values.
+
+    Returns:
+        numpy.ndarray: The object array.
+    """
+    return np.fromiter(values, dtype=object)
+
+
+def integer_column(column):
+    """
+    Converts an object column to 64-bit integers.
+
+    Args:
+        column (numpy.ndarray): An object array.
+
+    Returns:
+        tuple: A tuple containing:
+            - numpy.ndarray: The values as int64, 0 where they aren't integers.
+            - numpy.ndarray: True where the value is an integer (not a boolean) that fits.
+    """
+    types = object_column(map(type, column))
+    valid = types == int
+    valid[valid] = np.abs(column[valid]) < MAX_INTEGER
+    values = np.zeros(len(column), dtype=np.int64)
+    values[valid] = column[valid].astype(np.int64)
+    return values, valid
+
+
+def batch_records(records, batch_size=BATCH_SIZE):
+    """
+    Lazily groups records into RecordBatch instances.
+
+    Args:
+        records (iterable): The records, e.g. from `iter_json_records`.
+        batch_size (int): The number of records per batch.
+
+    Yields:
+        RecordBatch: The batches, in feed order.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield RecordBatch(batch)
+            batch = []
+    if batch:
+        yield RecordBatch(batch)
+
+
+def validate_record_batch(batch):
+    """
+    Validates the RP_DOCUMENT_ID and RP_ENTITY_ID of every record of a batch.
+
+    The checks of `validate_rp_entity_id` run over the whole columns: the document ID checks,
+    the missing RP_ENTITY_ID check and the `^[A-Z0-9]{6}$` format check, which compares the
+    code points of the stripped IDs.
+
+    Args:
+        batch (RecordBatch): The batch to validate.
+
+    Returns:
+        list: The same error tuples as `validate_rp_entity_ids`, in feed order.
+    """
+    document_ids = batch.document_ids
+    entity_ids = batch.entity_ids
+    document_types = object_column(map(type, document_ids))
+
+    # RP_DOCUMENT_ID: None, empty or blank strings and booleans are errors
+    is_string = document_types == str
+    document_texts = np.where(is_string, document_ids, "")
+    document_lengths = np.fromiter(map(len, document_texts), dtype=np.int64, count=len(batch))
+    document_column = document_texts.astype(str)
+    document_empty = is_string & (document_lengths == 0)
+    document_blank = (
+        is_string
+        & (np.char.str_len(np.char.strip(document_column)) == 0)
+        & ~truncated_mask(document_column, document_lengths)
+    )
+    document_error = (document_types == type(None)) | (document_types == bool) | document_blank
+
+    # RP_ENTITY_ID: missing (or null), then the format of its stripped text
+    entity_missing = ~document_error & (object_column(map(type, entity_ids)) == type(None))
+    to_check = ~document_error & ~entity_missing
+    texts = [str(entity_id) for entity_id in entity_ids[to_check]]
+    entity_invalid = np.zeros(len(batch), dtype=bool)
+    entity_invalid[to_check] = ~entity_id_format_mask(texts)
+
+    errors = []
+    for position in np.flatnonzero(document_error | entity_missing | entity_invalid).tolist():
+        document_index = batch.indices[position]
+        if document_error[position]:
+            errors.append(("" if document_empty[position] else None, None, document_index))
+        elif entity_missing[position]:
+            errors.append((None, document_ids[position], document_index))
+        else:
+            errors.append(
+                (str(entity_ids[position]).strip(), document_ids[position], document_index)
+            )
+    return errors
+
+
+def truncated_mask(column, lengths):
+    """
+    Finds the strings NumPy truncated: fixed-width NumPy strings drop trailing NUL characters.
+
+    Args:
+        column (numpy.ndarray): The strings as a NumPy string array.
+        lengths (numpy.ndarray): The lengths of the original Python strings.
+
+    Returns:
+        numpy.ndarray: True where the NumPy string is shorter than the original one.
+    """
+    return np.char.str_len(column) != lengths
+
+
+def entity_id_format_mask(texts):
+    """
+    Checks the `^[A-Z0-9]{6}$` format of stripped RP_ENTITY_ID texts, over a whole list.
+
+    Args:
+        texts (list): The RP_ENTITY_IDs converted with `str`.
+
+    Returns:
+        numpy.ndarray: True where the stripped text is 6 uppercase letters or digits.
+    """
+    if not texts:
+        return np.zeros(0, dtype=bool)
+
+    column = np.array(texts, dtype=str)
+    stripped = np.char.strip(column)
+    valid = np.char.str_len(stripped) == 6
+
+    # Texts with trailing NUL characters are checked one by one, see `truncated_mask`
+    truncated = truncated_mask(column, np.fromiter(map(len, texts), dtype=np.int64))
+
+    code_points = stripped[valid].astype("U6").view(np.uint32).reshape(-1, 6)
+    valid[valid] = (
+        ((code_points >= ord("A")) & (code_points <= ord("Z")))
+        | ((code_points >= ord("0")) & (code_points <= ord("9")))
+    ).all(axis=1)
+
+    for position in np.flatnonzero(truncated).tolist():
+        valid[position] = bool(RP_ENTITY_ID_PATTERN.match(texts[position].strip()))
+    return valid
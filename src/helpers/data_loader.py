@@ -1,12 +1,44 @@
 """
 This module contains functions for loading JSON data from files.
+
+`load_json_data` returns every record as a list, while `iter_json_records` yields them lazily
+so large files can be processed without holding them in memory. When an extraction tool that
+can write to stdout is installed (`unrar` or `bsdtar`), .rar archives are streamed through a
+pipe instead of being unpacked into a temporary directory.
+
+Lines are decoded by the fastest JSON decoder installed (see `json_decoder`). With
+`binary=True`, files are read in large binary chunks and the lines are decoded without being
+turned into text first. With `projected=True`, records are decoded into ProjectedRecord
+instances holding only the fields the analytics read (see `projection`), and
+`iter_record_batches` groups them into columnar batches (see `columnar`).
+
+`iter_line_offsets` pairs every binary line with the byte offset it ends at, so a run can
+resume from a checkpoint: plain files are read from that offset, and .rar members are
+decompressed again while the bytes before it are skipped.
 """
 
+import glob
+import io
 import json
 import os
 import shutil
+import subprocess
 import tempfile
 import patoolib
+from .json_decoder import decode_json_line, get_json_decoder
+from .projection import decode_projected_line
+from .columnar import BATCH_SIZE, batch_records
+
+# Commands used to stream .rar members through a pipe, in order of preference.
+# "list" prints one member name per line, "extract" writes a member to stdout.
+RAR_STREAM_COMMANDS = {
+    "unrar": {"list": ["unrar", "lb", "-inul"], "extract": ["unrar", "p", "-inul"]},
+    "bsdtar": {"list": ["bsdtar", "-tf"], "extract": ["bsdtar", "-xOf"]},
+}
+
+# Bytes read at once when reading files in binary mode. Binary lines are split on line feeds
+# only: unlike text mode, a lone carriage return doesn't end a line.
+CHUNK_SIZE = 1024 * 1024
 
 
 def create_temp_directory():
@@ -47,6 +79,180 @@ def extract_rar_file(rar_path, temp_dir):
         return None
 
 
+def extract_rar_members(rar_path, temp_dir):
+    """
+    Extracts a .rar file to a given temporary directory and lists every extracted file.
+
+    Args:
+        rar_path (str): The path to the .rar file.
+        temp_dir (str): The path to the temporary directory where the .rar file will be extracted.
+
+    Returns:
+        list: The paths to the extracted files, sorted by name. Empty if extraction failed.
+    """
+    try:
+        patoolib.extract_archive(rar_path, outdir=temp_dir)
+    except patoolib.util.PatoolError as e:
+        print(f"Error extracting .rar file: {e}")
+        return []
+
+    return sorted(
+        os.path.join(root, file_name)
+        for root, _, file_names in os.walk(temp_dir)
+        for file_name in file_names
+    )
+
+
+def get_rar_stream_command():
+    """
+    Finds an installed tool able to stream .rar members to stdout.
+
+    Returns:
+        dict: The "list" and "extract" commands of the first available tool in
+        `RAR_STREAM_COMMANDS`, or None if none is installed.
+    """
+    for executable, commands in RAR_STREAM_COMMANDS.items():
+        if shutil.which(executable):
+            return commands
+    return None
+
+
+def list_rar_members(rar_path, commands):
+    """
+    Lists the files contained in a .rar archive without extracting it.
+
+    If the tool of `commands` can't list the archive (e.g. a tool without RAR5 support), the
+    next installed tools of `RAR_STREAM_COMMANDS` are tried in order. The members are then
+    streamed by the tool that listed them.
+
+    Args:
+        rar_path (str): The path to the .rar file.
+        commands (dict): The commands returned by `get_rar_stream_command`.
+
+    Returns:
+        tuple: A tuple containing:
+            - list: The member names in archive order.
+            - dict: The commands of the tool that listed them, or None if no tool could read
+              the archive, which is then left to patool (see `extract_rar_members`).
+    """
+    for tool_commands in iter_rar_stream_commands(commands):
+        result = subprocess.run(
+            tool_commands["list"] + [rar_path], capture_output=True, text=True, check=False
+        )
+        if result.returncode == 0:
+            # Directory entries are listed with a trailing slash by some tools
+            members = [
+                name for name in result.stdout.splitlines() if name and not name.endswith("/")
+            ]
+            return members, tool_commands
+        print(f"Error listing .rar file: {result.stderr.strip()}")
+
+    return [], None
+
+
+def iter_rar_stream_commands(commands):
+    """
+    Yields the commands of a streaming tool, then those of the installed tools after it in
+    `RAR_STREAM_COMMANDS`.
+
+    Args:
+        commands (dict): The commands returned by `get_rar_stream_command`.
+
+    Yields:
+        dict: The "list" and "extract" commands of each tool, in order of preference.
+    """
+    yield commands
+    following = False
+    for executable, tool_commands in RAR_STREAM_COMMANDS.items():
+        if following and shutil.which(executable):
+            yield tool_commands
+        following = following or tool_commands == commands
+
+
+def iter_rar_member_lines(rar_path, member, commands, binary=False):
+    """
+    Lazily yields the text lines of a .rar member, decompressed through a pipe.
+
+    Nothing is written to disk: the extraction tool writes the member to stdout and the lines
+    are read as they are decompressed. If the generator is closed early, the tool is stopped.
+
+    Args:
+        rar_path (str): The path to the .rar file.
+        member (str): The name of the member to stream.
+        commands (dict): The commands returned by `get_rar_stream_command`.
+        binary (bool): If True, yield the lines as bytes, read in chunks (see `CHUNK_SIZE`).
+
+    Yields:
+        str or bytes: The lines of the member.
+
+    Raises:
+        RuntimeError: If the extraction tool fails.
+    """
+    process = subprocess.Popen(  # pylint: disable=consider-using-with
+        commands["extract"] + [rar_path, member],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        bufsize=CHUNK_SIZE,
+    )
+    try:
+        if binary:
+            yield from process.stdout
+        else:
+            yield from io.TextIOWrapper(process.stdout, encoding="utf-8")
+        if process.wait() != 0:
+            raise RuntimeError(f"Error extracting {member} from .rar file: {rar_path}")
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+
+
+def list_input_files(input_path):
+    """
+    Lists the files to process for a file, a directory or a glob pattern.
+
+    Args:
+        input_path (str): A file, a directory (its files are listed, not its subdirectories),
+            or a glob pattern (`**` matches subdirectories).
+
+    Returns:
+        list: The paths of the matching files, sorted. Hidden files are skipped.
+
+    Raises:
+        FileNotFoundError: If no file matches.
+    """
+    if os.path.isfile(input_path):
+        return [input_path]
+    if os.path.isdir(input_path):
+        candidates = [os.path.join(input_path, name) for name in os.listdir(input_path)]
+    else:
+        candidates = glob.glob(input_path, recursive=True)
+
+    file_paths = sorted(
+        path
+        for path in candidates
+        if os.path.isfile(path) and not os.path.basename(path).startswith(".")
+    )
+    if not file_paths:
+        raise FileNotFoundError(f"No file found: {input_path}")
+    return file_paths
+
+
+def is_batch_input(input_path):
+    """
+    Tells whether an input path names several files: a directory or a glob pattern.
+
+    Args:
+        input_path (str): The input path.
+
+    Returns:
+        bool: True for a directory, or a glob pattern that isn't an existing file's name.
+    """
+    has_wildcards = any(character in input_path for character in "*?[")
+    return os.path.isdir(input_path) or (has_wildcards and not os.path.exists(input_path))
+
+
 def cleanup_temp_directory(temp_dir):
     """
     Deletes the temporary directory and all its contents.
@@ -59,11 +265,227 @@ def cleanup_temp_directory(temp_dir):
         print(f"Deleted temporary directory: {temp_dir}")
 
 
+def print_parse_error(line, error):
+    """
+    Prints a line that could not be parsed as JSON along with the parsing error.
+
+    Args:
+        line (str): The stripped line that failed to parse.
+        error (json.JSONDecodeError): The error raised while parsing the line.
+    """
+    print(f"Error parsing JSON line: {line}")
+    print(f"Error: {error}")
+
+
+def parse_json_lines(lines, on_error=None, loads=None, projected=False):
+    """
+    Lazily parses an iterable of JSON lines.
+
+    Args:
+        lines (iterable): The lines to parse (`str` or UTF-8 `bytes`), e.g. an open file.
+        on_error (callable, optional): Called as `on_error(line, error)` for every line that
+            is not valid JSON, with the stripped text of the line. Invalid lines are skipped
+            silently if not provided.
+        loads (callable, optional): The JSON decoder, see `get_json_decoder`. Defaults to the
+            fastest one installed.
+        projected (bool): If True, yield ProjectedRecord instances instead of dictionaries.
+
+    Yields:
+        dict: The parsed JSON object for each valid line.
+    """
+    loads = loads or get_json_decoder()
+    decode = decode_projected_line if projected else decode_json_line
+    for line in lines:
+        try:
+            yield decode(line, loads)
+        except json.JSONDecodeError as e:
+            if on_error is not None:
+                on_error(e.doc, e)
+
+
+def iter_lines(file_path, binary=False):
+    """
+    Lazily yields the text lines of a file. If the file is a .rar archive, the lines of every
+    member are yielded in archive order. Members are streamed straight from the extraction
+    tool when an installed one can list them (see `list_rar_members`). Otherwise the archive
+    is extracted to a temporary directory which is deleted once the lines are exhausted (or
+    the generator is closed).
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file containing the JSON file.
+        binary (bool): If True, yield the lines as bytes, read in chunks (see `CHUNK_SIZE`).
+
+    Yields:
+        str or bytes: The lines of the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist or the .rar archive is empty.
+    """
+    temp_dir = None
+
+    # Check if the file is a .rar file
+    if file_path.endswith(".rar"):
+        commands = get_rar_stream_command()
+        if commands:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"No file found: {file_path}")
+            members, commands = list_rar_members(file_path, commands)
+            if members:
+                for member in members:
+                    yield from iter_rar_member_lines(file_path, member, commands, binary)
+                return
+
+        # No streaming tool installed (or none could read the archive), fall back to
+        # extracting into a temporary directory
+        temp_dir = create_temp_directory()
+        extracted_file_paths = extract_rar_members(file_path, temp_dir)
+        if not extracted_file_paths:
+            cleanup_temp_directory(temp_dir)
+            raise FileNotFoundError(f"No file found in the .rar archive: {file_path}")
+    else:
+        extracted_file_paths = [file_path]
+
+    try:
+        for extracted_file_path in extracted_file_paths:
+            yield from iter_file_lines(extracted_file_path, binary)
+    finally:
+        if temp_dir:
+            cleanup_temp_directory(temp_dir)
+
+
+def iter_file_lines(file_path, binary=False):
+    """
+    Lazily yields the text lines of a plain (not archived) file.
+
+    Args:
+        file_path (str): The path to the file.
+        binary (bool): If True, yield the lines as bytes, read in chunks (see `CHUNK_SIZE`).
+
+    Yields:
+        str or bytes: The lines of the file.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    try:
+        if binary:
+            with open(file_path, "rb", buffering=CHUNK_SIZE) as file:
+                yield from file
+            return
+        with open(file_path, "r", encoding="utf-8") as file:
+            yield from file
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(f"No file found: {file_path}") from exc
+
+
+def iter_line_offsets(file_path, start_offset=0):
+    """
+    Lazily yields the binary lines of a file with their end offsets, from a given offset.
+
+    Offsets count the bytes of the decompressed lines, so for a .rar archive they run across
+    its members in archive order. Plain files are read from `start_offset` directly. A .rar
+    stream can't seek, so its lines before `start_offset` are decompressed and skipped.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file containing the JSON file.
+        start_offset (int): The offset to start from, which must be the end offset of a line
+            yielded by a previous call (or 0).
+
+    Yields:
+        tuple: The offset right after the line, and the line (bytes).
+
+    Raises:
+        FileNotFoundError: If the file does not exist or the .rar archive is empty.
+    """
+    offset = 0
+    if file_path.endswith(".rar"):
+        for line in iter_lines(file_path, binary=True):
+            offset += len(line)
+            if offset > start_offset:
+                yield offset, line
+        return
+
+    try:
+        with open(file_path, "rb", buffering=CHUNK_SIZE) as file:
+            file.seek(start_offset)
+            offset = start_offset
+            for line in file:
+                offset += len(line)
+                yield offset, line
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(f"No file found: {file_path}") from exc
+
+
+def iter_json_records(file_path, on_error=None, binary=False, projected=False):
+    """
+    Lazily yields the JSON records of a file, one at a time. .rar archives are read as
+    described in `iter_lines`.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file containing the JSON file.
+        on_error (callable, optional): Called as `on_error(line, error)` for every line that
+            is not valid JSON.
+        binary (bool): If True, read the file in binary chunks (see `CHUNK_SIZE`).
+        projected (bool): If True, yield ProjectedRecord instances instead of dictionaries.
+
+    Yields:
+        dict: The parsed JSON records.
+
+    Raises:
+        FileNotFoundError: If the file does not exist or the .rar archive is empty.
+    """
+    return parse_json_lines(iter_lines(file_path, binary), on_error, projected=projected)
+
+
+def iter_file_records(file_path, on_error=None, binary=False, projected=False):
+    """
+    Lazily yields the JSON records of a plain (not archived) JSON lines file.
+
+    Args:
+        file_path (str): The path to the JSON file.
+        on_error (callable, optional): Called as `on_error(line, error)` for every line that
+            is not valid JSON.
+        binary (bool): If True, read the file in binary chunks (see `CHUNK_SIZE`).
+        projected (bool): If True, yield ProjectedRecord instances instead of dictionaries.
+
+    Yields:
+        dict: The parsed JSON records.
+
+    Raises:
+        FileNotFoundError: If the file does not exist.
+    """
+    return parse_json_lines(iter_file_lines(file_path, binary), on_error, projected=projected)
+
+
+def iter_record_batches(file_path, on_error=None, batch_size=BATCH_SIZE):
+    """
+    Lazily yields the records of a file as columnar RecordBatch instances of projected
+    records. .rar archives are read as described in `iter_lines`.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file containing the JSON file.
+        on_error (callable, optional): Called as `on_error(line, error)` for every line that
+            is not valid JSON.
+        batch_size (int): The number of records per batch.
+
+    Yields:
+        RecordBatch: The batches, in feed order.
+
+    Raises:
+        FileNotFoundError: If the file does not exist or the .rar archive is empty.
+        ImportError: If NumPy is not installed.
+    """
+    records = iter_json_records(file_path, on_error, binary=True, projected=True)
+    return batch_records(records, batch_size)
+
+
 def load_json_data(file_path):
     """
     Loads a list of JSON objects from a file. If the file is a .rar archive,
     it extracts the file from it and returns the parsed data.
 
+    Use `iter_json_records` instead to avoid holding every record in memory.
+
     Args:
         file_path (str): The path to the JSON file or .rar file containing the JSON file.
         temp_dir (str, optional): The path to the temporary directory for extraction, if provided.
@@ -73,7 +495,6 @@ def load_json_data(file_path):
             - list: A list of JSON objects loaded from the file.
             - str: The path to the temporary directory used for extraction (if any).
     """
-    data = []
     temp_dir = None
 
     # Check if the file is a .rar file
@@ -88,12 +509,7 @@ def load_json_data(file_path):
     # Now load the JSON data from the file
     try:
         with open(file_path, "r", encoding="utf-8") as file:
-            for line in file:
-                try:
-                    data.append(json.loads(line.strip()))
-                except json.JSONDecodeError as e:
-                    print(f"Error parsing JSON line: {line.strip()}")
-                    print(f"Error: {e}")
+            data = list(parse_json_lines(file, on_error=print_parse_error))
     except FileNotFoundError as exc:
         raise FileNotFoundError(f"No file found in the .rar archive: {file_path}") from exc
     if temp_dir:
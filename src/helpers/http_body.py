@@ -0,0 +1,191 @@
+"""
+This module reads the body of an HTTP request as a file, while it's being received.
+
+`open_request_body` wraps the input stream of a request in a buffered reader that stops at
+the end of the body, whether its size is given by `Content-Length` or it's sent with
+`Transfer-Encoding: chunked`. The body can then be read like any binary file: iterating over
+it yields its lines as they arrive, without holding the whole body in memory.
+"""
+
+import io
+from .data_loader import CHUNK_SIZE
+
+# The first bytes of the archives accepted as .rar files: RAR 4 and RAR 5 archives, and ZIP
+# archives, which the extraction tools also read whatever their extension
+ARCHIVE_SIGNATURES = (b"Rar!\x1a\x07", b"PK\x03\x04")
+
+
+class RequestBody(io.RawIOBase):
+    """
+    A raw binary stream reading the body of an HTTP request from its connection.
+
+    Attributes:
+        stream (BufferedReader): The input stream of the connection.
+        chunked (bool): Whether the body is sent in chunks, each one preceded by its size.
+        remaining (int): The bytes left to read in the body, or in the current chunk.
+        finished (bool): Whether the end of the body was reached.
+        pending (bytes): The bytes read ahead by `read_ahead`, not read from the body yet.
+    """
+
+    def __init__(self, stream, content_length=None, chunked=False):
+        """
+        Initializes the RequestBody class.
+
+        Args:
+            stream (BufferedReader): The input stream of the connection.
+            content_length (int, optional): The size of the body, when it's not chunked.
+            chunked (bool): Whether the body is sent with `Transfer-Encoding: chunked`.
+        """
+        super().__init__()
+        self.stream = stream
+        self.chunked = chunked
+        self.remaining = 0 if chunked else content_length
+        self.finished = not chunked and not content_length
+        self.pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """
+        Reads the next bytes of the body, starting with the ones read ahead.
+
+        Args:
+            buffer (bytearray or memoryview): The buffer to read into.
+
+        Returns:
+            int: The number of bytes read, 0 at the end of the body or for an empty buffer.
+
+        Raises:
+            ConnectionError: If the connection ended before the body.
+            ValueError: If a chunk size isn't valid.
+        """
+        if not len(buffer):
+            return 0
+        if self.pending:
+            size = min(len(buffer), len(self.pending))
+            buffer[:size] = self.pending[:size]
+            self.pending = self.pending[size:]
+            return size
+        return self.read_body(buffer)
+
+    def read_ahead(self, size):
+        """
+        Reads the body until `size` bytes are pending, or its end, without consuming them.
+
+        A single read may return less than asked, e.g. with a small first chunk.
+
+        Args:
+            size (int): The number of bytes to read ahead.
+
+        Returns:
+            bytes: The pending bytes, `size` of them unless the body is shorter.
+
+        Raises:
+            ConnectionError: If the connection ended before the body.
+            ValueError: If a chunk size isn't valid.
+        """
+        while len(self.pending) < size:
+            buffer = bytearray(size - len(self.pending))
+            read = self.read_body(buffer)
+            if not read:
+                break
+            self.pending += buffer[:read]
+        return self.pending
+
+    def read_body(self, buffer):
+        """
+        Reads the next bytes of the body from the connection.
+
+        Args:
+            buffer (bytearray or memoryview): The buffer to read into. It's not empty.
+
+        Returns:
+            int: The number of bytes read, 0 at the end of the body.
+
+        Raises:
+            ConnectionError: If the connection ended before the body.
+            ValueError: If a chunk size isn't valid.
+        """
+        if self.chunked and self.remaining == 0 and not self.finished:
+            self.start_chunk()
+        if self.finished:
+            return 0
+
+        # At most one read from the connection, so the data is parsed as soon as it arrives
+        size = self.stream.readinto1(memoryview(buffer)[: min(len(buffer), self.remaining)])
+        if not size:
+            raise ConnectionError("The connection ended before the end of the request body")
+
+        self.remaining -= size
+        if self.remaining == 0:
+            if self.chunked:
+                # Every chunk is followed by a line break
+                self.stream.readline()
+            else:
+                self.finished = True
+        return size
+
+    def start_chunk(self):
+        """
+        Reads the size of the next chunk, and the trailers after the last one.
+
+        Raises:
+            ConnectionError: If the connection ended before the chunk size.
+            ValueError: If the chunk size isn't a hexadecimal number.
+        """
+        size_line = self.stream.readline()
+        if not size_line:
+            raise ConnectionError("The connection ended before the end of the request body")
+
+        # Chunk extensions (after a semicolon) are ignored
+        self.remaining = int(size_line.split(b";")[0].strip(), 16)
+        if self.remaining == 0:
+            # The last chunk: skip the trailer fields, up to the empty line ending the body
+            while self.stream.readline().strip():
+                pass
+            self.finished = True
+
+
+def open_request_body(stream, headers):
+    """
+    Opens the body of an HTTP request as a buffered binary file.
+
+    Args:
+        stream (BufferedReader): The input stream of the connection.
+        headers (Message): The headers of the request.
+
+    Returns:
+        BufferedReader: The body, yielding its lines (with their line feeds) when iterated.
+
+    Raises:
+        ValueError: If the request has neither a valid `Content-Length` nor
+            `Transfer-Encoding: chunked`.
+    """
+    if "chunked" in headers.get("Transfer-Encoding", "").lower():
+        return io.BufferedReader(RequestBody(stream, chunked=True), CHUNK_SIZE)
+
+    content_length = headers.get("Content-Length")
+    if content_length is None or not content_length.strip().isdigit():
+        raise ValueError("The request needs a Content-Length or a chunked Transfer-Encoding")
+    return io.BufferedReader(RequestBody(stream, int(content_length)), CHUNK_SIZE)
+
+
+def is_archive_data(body):
+    """
+    Tells whether a request body is an archive, from its first bytes.
+
+    A body opened by `open_request_body` is read until a whole signature is buffered or the
+    body ended, since a single read may return fewer bytes.
+
+    Args:
+        body (BufferedReader): The body, see `open_request_body`, before anything was read
+            from it. It isn't consumed.
+
+    Returns:
+        bool: True if the body starts with the signature of a .rar (or ZIP) archive.
+    """
+    size = max(len(signature) for signature in ARCHIVE_SIGNATURES)
+    if isinstance(body.raw, RequestBody):
+        body.raw.read_ahead(size)
+    return body.peek(size).startswith(ARCHIVE_SIGNATURES)
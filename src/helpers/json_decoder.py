@@ -0,0 +1,136 @@
+"""
+This module picks the JSON decoder used to parse the lines of a file.
+
+msgspec and orjson are much faster than the standard library, so the first one installed is
+used, falling back to `json`. Lines a fast decoder rejects are parsed again with `json`, so
+the reported errors are the same whichever decoder is used.
+
+The records are the same too. orjson decodes integers beyond 64 bits as floats, so a line
+decoded by orjson into a float that large is decoded again with `json`, which keeps the
+integer. msgspec decodes them exactly, which is why it's preferred.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed packages
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depends on the installed packages
+    msgspec = None
+
+# Decoders in order of preference, see `get_json_decoder`
+JSON_DECODERS = ("msgspec", "orjson", "json")
+
+# orjson decodes the integers outside [-2**63, 2**64) as floats, which are at least this large
+ORJSON_FLOAT_LIMIT = float(2**63)
+
+# Errors raised by the decoders on invalid JSON (orjson's is a ValueError)
+DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec else (ValueError,)
+
+
+def get_json_decoder(name=None):
+    """
+    Returns the function used to decode a JSON line.
+
+    Args:
+        name (str, optional): One of `JSON_DECODERS`. Defaults to the first one installed.
+
+    Returns:
+        callable: A function decoding a `str` or `bytes` JSON document.
+
+    Raises:
+        ValueError: If the decoder is unknown or not installed.
+    """
+    decoders = {
+        "orjson": orjson_loads if orjson else None,
+        "msgspec": msgspec.json.decode if msgspec else None,
+        "json": json.loads,
+    }
+    if name is None:
+        return next(decoders[decoder] for decoder in JSON_DECODERS if decoders[decoder])
+    if name not in decoders:
+        raise ValueError(f"Unknown JSON decoder: {name}")
+    if decoders[name] is None:
+        raise ValueError(f"JSON decoder not installed: {name}")
+    return decoders[name]
+
+
+def orjson_loads(line):
+    """
+    Decodes a JSON document with orjson, keeping the integers beyond 64 bits.
+
+    Args:
+        line (str or bytes): The JSON document. Bytes must be UTF-8 encoded.
+
+    Returns:
+        The decoded JSON document, decoded by `json.loads` if orjson gave a float that may
+        have been such an integer.
+
+    Raises:
+        orjson.JSONDecodeError: If the document is not valid JSON for orjson.
+    """
+    document = orjson.loads(line)
+    if has_large_float(document):
+        return json.loads(line)
+    return document
+
+
+def has_large_float(value):
+    """
+    Checks if a decoded JSON value holds a float of at least `ORJSON_FLOAT_LIMIT` in absolute
+    value.
+
+    Args:
+        value: The decoded JSON value.
+
+    Returns:
+        bool: True if such a float is found, at any depth.
+    """
+    value_type = type(value)
+    if value_type is dict:
+        values = value.values()
+    elif value_type is list:
+        values = value
+    else:
+        return value_type is float and abs(value) >= ORJSON_FLOAT_LIMIT
+
+    for item in values:
+        item_type = type(item)
+        if item_type is float:
+            if abs(item) >= ORJSON_FLOAT_LIMIT:
+                return True
+        elif (item_type is dict or item_type is list) and has_large_float(item):
+            return True
+    return False
+
+
+def decode_json_line(line, loads=json.loads):
+    """
+    Decodes a JSON line.
+
+    The line is first decoded as is by `loads`, JSON ignores the surrounding whitespace. If
+    that fails, the stripped text of the line is decoded by `json.loads`, which accepts a few
+    documents the fast decoders don't (e.g. NaN) and raises the same error the loader always
+    reported.
+
+    Args:
+        line (str or bytes): The line to decode. Bytes must be UTF-8 encoded.
+        loads (callable): The decoder returned by `get_json_decoder`.
+
+    Returns:
+        The decoded JSON document.
+
+    Raises:
+        json.JSONDecodeError: If the line is not valid JSON. Its `doc` attribute holds the
+            stripped text of the line.
+    """
+    try:
+        return loads(line)
+    except DECODE_ERRORS:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        return json.loads(line.strip())
@@ -0,0 +1,171 @@
+"""
+This module decodes JSON lines into compact ProjectedRecord instances.
+
+The analytics and the RP_ENTITY_ID validation only read four fields of a record, and compare
+whole records to tell identical and different duplicates apart. A ProjectedRecord keeps those
+four fields and a fingerprint of the raw line standing in for the rest of the row, so wide
+feed rows aren't kept as full dictionaries.
+
+When msgspec is installed, only the four fields are decoded and the rest of the row is
+skipped. Otherwise the line is decoded in full by the fastest decoder installed and projected.
+"""
+
+import hashlib
+from typing import Any
+from .json_decoder import DECODE_ERRORS, decode_json_line, get_json_decoder
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - depends on the installed packages
+    msgspec = None
+
+# The fields kept by a ProjectedRecord
+PROJECTED_FIELDS = (
+    "RP_DOCUMENT_ID",
+    "RP_ENTITY_ID",
+    "DOCUMENT_RECORD_INDEX",
+    "DOCUMENT_RECORD_COUNT",
+)
+
+
+class ProjectedRecord:
+    """
+    The fields of a record read by the analytics and the validation, plus a content fingerprint.
+
+    It supports the read-only parts of the dictionary interface the processor and validators
+    use (`get`, `in` and item access). Two projected records are equal if their lines were
+    byte for byte identical, once stripped: rows with the same content serialized differently
+    (e.g. with another key order) are different duplicates.
+
+    Attributes:
+        RP_DOCUMENT_ID: The RP_DOCUMENT_ID of the record.
+        RP_ENTITY_ID: The RP_ENTITY_ID of the record.
+        DOCUMENT_RECORD_INDEX: The DOCUMENT_RECORD_INDEX of the record.
+        DOCUMENT_RECORD_COUNT: The DOCUMENT_RECORD_COUNT of the record.
+        fingerprint (bytes): The digest of the stripped line, see `line_fingerprint`.
+        missing (tuple): The projected fields that weren't in the record.
+    """
+
+    __slots__ = PROJECTED_FIELDS + ("fingerprint", "missing")
+
+    def __init__(self, fields, fingerprint):
+        """
+        Initializes the ProjectedRecord class.
+
+        Args:
+            fields (dict): The record, or at least its projected fields.
+            fingerprint (bytes): The digest of the line, see `line_fingerprint`.
+        """
+        for field in PROJECTED_FIELDS:
+            setattr(self, field, fields.get(field))
+        self.fingerprint = fingerprint
+        self.missing = tuple(field for field in PROJECTED_FIELDS if field not in fields)
+
+    def get(self, field, default=None):
+        """
+        Returns a field of the record, like `dict.get`.
+
+        Args:
+            field (str): The field name.
+            default: The value returned if the field isn't in the record.
+
+        Returns:
+            The field value, or `default`.
+        """
+        if field not in self:
+            return default
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in PROJECTED_FIELDS and field not in self.missing
+
+    def __getitem__(self, field):
+        if field not in self:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __eq__(self, other):
+        if not isinstance(other, ProjectedRecord):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return hash(self.fingerprint)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={self.get(field)!r}" for field in PROJECTED_FIELDS)
+        return f"ProjectedRecord({fields})"
+
+
+if msgspec is not None:
+
+    class ProjectedFields(msgspec.Struct):
+        """
+        The projected fields, decoded by msgspec while the rest of the row is skipped.
+        """
+
+        RP_DOCUMENT_ID: Any = msgspec.UNSET
+        RP_ENTITY_ID: Any = msgspec.UNSET
+        DOCUMENT_RECORD_INDEX: Any = msgspec.UNSET
+        DOCUMENT_RECORD_COUNT: Any = msgspec.UNSET
+
+    PROJECTED_DECODER = msgspec.json.Decoder(ProjectedFields)
+else:  # pragma: no cover - depends on the installed packages
+    PROJECTED_DECODER = None
+
+
+def line_fingerprint(line):
+    """
+    Computes the content fingerprint of a JSON line.
+
+    Args:
+        line (str or bytes): The line. Bytes must be UTF-8 encoded.
+
+    Returns:
+        bytes: The 20-byte SHA-1 digest of the stripped line.
+    """
+    if isinstance(line, str):
+        line = line.strip().encode("utf-8")
+    else:
+        line = line.strip()
+
+    # SHA-1 is hardware accelerated on most CPUs, and only tells rows apart, not secure them
+    return hashlib.sha1(line, usedforsecurity=False).digest()
+
+
+def decode_projected_line(line, loads=None):
+    """
+    Decodes a JSON line into a ProjectedRecord.
+
+    Args:
+        line (str or bytes): The line to decode. Bytes must be UTF-8 encoded.
+        loads (callable, optional): The decoder used when msgspec isn't installed (or rejects
+            the line), see `get_json_decoder`. Defaults to the fastest one installed.
+
+    Returns:
+        ProjectedRecord: The projected record. Lines that aren't a JSON object are returned
+        decoded as is.
+
+    Raises:
+        json.JSONDecodeError: If the line is not valid JSON, see `decode_json_line`.
+    """
+    if PROJECTED_DECODER is not None:
+        try:
+            fields = PROJECTED_DECODER.decode(line)
+        except DECODE_ERRORS:
+            # Not an object, or only valid for `json` (e.g. NaN): decode the whole line
+            pass
+        else:
+            return ProjectedRecord(
+                {
+                    field: getattr(fields, field)
+                    for field in PROJECTED_FIELDS
+                    if getattr(fields, field) is not msgspec.UNSET
+                },
+                line_fingerprint(line),
+            )
+
+    record = decode_json_line(line, loads or get_json_decoder())
+    if not isinstance(record, dict):
+        return record
+    return ProjectedRecord(record, line_fingerprint(line))
@@ -0,0 +1,231 @@
+"""
+This module persists the analytics state of a DataProcessor between runs.
+
+When a vendor delivers the records of the same documents across several files, the state of
+the processor (the documents being tracked and the results so far) is saved to a snapshot file
+after each file, and loaded before the next one. Each run then only reads its new records, and
+its results are the ones of all the files delivered so far, as if they had been concatenated.
+
+A checkpoint is the same snapshot taken in the middle of a file, along with the validation
+errors so far and the byte offset the loader reached (see `iter_line_offsets`). A run that
+crashed restarts from its last checkpoint and gives the results of an uninterrupted run.
+
+Snapshots are pickle files, replaced atomically. Only load snapshots written by this
+application: unpickling runs code from the file.
+"""
+
+import os
+import pickle
+import time
+
+# Bumped whenever the layout of the snapshot changes
+STATE_VERSION = 1
+
+# The DataProcessor attributes making up the analytics state
+STATE_ATTRIBUTES = (
+    "document_records",
+    "results",
+    "logged_invalid_document_ids",
+    "evicted_document_ids",
+    "document_last_seen",
+    "records_processed",
+)
+
+# Checkpoints also hold the validation errors of the records already read
+CHECKPOINT_ATTRIBUTES = STATE_ATTRIBUTES + ("validation_errors",)
+
+
+def save_state(processor, state_path):
+    """
+    Saves the analytics state of a processor to a snapshot file.
+
+    It must be called before `finalize_analytics`, which adds the missing and extra indices
+    of the documents to the results: those are computed again after the next file.
+
+    Args:
+        processor (DataProcessor): The processor to save.
+        state_path (str): The path to the snapshot file.
+
+    Side Effects:
+        - Replaces the snapshot file atomically, see `write_snapshot`.
+    """
+    write_snapshot(processor, state_path, STATE_ATTRIBUTES)
+
+
+def load_state(processor, state_path):
+    """
+    Restores the analytics state of a processor from a snapshot file, if there is one.
+
+    Args:
+        processor (DataProcessor): A new processor, which must compare duplicates the same
+            way (`store_digests`) as the one that was saved.
+        state_path (str): The path to the snapshot file.
+
+    Returns:
+        bool: True if a snapshot was loaded, False if the file doesn't exist.
+
+    Raises:
+        ValueError: If the snapshot has another version or was saved with another
+            `store_digests` setting.
+    """
+    if not os.path.exists(state_path):
+        return False
+
+    read_snapshot(processor, state_path, STATE_ATTRIBUTES)
+    return True
+
+
+def save_checkpoint(processor, checkpoint_path, source_path, offset, previous_statuses=None):
+    """
+    Saves a checkpoint of a run in the middle of a file.
+
+    Args:
+        processor (DataProcessor): The processor, with its `validation_errors`.
+        checkpoint_path (str): The path to the checkpoint file.
+        source_path (str): The file being processed.
+        offset (int): The end offset of the last line processed.
+        previous_statuses (dict, optional): The document statuses before the run, when the
+            state is also kept across files (see `document_statuses`).
+    """
+    write_snapshot(
+        processor,
+        checkpoint_path,
+        CHECKPOINT_ATTRIBUTES,
+        source=source_signature(source_path),
+        offset=offset,
+        previous_statuses=previous_statuses,
+    )
+
+
+def load_checkpoint(processor, checkpoint_path, source_path):
+    """
+    Restores a processor from the checkpoint of an interrupted run, if there is one.
+
+    Args:
+        processor (DataProcessor): A new processor, see `load_state`.
+        checkpoint_path (str): The path to the checkpoint file.
+        source_path (str): The file being processed.
+
+    Returns:
+        tuple: The offset to resume reading from and the `previous_statuses` saved with the
+        checkpoint, or None if the checkpoint file doesn't exist.
+
+    Raises:
+        ValueError: If the checkpoint was taken on another file (or the file changed since),
+            or can't be loaded by `load_state`.
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+
+    snapshot = read_snapshot(processor, checkpoint_path, CHECKPOINT_ATTRIBUTES)
+    if snapshot["source"] != source_signature(source_path):
+        raise ValueError(f"The checkpoint {checkpoint_path} was taken on another file")
+    return snapshot["offset"], snapshot["previous_statuses"]
+
+
+def source_signature(source_path):
+    """
+    Identifies a file by its path, size and modification time.
+
+    Args:
+        source_path (str): The path to the file.
+
+    Returns:
+        tuple: The absolute path, size and modification time (in nanoseconds) of the file.
+    """
+    stat = os.stat(source_path)
+    return (os.path.abspath(source_path), stat.st_size, stat.st_mtime_ns)
+
+
+def write_snapshot(processor, snapshot_path, attributes, **extra):
+    """
+    Writes some attributes of a processor to a snapshot file, atomically.
+
+    Args:
+        processor (DataProcessor): The processor to save.
+        snapshot_path (str): The path to the snapshot file.
+        attributes (tuple): The attributes of the processor to save.
+        **extra: Other values saved in the snapshot.
+
+    Side Effects:
+        - Writes the snapshot next to `snapshot_path`, then moves it over `snapshot_path`, so
+          an interrupted write leaves the previous snapshot in place.
+    """
+    snapshot = {attribute: getattr(processor, attribute) for attribute in attributes}
+    snapshot.update(extra)
+    snapshot["version"] = STATE_VERSION
+    snapshot["store_digests"] = processor.store_digests
+
+    temp_path = f"{snapshot_path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, snapshot_path)
+
+
+def read_snapshot(processor, snapshot_path, attributes):
+    """
+    Restores some attributes of a processor from a snapshot file.
+
+    Args:
+        processor (DataProcessor): The processor to restore.
+        snapshot_path (str): The path to the snapshot file.
+        attributes (tuple): The attributes of the processor to restore.
+
+    Returns:
+        dict: The whole snapshot, including the values saved as `extra`.
+
+    Raises:
+        ValueError: If the snapshot has another version or was saved with another
+            `store_digests` setting.
+    """
+    with open(snapshot_path, "rb") as snapshot_file:
+        snapshot = pickle.load(snapshot_file)
+
+    if snapshot.get("version") != STATE_VERSION:
+        raise ValueError(f"Unsupported state snapshot version: {snapshot.get('version')}")
+    if snapshot["store_digests"] != processor.store_digests:
+        raise ValueError("The state snapshot was saved with another store_digests setting")
+
+    for attribute in attributes:
+        setattr(processor, attribute, snapshot[attribute])
+
+    # The times of the previous run come from another monotonic clock: restart them now
+    now = time.monotonic()
+    for document_id, (position, _) in processor.document_last_seen.items():
+        processor.document_last_seen[document_id] = (position, now)
+    return snapshot
+
+
+def document_statuses(processor):
+    """
+    Computes the status of every document known to a processor.
+
+    Args:
+        processor (DataProcessor): The processor, before `finalize_analytics`.
+
+    Returns:
+        dict: The status of each document ID, see `DataProcessor.document_status`.
+    """
+    statuses = {document_id: "finalized" for document_id in processor.evicted_document_ids}
+    for document_id in processor.document_records:
+        statuses[document_id] = processor.document_status(document_id)
+    return statuses
+
+
+def status_changes(before, after):
+    """
+    Compares the document statuses of two points in time.
+
+    Args:
+        before (dict): The statuses before processing a file, see `document_statuses`.
+        after (dict): The statuses after processing it.
+
+    Returns:
+        dict: `(previous_status, status)` for each document whose status changed, where
+        `previous_status` is None for documents seen for the first time.
+    """
+    return {
+        document_id: (before.get(document_id), status)
+        for document_id, status in after.items()
+        if before.get(document_id) != status
+    }
@@ -0,0 +1,217 @@
+"""
+This module finds the files to process in a watched directory, and keeps the metrics of a
+watch run.
+
+`DirectoryWatcher` polls a directory (or a glob pattern) and reports every file once it's
+complete: a file is ready when its size and modification time didn't change for
+`settle_seconds`, so files still being written or copied aren't read halfway. A file that
+changes after it was reported is reported again.
+
+`WatchMetrics` records the throughput and latency of the processed files, and writes them to a
+JSON file that monitoring tools can read.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from .data_loader import list_input_files
+
+# The number of recent files the latency percentiles are computed on
+METRICS_WINDOW = 1000
+
+
+class DirectoryWatcher:
+    """
+    Polls a directory or a glob pattern for new and changed files.
+
+    Attributes:
+        input_path (str): The directory or glob pattern, see `list_input_files`.
+        settle_seconds (float): How long the size and modification time of a file must stay
+            the same before it's ready.
+        pending (dict): For each file not ready yet, its `(size, mtime_ns)` signature and the
+            time it was first seen with it.
+        reported (dict): The signature of each file when it was reported, for the files
+            still listed by the last poll.
+    """
+
+    def __init__(self, input_path, settle_seconds=1.0):
+        """
+        Initializes the DirectoryWatcher class.
+
+        Args:
+            input_path (str): The directory or glob pattern to watch.
+            settle_seconds (float): How long a file must stay unchanged before it's ready.
+        """
+        self.input_path = input_path
+        self.settle_seconds = settle_seconds
+        self.pending = {}
+        self.reported = {}
+
+    def poll(self, limit=None):
+        """
+        Lists the files that became ready since the last poll.
+
+        Args:
+            limit (int, optional): The maximum number of files to report. The other ready files
+                stay pending, and are reported by the next polls.
+
+        Returns:
+            list: `(path, size)` for each ready file, in path order.
+        """
+        try:
+            file_paths = list_input_files(self.input_path)
+        except FileNotFoundError:
+            # The watched directory is gone for now, the reported files are kept in case it
+            # comes back
+            self.pending = {}
+            return []
+
+        now = time.monotonic()
+        pending = {}
+        reported = {}
+        ready = []
+
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                # Removed since it was listed
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if self.reported.get(file_path) == signature:
+                reported[file_path] = signature
+                continue
+
+            previous_signature, first_seen = self.pending.get(file_path, (None, now))
+            if previous_signature != signature:
+                first_seen = now
+            settled = previous_signature == signature and now - first_seen >= self.settle_seconds
+
+            if settled and (limit is None or len(ready) < limit):
+                reported[file_path] = signature
+                ready.append((file_path, stat.st_size))
+            else:
+                pending[file_path] = (signature, first_seen)
+
+        # Files removed, before they were ready or since they were reported, are forgotten, so
+        # that a long-running watch doesn't keep every file it has ever seen
+        self.pending = pending
+        self.reported = reported
+        return ready
+
+
+class WatchMetrics:
+    """
+    The throughput and latency metrics of a watch run.
+
+    The latency of a file is the time from the poll that found it ready to the end of its
+    processing, so it includes the time spent waiting for a worker.
+
+    Attributes:
+        started (float): The wall clock time the run started at.
+        files_processed (int): The number of files processed, including the failed ones.
+        files_failed (int): The number of files whose processing failed.
+        files_in_flight (int): The number of files submitted and not done yet.
+        bytes_processed (int): The total size of the processed files.
+        processing_seconds (float): The total time spent processing files in the workers.
+        latencies (deque): The latencies of the last `METRICS_WINDOW` files, in seconds.
+        last_file (dict): The metrics of the last processed file.
+    """
+
+    def __init__(self):
+        """
+        Initializes the WatchMetrics class.
+        """
+        self.started = time.time()
+        self.files_processed = 0
+        self.files_failed = 0
+        self.files_in_flight = 0
+        self.bytes_processed = 0
+        self.processing_seconds = 0.0
+        self.latencies = deque(maxlen=METRICS_WINDOW)
+        self.last_file = None
+
+    def record(self, summary, size, latency):
+        """
+        Records a processed file.
+
+        Args:
+            summary (dict): The summary of the file, see `format_batch_summary`.
+            size (int): The size of the file, in bytes.
+            latency (float): The seconds from the file being found ready to its processing
+                being done.
+        """
+        self.files_processed += 1
+        self.files_failed += bool(summary["error"])
+        self.bytes_processed += size
+        self.processing_seconds += summary["seconds"]
+        self.latencies.append(latency)
+        self.last_file = {
+            "file": summary["file"],
+            "failed": bool(summary["error"]),
+            "bytes": size,
+            "seconds": summary["seconds"],
+            "latency_seconds": latency,
+            "bytes_per_second": size / summary["seconds"] if summary["seconds"] else None,
+        }
+
+    def snapshot(self):
+        """
+        Computes the current metrics.
+
+        Returns:
+            dict: The counters, the throughput (bytes per second of processing time, and files
+            per minute of the run) and the latency percentiles of the recent files.
+        """
+        uptime = time.time() - self.started
+        latencies = sorted(self.latencies)
+        return {
+            "uptime_seconds": uptime,
+            "files_processed": self.files_processed,
+            "files_failed": self.files_failed,
+            "files_in_flight": self.files_in_flight,
+            "bytes_processed": self.bytes_processed,
+            "bytes_per_second": (
+                self.bytes_processed / self.processing_seconds if self.processing_seconds else None
+            ),
+            "files_per_minute": self.files_processed * 60 / uptime if uptime else None,
+            "latency_seconds": {
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "max": latencies[-1] if latencies else None,
+            },
+            "last_file": self.last_file,
+        }
+
+    def write(self, metrics_path):
+        """
+        Writes the current metrics to a JSON file.
+
+        Args:
+            metrics_path (str): The path to the metrics file.
+
+        Side Effects:
+            - Writes the metrics next to `metrics_path`, then moves them over it, so readers
+              never see a partly written file.
+        """
+        temp_path = f"{metrics_path}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            json.dump(self.snapshot(), metrics_file, indent=2)
+        os.replace(temp_path, metrics_path)
+
+
+def percentile(values, fraction):
+    """
+    Picks a percentile of sorted values, by the nearest rank.
+
+    Args:
+        values (list): The sorted values.
+        fraction (float): The percentile, from 0 to 1.
+
+    Returns:
+        float: The value at that percentile, or None if there are no values.
+    """
+    if not values:
+        return None
+    return values[round(fraction * (len(values) - 1))]
@@ -1,39 +1,423 @@
 """
 This module serves as the entry point for the data processing and validation application.
-It loads JSON data, counts distinct stories, processes analytics to find missing and duplicate entries,
-and validates RP_ENTITY_IDs.
+It streams JSON records from a file, processes analytics to find missing and duplicate entries,
+and validates RP_ENTITY_IDs while reading the file only once. Every member of a .rar archive
+is processed in its own worker process, and `--workers N` partitions the records by
+RP_DOCUMENT_ID across N worker processes instead.
+
+`--projected` decodes only the fields the analytics read from every row, and compares rows
+by a fingerprint of their line to find duplicates.
+
+`--columnar` processes and validates the records in columnar batches with NumPy. The batches
+hold projected records, so rows are compared by a fingerprint of their line like with
+`--projected`: two rows with the same fields in another order are different duplicates. It
+can't be combined with the `--evict-*` options.
+
+The `--evict-*` options finalize documents while streaming a JSON lines file, so that the
+memory used stays flat on long feeds.
+
+`--state PATH` keeps the analytics state in a snapshot file across runs: each file delivered
+adds its records to the documents of the previous ones, and the log reports how the status of
+each document changed.
+
+`--checkpoint PATH` saves the progress of the run every `--checkpoint-every` lines. If the
+run is interrupted, running the same command again resumes from the last checkpoint.
+
+Given a directory or a glob pattern instead of a file, every matching file is processed in a
+pool of `--jobs` worker processes, one file per worker. Each file gets its own log, and a
+summary of the batch is logged to `batch_summary_logs.txt`.
+
+`--queued-log` writes the log file from a background thread, and only prints a summary of it
+on the console.
+
+`--results-format jsonl` (or `parquet`, with PyArrow) also writes the results as one record
+per document to `<file>_results.jsonl` next to the log file, for downstream jobs.
+
+`--log-max-bytes N` and `--log-rotate hourly|daily|weekly` rotate the log files instead of
+appending to them forever, keeping `--log-backups` segments, gzipped with `--log-compress`.
+
+`--watch` keeps running on a directory or glob pattern instead, and processes the files as they
+appear, in a resident pool of worker processes. Each file is summarized in `watch_logs.txt`,
+and the throughput and latency metrics of the run are kept in `watch_metrics.json`.
 """
 
-import sys
+import argparse
 from pathlib import Path
-from document_processor import DataProcessor
-from utils.validation import validate_rp_entity_ids
-from utils.logging import log
-from helpers.data_loader import load_json_data
-from helpers.teardown import teardown
+from utils.log_rotation import ROTATION_PERIODS, LogRotation
+from utils.logging import LoggingContext, log, log_batch_summary
+from utils.results_output import RESULTS_FORMATS, check_results_format
+from document_processor import EvictionPolicy
+from helpers.data_loader import is_batch_input, list_input_files
+from pipeline import (
+    CHECKPOINT_EVERY,
+    WATCH_POLL_INTERVAL,
+    analyze_file,
+    analyze_file_checkpointed,
+    analyze_file_sharded,
+    analyze_files,
+    watch_files,
+)
 
-def main(file_path, log_directory):
+def main(
+    file_path,
+    log_directory,
+    workers=None,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    state_path=None,
+    checkpoint_path=None,
+    checkpoint_every=CHECKPOINT_EVERY,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+):
     """
     Main function to load data, process analytics, and log the results.
+
+    Records are piped one at a time into the processor and the validator, so the file
+    is never held in memory as a whole.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file to process.
+        log_directory (str): The directory where the log file will be stored.
+        workers (int, optional): If greater than 1, the number of worker processes the
+            records are hash-partitioned across by RP_DOCUMENT_ID.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming a JSON
+            lines file in a single process.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether a JSON lines file is processed in columnar batches.
+        state_path (str, optional): The snapshot file the analytics state is loaded from and
+            saved to. Not supported with `workers`.
+        checkpoint_path (str, optional): The checkpoint file the run resumes from and saves
+            its progress to. Not supported with `workers` or `columnar`.
+        checkpoint_every (int): The number of lines read between two checkpoints.
+        queued_log (bool): Whether the log file is written by a background thread, with only
+            a summary on the console.
+        results_format (str, optional): "jsonl" or "parquet" to also write the results as one
+            record per document next to the log file.
+        log_rotation (LogRotation, optional): Rotates the log file once it's too large or too
+            old, instead of appending to it forever.
     """
-    
-    if file_path.endswith(".rar"):
-        data, temp_dir = load_json_data(file_path)
+    if workers and workers > 1:
+        results, errors = analyze_file_sharded(file_path, workers, projected)
+    elif checkpoint_path:
+        results, errors = analyze_file_checkpointed(
+            file_path,
+            checkpoint_path,
+            checkpoint_every,
+            eviction=eviction,
+            projected=projected,
+            state_path=state_path,
+        )
     else:
-        data = load_json_data(file_path)
-        temp_dir = None
+        results, errors = analyze_file(
+            file_path,
+            eviction=eviction,
+            projected=projected,
+            columnar=columnar,
+            state_path=state_path,
+        )
+    log(
+        results,
+        errors,
+        Path(file_path).name,
+        log_directory,
+        queued=queued_log,
+        results_format=results_format,
+        rotation=log_rotation,
+    )
+
+
+def main_batch(
+    input_path,
+    log_directory,
+    jobs=None,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+):
+    """
+    Processes every file of a directory or glob pattern, and logs a summary of the batch.
+
+    Args:
+        input_path (str): A directory or glob pattern, see `list_input_files`.
+        log_directory (str): The directory where the log files will be stored.
+        jobs (int, optional): The maximum number of files processed at once. Defaults to the
+            number of CPUs.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming each file.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether JSON lines files are processed in columnar batches.
+        queued_log (bool): Whether the logs are written by background threads, with only their
+            summaries on the console.
+        results_format (str, optional): "jsonl" or "parquet" to also write the results of each
+            file as one record per document next to its log file.
+        log_rotation (LogRotation, optional): Rotates the log files once they're too large or
+            too old.
+    """
+    file_paths = list_input_files(input_path)
+    summaries = analyze_files(
+        file_paths,
+        log_directory,
+        jobs,
+        eviction,
+        projected,
+        columnar,
+        queued_log,
+        results_format,
+        log_rotation,
+    )
+    log_batch_summary(summaries, log_directory, rotation=log_rotation)
 
-    processor = DataProcessor(data)
-    log(processor.process_analytics(), validate_rp_entity_ids(data), Path(file_path).name, log_directory)
 
-    if temp_dir:
-        teardown({"temp_dir": temp_dir})
+def main_watch(
+    input_path,
+    log_directory,
+    jobs=None,
+    max_queued=None,
+    poll_interval=WATCH_POLL_INTERVAL,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+):
+    """
+    Processes the files appearing in a directory or glob pattern, until interrupted.
+
+    Args:
+        input_path (str): The directory or glob pattern to watch.
+        log_directory (str): The directory where the log files will be stored.
+        jobs (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        max_queued (int, optional): The maximum number of files waiting for or being processed.
+        poll_interval (float): The seconds between two polls of the directory.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming each file.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether JSON lines files are processed in columnar batches.
+        queued_log (bool): Whether the logs are written by background threads, with only their
+            summaries on the console.
+        results_format (str, optional): "jsonl" or "parquet" to also write the results of each
+            file as one record per document next to its log file.
+        log_rotation (LogRotation, optional): Rotates the log files once they're too large or
+            too old, including `watch_logs.txt` while the run goes on.
+    """
+    print(f"Watching {input_path}, press Ctrl+C to stop")
+    watch_files(
+        input_path,
+        log_directory,
+        jobs,
+        max_queued,
+        poll_interval,
+        eviction,
+        projected,
+        columnar,
+        queued_log,
+        results_format,
+        log_rotation,
+    )
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python main.py <path_to_file> <log_directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(usage="python main.py <path_to_file> <log_directory>")
+    parser.add_argument(
+        "file_path",
+        help="JSON lines file or .rar archive to process, or a directory or glob of them",
+    )
+    parser.add_argument("log_directory", help="Directory where the log file will be stored")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Partition the records by RP_DOCUMENT_ID across this many worker processes",
+    )
+    parser.add_argument(
+        "--projected",
+        action="store_true",
+        help="Only decode the fields the analytics read, and compare rows by line fingerprint",
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Process and validate the records in columnar batches (requires NumPy). Rows "
+        "are projected and compared by line fingerprint like with --projected, so the same "
+        "fields in another order make a different duplicate. Not combinable with --evict-*",
+    )
+    parser.add_argument(
+        "--queued-log",
+        action="store_true",
+        help="Write the log file from a background thread, and only print a summary",
+    )
+    parser.add_argument(
+        "--results-format",
+        choices=RESULTS_FORMATS,
+        default=None,
+        help="Also write the results as one record per document, as JSON lines or Parquet "
+        "(requires PyArrow)",
+    )
+    parser.add_argument(
+        "--log-max-bytes",
+        type=int,
+        default=None,
+        help="Rotate a log file once it reached this size",
+    )
+    parser.add_argument(
+        "--log-rotate",
+        choices=sorted(ROTATION_PERIODS),
+        default=None,
+        help="Rotate a log file when the hour, day or week changed since it was last written",
+    )
+    parser.add_argument(
+        "--log-backups",
+        type=int,
+        default=None,
+        help="Number of rotated segments kept per log file (default: all)",
+    )
+    parser.add_argument(
+        "--log-compress",
+        action="store_true",
+        help="Compress the rotated log segments with gzip",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of files of a directory or glob processed at once (default: CPU count)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep processing the files appearing in the directory or glob, until interrupted",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=WATCH_POLL_INTERVAL,
+        help="Seconds between two polls of the watched directory",
+    )
+    parser.add_argument(
+        "--max-queued",
+        type=int,
+        default=None,
+        help="Maximum number of watched files waiting for or being processed (default: 2x jobs)",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="Snapshot file of the analytics state, loaded before and saved after the file",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Checkpoint file to save the progress to, and to resume an interrupted run from",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=CHECKPOINT_EVERY,
+        help="Number of lines read between two checkpoints",
+    )
+    parser.add_argument(
+        "--evict-completed",
+        action="store_true",
+        help="Finalize a document as soon as all of its indices were seen",
+    )
+    parser.add_argument(
+        "--evict-after-records",
+        type=int,
+        default=None,
+        help="Finalize a document once this many records were read since its last record",
+    )
+    parser.add_argument(
+        "--evict-after-seconds",
+        type=float,
+        default=None,
+        help="Finalize a document once this many seconds passed since its last record",
+    )
+    args = parser.parse_args()
+    if args.state and args.workers and args.workers > 1:
+        parser.error("--state can't be combined with --workers")
+    if args.checkpoint and (args.columnar or (args.workers and args.workers > 1)):
+        parser.error("--checkpoint can't be combined with --columnar or --workers")
+    if args.columnar and (
+        args.evict_completed or args.evict_after_records or args.evict_after_seconds
+    ):
+        parser.error("--columnar can't be combined with the --evict-* options")
+    batch = is_batch_input(args.file_path)
+    if batch and (args.state or args.checkpoint or (args.workers and args.workers > 1)):
+        parser.error("--state, --checkpoint and --workers apply to a single file")
+    if args.watch and not batch:
+        parser.error("--watch requires a directory or a glob pattern")
+    if args.results_format:
+        # Before processing the files, rather than once their logs are written
+        try:
+            check_results_format(args.results_format)
+        except ImportError as e:
+            parser.error(str(e))
+
+    log_rotation = None
+    if args.log_max_bytes or args.log_rotate:
+        try:
+            log_rotation = LogRotation(
+                max_bytes=args.log_max_bytes,
+                period=args.log_rotate,
+                backup_count=args.log_backups,
+                compress=args.log_compress,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+    elif args.log_backups is not None or args.log_compress:
+        parser.error("--log-backups and --log-compress require --log-max-bytes or --log-rotate")
 
-    file_path = sys.argv[1]
-    log_directory = sys.argv[2]
-    main(file_path, log_directory)
+    eviction = None
+    if args.evict_completed or args.evict_after_records or args.evict_after_seconds:
+        eviction = EvictionPolicy(
+            evict_completed=args.evict_completed,
+            max_record_distance=args.evict_after_records,
+            max_idle_seconds=args.evict_after_seconds,
+        )
+    # The log handlers of the run are closed once it's done
+    with LoggingContext():
+        if args.watch:
+            main_watch(
+                args.file_path,
+                args.log_directory,
+                args.jobs,
+                args.max_queued,
+                args.poll_interval,
+                eviction,
+                args.projected,
+                args.columnar,
+                args.queued_log,
+                args.results_format,
+                log_rotation,
+            )
+        elif batch:
+            main_batch(
+                args.file_path,
+                args.log_directory,
+                args.jobs,
+                eviction,
+                args.projected,
+                args.columnar,
+                args.queued_log,
+                args.results_format,
+                log_rotation,
+            )
+        else:
+            main(
+                args.file_path,
+                args.log_directory,
+                args.workers,
+                eviction,
+                args.projected,
+                args.columnar,
+                args.state,
+                args.checkpoint,
+                args.checkpoint_every,
+                args.queued_log,
+                args.results_format,
+                log_rotation,
+            )
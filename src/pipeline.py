@@ -0,0 +1,943 @@
+"""
+This module wires the data loader, the DataProcessor and the RP_ENTITY_ID validation together.
+
+Records are streamed once through the processor and the validator. Multi-file .rar archives
+are processed with one worker process per member. Each worker builds a PartialAnalytics, and
+the partials are merged in archive order into a single `process_analytics`-shaped result and
+a single validation error list.
+
+With `projected=True`, records are decoded into ProjectedRecord instances holding only the
+fields the analytics read (see `helpers.projection`).
+
+With `columnar=True`, records are processed and validated in columnar batches (see
+`helpers.columnar`, which requires NumPy).
+
+With a `state_path`, the analytics state is loaded from a snapshot before the file and saved
+after it (see `helpers.state_store`), so the results cover every file delivered so far and
+report how the status of each document changed.
+
+`analyze_file_checkpointed` saves a checkpoint of the processor and of the byte offset
+reached every `checkpoint_every` lines, and resumes from the last one if the run was
+interrupted.
+
+`analyze_files` processes a batch of files concurrently, one file per worker process, and
+writes the log of each file as it completes. `watch_files` does the same for the files that
+appear in a watched directory, in a resident pool of worker processes.
+
+`analyze_file_sharded` instead hash-partitions the lines by RP_DOCUMENT_ID across N worker
+processes. Every document is then handled by a single worker, which parses, analyzes and
+validates its records, while the parent only routes raw lines.
+"""
+
+import heapq
+import json
+import multiprocessing
+import os
+import queue
+import re
+import signal
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from document_processor import DataProcessor, PartialAnalytics, is_valid_document_id
+from utils.validation import DEFAULT_VALIDATOR
+from helpers.data_loader import (
+    create_temp_directory,
+    extract_rar_members,
+    get_rar_stream_command,
+    iter_file_records,
+    iter_json_records,
+    iter_lines,
+    iter_rar_member_lines,
+    iter_record_batches,
+    list_rar_members,
+    iter_line_offsets,
+    parse_json_lines,
+    print_parse_error,
+)
+from helpers.json_decoder import decode_json_line, get_json_decoder
+from helpers.projection import decode_projected_line
+from helpers.columnar import validate_record_batch
+from helpers.state_store import (
+    document_statuses,
+    load_checkpoint,
+    load_state,
+    save_checkpoint,
+    save_state,
+    status_changes,
+)
+from helpers.teardown import teardown
+from helpers.watcher import DirectoryWatcher, WatchMetrics
+from utils.logging import (
+    LoggingContext,
+    format_file_summary,
+    get_watch_logger,
+    log,
+    summarize_results,
+)
+
+# Compare duplicates by record digest, so workers neither hold nor send back full records
+STORE_DIGESTS = True
+
+# Lines read between two checkpoints of `analyze_file_checkpointed`
+CHECKPOINT_EVERY = 1000000
+
+# Lines sent to a shard worker at once
+SHARD_BATCH_SIZE = 1000
+
+# Batches waiting per shard worker before the reader blocks
+SHARD_QUEUE_SIZE = 16
+
+# Seconds to wait on a worker queue before checking that the workers are still alive
+WORKER_POLL_INTERVAL = 1.0
+
+# Seconds between two polls of a watched directory
+WATCH_POLL_INTERVAL = 2.0
+
+DOCUMENT_ID_PATTERN = re.compile(r'"RP_DOCUMENT_ID"\s*:\s*"([^"\\]*)"')
+
+
+def analyze_records(records, eviction=None, state_path=None):
+    """
+    Processes analytics and validates RP_ENTITY_IDs in a single pass over the records.
+
+    Args:
+        records (iterable): JSON records, e.g. a generator reading from a file.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming.
+        state_path (str, optional): The snapshot file the analytics state is loaded from and
+            saved to, see `restore_state`.
+
+    Returns:
+        tuple: A tuple containing:
+            - dict: The `process_analytics` results.
+            - list: The RP_ENTITY_ID validation errors.
+    """
+    processor = DataProcessor(
+        [],
+        store_digests=STORE_DIGESTS,
+        compact=True,
+        eviction=eviction,
+        validator=DEFAULT_VALIDATOR,
+    )
+    previous_statuses = restore_state(processor, state_path)
+
+    for record in records:
+        processor.process_record(record)
+
+    results = finalize_with_state(processor, state_path, previous_statuses)
+    return results, processor.validation_errors
+
+
+def analyze_batches(batches, state_path=None):
+    """
+    Processes analytics and validates RP_ENTITY_IDs over columnar record batches.
+
+    Args:
+        batches (iterable): RecordBatch instances, e.g. from `iter_record_batches`.
+        state_path (str, optional): The snapshot file of the analytics state, see
+            `restore_state`.
+
+    Returns:
+        tuple: The results and validation errors, see `analyze_records`.
+    """
+    processor = DataProcessor([], store_digests=STORE_DIGESTS, compact=True)
+    previous_statuses = restore_state(processor, state_path)
+    errors = []
+
+    for batch in batches:
+        processor.process_batch(batch)
+        errors.extend(validate_record_batch(batch))
+
+    return finalize_with_state(processor, state_path, previous_statuses), errors
+
+
+def restore_state(processor, state_path):
+    """
+    Loads the analytics state saved by a previous run into a new processor.
+
+    Args:
+        processor (DataProcessor): The new processor.
+        state_path (str): The snapshot file, or None to start from an empty state.
+
+    Returns:
+        dict: The status of every document before this run (see `document_statuses`), or None
+        if no snapshot was loaded.
+    """
+    if state_path and load_state(processor, state_path):
+        return document_statuses(processor)
+    return None
+
+
+def finalize_with_state(processor, state_path, previous_statuses):
+    """
+    Saves the analytics state of a processor, then finalizes its results.
+
+    Args:
+        processor (DataProcessor): The processor, once every record was processed.
+        state_path (str): The snapshot file, or None to not save the state.
+        previous_statuses (dict): The statuses returned by `restore_state`.
+
+    Returns:
+        dict: The results of `finalize_analytics`. If a snapshot was loaded, they also hold the
+        `(previous_status, status)` of every document whose status changed in
+        `status_changes`.
+    """
+    if state_path:
+        # Saved before the missing indices are added to the results, see `save_state`
+        save_state(processor, state_path)
+        if previous_statuses is not None:
+            changes = status_changes(previous_statuses, document_statuses(processor))
+            processor.results["status_changes"] = changes
+
+    return processor.finalize_analytics()
+
+
+def analyze_records_partial(records):
+    """
+    Builds the mergeable analytics state and validates RP_ENTITY_IDs in a single pass.
+
+    Args:
+        records (iterable): JSON records of one shard of the feed.
+
+    Returns:
+        tuple: A tuple containing:
+            - PartialAnalytics: The partial analytics state of the shard.
+            - list: The RP_ENTITY_ID validation errors of the shard.
+    """
+    partial = PartialAnalytics(store_digests=STORE_DIGESTS)
+    errors = []
+
+    for record in records:
+        partial.add_record(record)
+        errors.extend(DEFAULT_VALIDATOR.record_errors(record))
+
+    return partial, errors
+
+
+def analyze_rar_member(rar_path, member, commands, projected=False, analyze=None):
+    """
+    Worker analyzing a single member of a .rar archive, streamed through a pipe.
+
+    Args:
+        rar_path (str): The path to the .rar file.
+        member (str): The name of the member to analyze.
+        commands (dict): The commands returned by `get_rar_stream_command`.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        analyze (callable, optional): Analyzes the records of the member. Defaults to
+            `analyze_records_partial`.
+
+    Returns:
+        tuple: The partial state and validation errors, see `analyze_records_partial`, or
+            what `analyze` returns.
+    """
+    analyze = analyze or analyze_records_partial
+    lines = iter_rar_member_lines(rar_path, member, commands, binary=True)
+    return analyze(parse_json_lines(lines, on_error=print_parse_error, projected=projected))
+
+
+def analyze_extracted_file(file_path, projected=False, analyze=None):
+    """
+    Worker analyzing a file extracted from a .rar archive.
+
+    Args:
+        file_path (str): The path to the extracted file.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        analyze (callable, optional): Analyzes the records of the file. Defaults to
+            `analyze_records_partial`.
+
+    Returns:
+        tuple: The partial state and validation errors, see `analyze_records_partial`, or
+            what `analyze` returns.
+    """
+    analyze = analyze or analyze_records_partial
+    return analyze(
+        iter_file_records(file_path, on_error=print_parse_error, binary=True, projected=projected)
+    )
+
+
+def merge_partial_results(partial_results):
+    """
+    Merges the partial states of consecutive shards into one result and one error list.
+
+    Args:
+        partial_results (iterable): `(partial, errors)` tuples in feed order.
+
+    Returns:
+        tuple: A tuple containing:
+            - dict: The `process_analytics` results of the whole feed.
+            - list: The RP_ENTITY_ID validation errors of the whole feed.
+    """
+    merged_partial = PartialAnalytics(store_digests=STORE_DIGESTS)
+    merged_errors = []
+
+    for partial, errors in partial_results:
+        merged_partial.merge(partial)
+        merged_errors.extend(errors)
+
+    return merged_partial.results(), merged_errors
+
+
+def analyze_rar_archive(rar_path, max_workers=None, projected=False):
+    """
+    Analyzes every member of a .rar archive, with one worker process per member.
+
+    Members are streamed through a pipe when an installed streaming tool can list them (see
+    `list_rar_members`). Otherwise the archive is extracted to a temporary directory which is
+    cleaned up through `teardown`.
+
+    An archive with a single member is analyzed by `analyze_records`, like a plain file, so
+    its results are exactly the ones of a DataProcessor run.
+
+    Args:
+        rar_path (str): The path to the .rar file.
+        max_workers (int, optional): The maximum number of worker processes. Defaults to the
+            number of CPUs. With 1, the members are analyzed one after the other in this
+            process.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+
+    Returns:
+        tuple: The merged results and validation errors, see `merge_partial_results`.
+
+    Raises:
+        FileNotFoundError: If the archive contains no file.
+    """
+    temp_dir = None
+    members = []
+    commands = get_rar_stream_command()
+    if commands:
+        members, commands = list_rar_members(rar_path, commands)
+    if members:
+        jobs = [(analyze_rar_member, rar_path, member, commands, projected) for member in members]
+    else:
+        temp_dir = create_temp_directory()
+        jobs = [
+            (analyze_extracted_file, extracted_file_path, projected)
+            for extracted_file_path in extract_rar_members(rar_path, temp_dir)
+        ]
+
+    try:
+        if not jobs:
+            raise FileNotFoundError(f"No file found in the .rar archive: {rar_path}")
+
+        if len(jobs) == 1:
+            worker, *args = jobs[0]
+            return worker(*args, analyze=analyze_records)
+
+        if max_workers == 1:
+            member_results = [worker(*args) for worker, *args in jobs]
+        else:
+            max_workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(*job) for job in jobs]
+                member_results = [future.result() for future in futures]
+    finally:
+        if temp_dir:
+            teardown({"temp_dir": temp_dir})
+
+    return merge_partial_results(member_results)
+
+
+def analyze_file(
+    file_path, max_workers=None, eviction=None, projected=False, columnar=False, state_path=None
+):
+    """
+    Analyzes a JSON lines file or every member of a .rar archive.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file.
+        max_workers (int, optional): The maximum number of worker processes for .rar archives.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming a JSON lines
+            file. The members of a .rar archive are merged at the end instead, so it doesn't
+            apply to them.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether a JSON lines file is processed in columnar batches of
+            projected records, compared by line fingerprint. Can't be combined with
+            `eviction`.
+        state_path (str, optional): The snapshot file of the analytics state, see
+            `restore_state`. The members of a .rar archive are then read one after the other
+            in this process.
+
+    Returns:
+        tuple: The results and validation errors, see `analyze_records`.
+
+    Raises:
+        ValueError: If both `columnar` and `eviction` are given.
+    """
+    if columnar and eviction:
+        raise ValueError("Columnar batches can't be combined with an eviction policy")
+    if file_path.endswith(".rar") and not state_path:
+        return analyze_rar_archive(file_path, max_workers, projected)
+    if columnar:
+        batches = iter_record_batches(file_path, on_error=print_parse_error)
+        return analyze_batches(batches, state_path)
+    records = iter_json_records(
+        file_path, on_error=print_parse_error, binary=True, projected=projected
+    )
+    return analyze_records(records, eviction, state_path)
+
+
+def analyze_file_checkpointed(
+    file_path,
+    checkpoint_path,
+    checkpoint_every=CHECKPOINT_EVERY,
+    eviction=None,
+    projected=False,
+    state_path=None,
+):
+    """
+    Analyzes a JSON lines file or .rar archive in a single process, with checkpoints.
+
+    Every `checkpoint_every` lines, the processor and the offset of the last line read are
+    saved to `checkpoint_path`. If that file exists when the run starts, the processor is
+    restored from it and reading resumes at the saved offset (.rar members are decompressed
+    again up to it), so the results are those of an uninterrupted run. The checkpoint is
+    deleted once the file was processed.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file.
+        checkpoint_path (str): The path to the checkpoint file.
+        checkpoint_every (int): The number of lines read between two checkpoints.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        state_path (str, optional): The snapshot file of the analytics state across files,
+            see `restore_state`.
+
+    Returns:
+        tuple: The results and validation errors, see `analyze_records`.
+
+    Raises:
+        ValueError: If the checkpoint was taken on another file, see `load_checkpoint`.
+    """
+    processor = DataProcessor(
+        [],
+        store_digests=STORE_DIGESTS,
+        compact=True,
+        eviction=eviction,
+        validator=DEFAULT_VALIDATOR,
+    )
+    checkpoint = load_checkpoint(processor, checkpoint_path, file_path)
+    if checkpoint:
+        start_offset, previous_statuses = checkpoint
+        print(f"Resuming {file_path} from byte {start_offset}")
+    else:
+        start_offset, previous_statuses = 0, restore_state(processor, state_path)
+
+    loads = get_json_decoder()
+    decode = decode_projected_line if projected else decode_json_line
+    lines_read = 0
+
+    for offset, line in iter_line_offsets(file_path, start_offset):
+        try:
+            record = decode(line, loads)
+        except json.JSONDecodeError as e:
+            print_parse_error(e.doc, e)
+        else:
+            processor.process_record(record)
+
+        lines_read += 1
+        if lines_read % checkpoint_every == 0:
+            save_checkpoint(processor, checkpoint_path, file_path, offset, previous_statuses)
+
+    results = finalize_with_state(processor, state_path, previous_statuses)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return results, processor.validation_errors
+
+
+def analyze_and_log_file(
+    file_path,
+    log_directory,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+):
+    """
+    Worker analyzing a single file of a batch and writing its log.
+
+    The file is analyzed in this process: the members of a .rar archive are read one after
+    the other, and an archive extracted to a temporary directory is cleaned up through
+    `teardown` before the next file.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file.
+        log_directory (str): The directory where the log file will be stored.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether a JSON lines file is processed in columnar batches.
+        queued_log (bool): Whether the log is written by a background thread, with only its
+            summary on the console (see `log`).
+        results_format (str, optional): The format the results are also written in as
+            records, see `log`.
+        log_rotation (LogRotation, optional): Rotates the log file, see `log`.
+
+    Returns:
+        dict: The summary of the file, see `format_batch_summary`. Errors are reported in the
+        summary instead of being raised, so that one file doesn't stop the batch.
+    """
+    start = time.perf_counter()
+    summary = {"file": Path(file_path).name, "error": None}
+    try:
+        results, errors = analyze_file(
+            file_path, max_workers=1, eviction=eviction, projected=projected, columnar=columnar
+        )
+        log_file(
+            results,
+            errors,
+            Path(file_path).name,
+            log_directory,
+            queued_log,
+            results_format,
+            log_rotation,
+        )
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        summary["error"] = f"{type(e).__name__}: {e}"
+    else:
+        summary.update(summarize_results(results, errors))
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def log_file(
+    results,
+    errors,
+    processed_file,
+    log_directory,
+    queued=False,
+    results_format=None,
+    rotation=None,
+):
+    """
+    Writes the log of a file of a batch, in a LoggingContext of its own.
+
+    Worker processes handle several files one after the other, so the handlers of a file are
+    closed once it was logged: workers don't keep the log file of every file open, and a
+    queued log is written before the file is reported done.
+
+    Args:
+        results (dict): The results of the file.
+        errors (list): The validation errors of the file.
+        processed_file (str): The name of the file.
+        log_directory (str): The directory where the log file will be stored.
+        queued (bool): Whether the log is written by a background thread, see `log`.
+        results_format (str, optional): The format the results are also written in as
+            records, see `log`.
+        rotation (LogRotation, optional): Rotates the log file, see `log`.
+    """
+    with LoggingContext():
+        log(
+            results,
+            errors,
+            processed_file,
+            log_directory,
+            queued=queued,
+            results_format=results_format,
+            rotation=rotation,
+        )
+
+
+def analyze_files(
+    file_paths,
+    log_directory,
+    max_jobs=None,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+):
+    """
+    Analyzes a batch of files concurrently, in a bounded pool of worker processes.
+
+    Each file is analyzed and logged by a single worker (see `analyze_and_log_file`), so at
+    most `max_jobs` files are processed at once, whatever their number of .rar members.
+
+    Args:
+        file_paths (list): The paths to the JSON files or .rar files.
+        log_directory (str): The directory where the log files will be stored.
+        max_jobs (int, optional): The maximum number of files processed at once. Defaults to
+            the number of CPUs.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming each file.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether JSON lines files are processed in columnar batches.
+        queued_log (bool): Whether the logs are written by background threads, see `log`.
+        results_format (str, optional): The format the results of each file are also written
+            in as records, see `log`.
+        log_rotation (LogRotation, optional): Rotates the log files, see `log`.
+
+    Returns:
+        list: The summary of each file, in the order of `file_paths`.
+    """
+    max_jobs = min(len(file_paths), max_jobs or os.cpu_count() or 1)
+    summaries = {}
+
+    with ProcessPoolExecutor(max_workers=max_jobs) as executor:
+        futures = {
+            executor.submit(
+                analyze_and_log_file,
+                file_path,
+                log_directory,
+                eviction,
+                projected,
+                columnar,
+                queued_log,
+                results_format,
+                log_rotation,
+            ): position
+            for position, file_path in enumerate(file_paths)
+        }
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            status = f"failed: {summary['error']}" if summary["error"] else "done"
+            print(f"[{len(summaries)}/{len(file_paths)}] {summary['file']} {status}")
+
+    return [summaries[position] for position in range(len(file_paths))]
+
+
+def watch_files(
+    input_path,
+    log_directory,
+    max_jobs=None,
+    max_queued=None,
+    poll_interval=WATCH_POLL_INTERVAL,
+    eviction=None,
+    projected=False,
+    columnar=False,
+    queued_log=False,
+    results_format=None,
+    log_rotation=None,
+    max_idle_polls=None,
+):
+    """
+    Processes the files appearing in a directory or glob pattern, until interrupted.
+
+    The worker processes are started once and reused for every file (see
+    `analyze_and_log_file`), so a file doesn't pay for the interpreter startup and imports.
+    At most `max_queued` files are submitted and not done at once: while the workers are
+    behind, new files wait on disk instead of piling up in memory. After each poll, the
+    metrics of the run are written to `watch_metrics.json` in the log directory (see
+    `WatchMetrics`).
+
+    Args:
+        input_path (str): The directory or glob pattern to watch, see `DirectoryWatcher`.
+        log_directory (str): The directory where the log files will be stored.
+        max_jobs (int, optional): The number of worker processes. Defaults to the number of
+            CPUs.
+        max_queued (int, optional): The maximum number of files submitted and not done.
+            Defaults to twice the number of worker processes.
+        poll_interval (float): The seconds between two polls. A file is ready once it didn't
+            change for that long.
+        eviction (EvictionPolicy, optional): Finalizes documents while streaming each file.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+        columnar (bool): Whether JSON lines files are processed in columnar batches.
+        queued_log (bool): Whether the logs are written by background threads, see `log`.
+        results_format (str, optional): The format the results of each file are also written
+            in as records, see `log`.
+        log_rotation (LogRotation, optional): Rotates the log files, including
+            `watch_logs.txt` while the run goes on, see `log`.
+        max_idle_polls (int, optional): Stops after this many polls in a row found nothing to
+            do. By default, runs until interrupted by Ctrl+C or SIGTERM.
+
+    Returns:
+        WatchMetrics: The metrics of the run.
+    """
+    max_jobs = max_jobs or os.cpu_count() or 1
+    max_queued = max_queued or 2 * max_jobs
+    watcher = DirectoryWatcher(input_path, settle_seconds=poll_interval)
+    metrics = WatchMetrics()
+    metrics_path = os.path.join(log_directory, "watch_metrics.json")
+    os.makedirs(log_directory, exist_ok=True)
+    logger = get_watch_logger(log_directory, rotation=log_rotation)
+    executor = start_watch_pool(max_jobs)
+    running = {}
+    idle_polls = 0
+
+    # SIGTERM (e.g. `docker stop`) stops the run like Ctrl+C
+    previous_sigterm_handler = signal.signal(signal.SIGTERM, interrupt)
+    logger.info("Watching %s with %d workers", input_path, max_jobs)
+    try:
+        while max_idle_polls is None or idle_polls < max_idle_polls:
+            for file_path, size in watcher.poll(max_queued - len(running)):
+                job = (
+                    file_path,
+                    log_directory,
+                    eviction,
+                    projected,
+                    columnar,
+                    queued_log,
+                    results_format,
+                    log_rotation,
+                )
+                try:
+                    future = executor.submit(analyze_and_log_file, *job)
+                except BrokenProcessPool:
+                    # A dead worker (e.g. killed for running out of memory) broke the pool and
+                    # failed its files: a new pool is started for the next ones
+                    executor.shutdown(wait=False)
+                    executor = start_watch_pool(max_jobs)
+                    future = executor.submit(analyze_and_log_file, *job)
+                running[future] = (file_path, size, time.monotonic())
+            idle_polls = 0 if running else idle_polls + 1
+
+            metrics.files_in_flight = len(running)
+            metrics.write(metrics_path)
+            if not running:
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                record_watched_file(future, *running.pop(future), metrics, logger)
+    except KeyboardInterrupt:
+        logger.info("Interrupted, waiting for the %d files being processed", len(running))
+    finally:
+        # The files already submitted are finished, so that their logs are complete
+        executor.shutdown(wait=True)
+        for future, watched_file in running.items():
+            record_watched_file(future, *watched_file, metrics, logger)
+        metrics.files_in_flight = 0
+        metrics.write(metrics_path)
+        signal.signal(signal.SIGTERM, previous_sigterm_handler)
+
+    return metrics
+
+
+def record_watched_file(future, file_path, size, submitted, metrics, logger):
+    """
+    Records the outcome of a file processed by `watch_files` in its metrics and its log.
+
+    Args:
+        future (Future): The done future of `analyze_and_log_file`.
+        file_path (str): The path to the file.
+        size (int): The size of the file, in bytes.
+        submitted (float): The monotonic time the file was submitted at.
+        metrics (WatchMetrics): The metrics of the run.
+        logger (logging.Logger): The watch logger.
+    """
+    try:
+        summary = future.result()
+    except BrokenProcessPool as e:
+        error = f"{type(e).__name__}: {e}"
+        summary = {"file": Path(file_path).name, "error": error, "seconds": 0.0}
+    metrics.record(summary, size, time.monotonic() - submitted)
+    logger.info(format_file_summary(summary))
+
+
+def start_watch_pool(max_jobs):
+    """
+    Starts the pool of worker processes of `watch_files`.
+
+    Args:
+        max_jobs (int): The number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool, whose workers ignore Ctrl+C (see `ignore_interrupts`).
+    """
+    return ProcessPoolExecutor(max_workers=max_jobs, initializer=ignore_interrupts)
+
+
+def ignore_interrupts():
+    """
+    Initializer of the `watch_files` workers, which leave Ctrl+C to the parent process.
+
+    The parent stops polling when interrupted and waits for the files being processed, which
+    the workers then finish instead of dying halfway. SIGTERM kills a worker again, instead of
+    running the handler inherited from the parent.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def interrupt(signum, frame):
+    """
+    Signal handler stopping `watch_files` the way Ctrl+C does.
+
+    Args:
+        signum (int): The signal received.
+        frame (frame): The frame interrupted by the signal.
+
+    Raises:
+        KeyboardInterrupt: Always.
+    """
+    raise KeyboardInterrupt(f"Received signal {signum}")
+
+
+def get_document_shard(line, shards):
+    """
+    Picks the shard of a raw JSON line from its RP_DOCUMENT_ID.
+
+    The document ID is read with a regular expression to avoid parsing the line. Lines with
+    escaped or repeated document IDs are fully parsed instead. Invalid document IDs (and
+    lines that aren't valid JSON) always go to shard 0, so they keep their relative order.
+
+    Args:
+        line (str): The raw JSON line.
+        shards (int): The number of shards.
+
+    Returns:
+        int: The shard index, from 0 to `shards - 1`.
+    """
+    matches = DOCUMENT_ID_PATTERN.findall(line)
+    if len(matches) == 1 and line.count('"RP_DOCUMENT_ID"') == 1:
+        document_id = matches[0]
+    else:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            return 0
+        document_id = record.get("RP_DOCUMENT_ID") if isinstance(record, dict) else None
+
+    if not is_valid_document_id(document_id):
+        return 0
+    return zlib.crc32(document_id.encode("utf-8")) % shards
+
+
+def analyze_shard(shard, batches, shard_results, projected=False):
+    """
+    Worker analyzing every line routed to a shard.
+
+    Args:
+        shard (int): The index of the shard.
+        batches (multiprocessing.Queue): Lists of `(position, line)` tuples, ended by None.
+        shard_results (multiprocessing.Queue): Receives `(shard, result)` once done, where
+            result is a `(partial, errors)` tuple, or the raised exception. The records of the
+            partial are added with their line positions.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+    """
+    try:
+        partial = PartialAnalytics(store_digests=STORE_DIGESTS)
+        errors = []
+        loads = get_json_decoder()
+        decode = decode_projected_line if projected else decode_json_line
+
+        for batch in iter(batches.get, None):
+            for position, line in batch:
+                try:
+                    record = decode(line, loads)
+                except json.JSONDecodeError as e:
+                    print_parse_error(e.doc, e)
+                    continue
+
+                partial.add_record(record, position)
+                errors.extend(
+                    (position, error) for error in DEFAULT_VALIDATOR.record_errors(record)
+                )
+
+        shard_results.put((shard, (partial, errors)))
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        shard_results.put((shard, e))
+
+
+def ensure_workers_alive(workers):
+    """
+    Raises an error if any worker process died.
+
+    Args:
+        workers (list): The worker processes.
+
+    Raises:
+        RuntimeError: If a worker exited with a non-zero code.
+    """
+    for worker in workers:
+        if worker.exitcode:
+            raise RuntimeError(f"Worker {worker.name} exited with code {worker.exitcode}")
+
+
+def put_batch(batches, batch, workers):
+    """
+    Puts a batch on a worker queue, waiting while it's full but failing if a worker died.
+
+    Args:
+        batches (multiprocessing.Queue): The worker queue.
+        batch (list): The batch to send, or None to end the stream.
+        workers (list): The worker processes.
+    """
+    while True:
+        try:
+            batches.put(batch, timeout=WORKER_POLL_INTERVAL)
+            return
+        except queue.Full:
+            ensure_workers_alive(workers)
+
+
+def analyze_file_sharded(file_path, workers=None, projected=False):
+    """
+    Analyzes a JSON lines file (or every member of a .rar archive) across worker processes
+    partitioned by RP_DOCUMENT_ID hash.
+
+    Each worker runs the per-document checks and the RP_ENTITY_ID validation on its share of
+    the lines. Documents don't span workers, so the merged results are exact. Validation errors
+    are put back in file order. The results are listed in the order of a single process, so
+    the text log is the same.
+
+    Args:
+        file_path (str): The path to the JSON file or .rar file.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        projected (bool): Whether records are decoded into ProjectedRecord instances.
+
+    Returns:
+        tuple: The results and validation errors, see `analyze_records`.
+    """
+    shards = workers or os.cpu_count() or 1
+    shard_results = multiprocessing.Queue()
+    shard_batches = [multiprocessing.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(shards)]
+    processes = [
+        multiprocessing.Process(
+            target=analyze_shard,
+            args=(shard, shard_batches[shard], shard_results, projected),
+            daemon=True,
+        )
+        for shard in range(shards)
+    ]
+    for process in processes:
+        process.start()
+
+    completed = False
+    try:
+        pending = [[] for _ in range(shards)]
+        for position, line in enumerate(iter_lines(file_path)):
+            shard = get_document_shard(line, shards)
+            pending[shard].append((position, line))
+            if len(pending[shard]) >= SHARD_BATCH_SIZE:
+                put_batch(shard_batches[shard], pending[shard], processes)
+                pending[shard] = []
+
+        for shard in range(shards):
+            if pending[shard]:
+                put_batch(shard_batches[shard], pending[shard], processes)
+            put_batch(shard_batches[shard], None, processes)
+
+        results_by_shard = {}
+        while len(results_by_shard) < shards:
+            try:
+                shard, result = shard_results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                ensure_workers_alive(processes)
+                continue
+            if isinstance(result, Exception):
+                raise result
+            results_by_shard[shard] = result
+        completed = True
+    finally:
+        for process in processes:
+            if not completed:
+                process.terminate()
+            process.join()
+
+    # The partials were built with the line positions of their records, so the merged results
+    # are listed in file order
+    merged_partial = PartialAnalytics(store_digests=STORE_DIGESTS)
+    for shard in range(shards):
+        merged_partial.merge(results_by_shard[shard][0], offset=0)
+
+    errors = [
+        error
+        for _, error in heapq.merge(*(results_by_shard[shard][1] for shard in range(shards)))
+    ]
+    return merged_partial.results(), errors
@@ -0,0 +1,239 @@
+"""
+This module runs the analytics pipeline as a local HTTP service.
+
+Clients POST a JSON lines file or a .rar archive to `/analyze`, and get back as JSON the
+`process_analytics` results, the RP_ENTITY_ID validation errors and the lines that aren't
+valid JSON. A JSON lines body is parsed and analyzed while it's being received, so it's never
+held in memory. A .rar archive (recognized by its first bytes, like the ZIP archives the
+extraction tools also read) is written to a temporary file first, since the extraction tools
+read archives from files.
+
+The service runs in a pool of worker processes sharing the listening socket: each worker
+handles one request at a time, and the kernel hands every new connection to an idle worker.
+Requests beyond the number of workers wait in the listen backlog.
+
+Usage:
+    python src/service.py [--host 127.0.0.1] [--port 8080] [--workers N]
+
+    curl --data-binary @file.jsonl http://127.0.0.1:8080/analyze
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit
+from helpers.data_loader import CHUNK_SIZE, iter_json_records, parse_json_lines
+from helpers.http_body import is_archive_data, open_request_body
+from pipeline import analyze_records, interrupt
+
+
+def analyze_request_body(body):
+    """
+    Analyzes the JSON lines file or .rar archive sent as a request body.
+
+    Args:
+        body (BufferedReader): The request body, see `open_request_body`.
+
+    Returns:
+        dict: The response, with the keys:
+            - results (dict): The `process_analytics` results.
+            - validation_errors (list): The RP_ENTITY_ID validation errors, as objects.
+            - parse_errors (list): The lines that aren't valid JSON, with their errors.
+    """
+    parse_errors = []
+
+    def on_error(line, error):
+        parse_errors.append({"line": line, "error": str(error)})
+
+    if is_archive_data(body):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rar_path = os.path.join(temp_dir, "upload.rar")
+            with open(rar_path, "wb") as rar_file:
+                shutil.copyfileobj(body, rar_file, CHUNK_SIZE)
+            records = iter_json_records(rar_path, on_error=on_error, binary=True)
+            results, errors = analyze_records(records)
+    else:
+        results, errors = analyze_records(parse_json_lines(body, on_error=on_error))
+
+    return {
+        "results": results,
+        "validation_errors": [
+            {"rp_entity_id": rp_entity_id, "rp_document_id": document_id, "document_index": index}
+            for rp_entity_id, document_id, index in errors
+        ],
+        "parse_errors": parse_errors,
+    }
+
+
+class AnalyticsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of the analytics service.
+
+    - `POST /analyze`: analyzes the request body, see `analyze_request_body`.
+    - `GET /health`: answers `{"status": "ok"}`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "DocumentAnalytics/1.0"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Answers the health checks.
+        """
+        if urlsplit(self.path).path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Analyzes the body of the request, and answers its results.
+
+        Client errors (a missing length, a body that isn't UTF-8, an empty archive) are
+        answered with a 4xx status. The connection is closed after any error, as the rest of
+        the body wasn't read.
+        """
+        if urlsplit(self.path).path != "/analyze":
+            self.close_connection = True
+            self.send_json(404, {"error": f"Not found: {self.path}"})
+            return
+
+        try:
+            body = open_request_body(self.rfile, self.headers)
+        except ValueError as e:
+            self.close_connection = True
+            self.send_json(411, {"error": str(e)})
+            return
+
+        try:
+            response = analyze_request_body(body)
+        except ConnectionError:
+            # The client went away, there's no one to answer
+            self.close_connection = True
+            return
+        except (ValueError, FileNotFoundError) as e:
+            self.close_connection = True
+            self.send_json(400, {"error": f"{type(e).__name__}: {e}"})
+            return
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.close_connection = True
+            self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        self.send_json(200, response)
+
+    def send_json(self, status, payload):
+        """
+        Sends a JSON response.
+
+        Args:
+            status (int): The HTTP status code.
+            payload (dict): The body of the response.
+        """
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class AnalyticsServer(HTTPServer):
+    """
+    The HTTP server of the analytics service, handling one request at a time.
+    """
+
+    # Connections waiting for a worker
+    request_queue_size = 128
+
+    def __init__(self, server_address, bind_and_activate=True):
+        """
+        Initializes the AnalyticsServer class.
+
+        Args:
+            server_address (tuple): The host and port to listen on.
+            bind_and_activate (bool): Whether to open the listening socket now.
+        """
+        super().__init__(server_address, AnalyticsRequestHandler, bind_and_activate)
+
+
+def run_server(server):
+    """
+    Serves requests until interrupted, then closes the server.
+
+    Args:
+        server (AnalyticsServer): The server.
+    """
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve_socket(listen_socket):
+    """
+    Worker process serving requests on the listening socket of the parent process.
+
+    Args:
+        listen_socket (socket.socket): The socket, shared by every worker.
+    """
+    server = AnalyticsServer(listen_socket.getsockname(), bind_and_activate=False)
+    server.socket.close()
+    server.socket = listen_socket
+    run_server(server)
+
+
+def serve(host="127.0.0.1", port=8080, workers=None):
+    """
+    Runs the analytics service until interrupted by Ctrl+C or SIGTERM.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on, 0 for any free port.
+        workers (int, optional): The number of worker processes, i.e. of requests handled at
+            once. Defaults to the number of CPUs.
+    """
+    workers = workers or os.cpu_count() or 1
+    server = AnalyticsServer((host, port))
+    print(f"Serving on http://{host}:{server.server_port} with {workers} workers")
+    if workers == 1:
+        run_server(server)
+        return
+
+    signal.signal(signal.SIGTERM, interrupt)
+    processes = [
+        multiprocessing.Process(target=serve_socket, args=(server.socket,), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+            process.join()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the document analytics HTTP service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes handling requests (default: CPU count)",
+    )
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
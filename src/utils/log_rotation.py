@@ -0,0 +1,197 @@
+"""
+This module rotates the log files that repeated runs append to.
+
+A `LogRotation` moves a log file aside once it reached `max_bytes`, or once the current
+period (hour, day or week) is another one than the period it was last written in. The
+rotated segment is named after the time the log file was last written, e.g.
+`feed.jsonl_logs.txt.20240131-235959`, optionally compressed with gzip, and only the newest
+`backup_count` segments are kept. The next log then starts a new file.
+
+Files are only rotated between records: a single log larger than `max_bytes` is written
+whole, and the file is rotated before the next one.
+"""
+
+import glob
+import gzip
+import os
+import re
+import shutil
+import time
+
+# The strftime formats of the rotation periods: a log file is rotated when it was last
+# written in another period than the current one
+ROTATION_PERIODS = {"hourly": "%Y%m%d%H", "daily": "%Y%m%d", "weekly": "%G%V"}
+
+# The suffix of the rotated segments, from the time their log file was last written
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+SEGMENT_SUFFIX_PATTERN = re.compile(r"\.\d{8}-\d{6}(-\d+)?(\.gz)?$")
+
+# The gzip compression level of the rotated segments, the default of the gzip tool
+GZIP_LEVEL = 6
+
+
+class LogRotation:
+    """
+    The rotation policy of the log files.
+
+    Attributes:
+        max_bytes (int): The size a log file is rotated at, or None.
+        period (str): "hourly", "daily" or "weekly" to rotate a log file when the period
+            changed since it was last written, or None.
+        backup_count (int): The number of rotated segments kept per log file, None to keep
+            them all.
+        compress (bool): Whether the rotated segments are compressed with gzip.
+    """
+
+    __slots__ = ("max_bytes", "period", "backup_count", "compress")
+
+    def __init__(self, max_bytes=None, period=None, backup_count=None, compress=False):
+        """
+        Initializes the LogRotation class.
+
+        Args:
+            max_bytes (int, optional): The size a log file is rotated at.
+            period (str, optional): One of `ROTATION_PERIODS`.
+            backup_count (int, optional): The number of rotated segments kept per log file.
+            compress (bool): Whether the rotated segments are compressed with gzip.
+
+        Raises:
+            ValueError: If the period isn't one of `ROTATION_PERIODS`, or a limit is negative.
+        """
+        if period is not None and period not in ROTATION_PERIODS:
+            raise ValueError(
+                f"Unknown rotation period: {period}, expected one of {list(ROTATION_PERIODS)}"
+            )
+        if (max_bytes is not None and max_bytes <= 0) or (
+            backup_count is not None and backup_count < 0
+        ):
+            raise ValueError("max_bytes must be positive and backup_count not negative")
+        self.max_bytes = max_bytes
+        self.period = period
+        self.backup_count = backup_count
+        self.compress = compress
+
+    def should_rotate(self, log_file_path, now=None):
+        """
+        Tells whether a log file is due for rotation.
+
+        Args:
+            log_file_path (str): The path to the log file.
+            now (float, optional): The current time, as a timestamp. Defaults to the clock.
+
+        Returns:
+            bool: True if the file isn't empty, and reached `max_bytes` or was last written in
+            another period.
+        """
+        try:
+            stat = os.stat(log_file_path)
+        except FileNotFoundError:
+            return False
+        if not stat.st_size:
+            return False
+
+        if self.max_bytes and stat.st_size >= self.max_bytes:
+            return True
+        if self.period:
+            period_format = ROTATION_PERIODS[self.period]
+            last_period = time.strftime(period_format, time.localtime(stat.st_mtime))
+            return last_period != time.strftime(period_format, time.localtime(now))
+        return False
+
+    def rotate(self, log_file_path):
+        """
+        Moves a log file aside as a rotated segment, and removes the oldest segments.
+
+        Args:
+            log_file_path (str): The path to the log file.
+
+        Returns:
+            str: The path to the rotated segment.
+
+        Side Effects:
+            - Renames the log file, so the next log starts a new one.
+            - Compresses the segment if `compress` is set.
+            - Removes the segments beyond the newest `backup_count`.
+        """
+        last_written = time.localtime(os.stat(log_file_path).st_mtime)
+        base_path = f"{log_file_path}.{time.strftime(SEGMENT_TIME_FORMAT, last_written)}"
+
+        # Two rotations within the same second get numbered segments
+        segment_path = base_path
+        number = 0
+        while os.path.exists(segment_path) or os.path.exists(f"{segment_path}.gz"):
+            number += 1
+            segment_path = f"{base_path}-{number}"
+
+        os.replace(log_file_path, segment_path)
+        if self.compress:
+            segment_path = compress_segment(segment_path)
+        if self.backup_count is not None:
+            segments = list_log_segments(log_file_path)
+            for old_segment in segments[: len(segments) - self.backup_count]:
+                os.remove(old_segment)
+        return segment_path
+
+    def rotate_if_needed(self, log_file_path, now=None):
+        """
+        Rotates a log file if it's due for rotation, see `should_rotate`.
+
+        Args:
+            log_file_path (str): The path to the log file.
+            now (float, optional): The current time, as a timestamp.
+
+        Returns:
+            str: The path to the rotated segment, or None if the file wasn't rotated.
+        """
+        if self.should_rotate(log_file_path, now):
+            return self.rotate(log_file_path)
+        return None
+
+
+def compress_segment(segment_path):
+    """
+    Compresses a rotated segment with gzip, keeping its modification time.
+
+    Args:
+        segment_path (str): The path to the segment.
+
+    Returns:
+        str: The path to the compressed segment, `segment_path` with a `.gz` suffix.
+
+    Side Effects:
+        - Writes the compressed segment next to the segment first, then moves it into place
+          and removes the segment, so an interrupted compression leaves the segment as it was.
+    """
+    compressed_path = f"{segment_path}.gz"
+    temp_path = f"{compressed_path}.tmp"
+    with open(segment_path, "rb") as segment, open(temp_path, "wb") as temp_file:
+        with gzip.GzipFile(
+            os.path.basename(segment_path), "wb", GZIP_LEVEL, temp_file
+        ) as compressed:
+            shutil.copyfileobj(segment, compressed)
+    stat = os.stat(segment_path)
+    os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(temp_path, compressed_path)
+    os.remove(segment_path)
+    return compressed_path
+
+
+def list_log_segments(log_file_path):
+    """
+    Lists the rotated segments of a log file, oldest first.
+
+    Args:
+        log_file_path (str): The path to the log file.
+
+    Returns:
+        list: The paths to the segments, by the time their log file was last written.
+    """
+    prefix_length = len(log_file_path)
+    segments = []
+    for path in glob.glob(f"{glob.escape(log_file_path)}.*"):
+        match = SEGMENT_SUFFIX_PATTERN.fullmatch(path[prefix_length:])
+        if match:
+            # Segments rotated within the same second are ordered by their number
+            number = int(match.group(1)[1:]) if match.group(1) else 0
+            segments.append((os.stat(path).st_mtime_ns, number, path))
+    return [path for _, _, path in sorted(segments)]
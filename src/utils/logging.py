@@ -6,14 +6,31 @@ import os
 
 import os
 import logging
+import queue
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from .results_output import list_document_ids, write_results
 
-def setup_logging(log_directory, log_filename):
+# The most log file handlers a LoggingContext keeps open at once
+MAX_OPEN_LOG_FILES = 16
+
+# The number of characters of a log written to its sink at once, see `write_log`
+LOG_WRITE_SIZE = 1 << 16
+
+
+def setup_logging(log_directory, log_filename, rotation=None):
     """
     Sets up logging configuration to log messages to both the console and a log file.
 
+    The handlers come from the current LoggingContext: setting up another file switches the
+    root logger to it instead of adding handlers, and the handler of a file is reused when
+    it's set up again.
+
     Args:
         log_directory (str): The directory where the log file will be stored.
         log_filename (str): The name of the log file where logs will be stored.
+        rotation (LogRotation, optional): Rotates the log file once it's too large or too old,
+            instead of appending to it forever.
     """
     log_file_path = os.path.join(log_directory, log_filename)
 
@@ -21,6 +38,13 @@ def setup_logging(log_directory, log_filename):
     if not os.path.exists(log_directory):
         os.makedirs(log_directory)
 
+    # Get the handlers of the run, created the first time they're used
+    context = current_logging_context()
+
+    # Rotate the log file before the separator, so that a new file starts without one
+    if rotation is not None:
+        rotate_log_file(log_file_path, rotation, context.handlers.get(log_file_path))
+
     # Check if the log file already exists
     file_exists = os.path.exists(log_file_path)
 
@@ -32,20 +56,182 @@ def setup_logging(log_directory, log_filename):
     logger = logging.getLogger()  # Get the root logger
     logger.setLevel(logging.INFO)  # Set the log level to INFO
 
-    # Create handlers
-    console_handler = (
-        logging.StreamHandler()
-    )  # For console output, we would remove it if we wanted to log only to file
-    file_handler = logging.FileHandler(log_file_path, mode="a")  # For appending to file
-
     # Create log formatters
     formatter = logging.Formatter("%(asctime)s - %(message)s")
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
 
-    # Add handlers to the logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    if context.console_handler is None:
+        # For console output, we would remove it if we wanted to log only to file
+        context.console_handler = ReportStreamHandler()
+        context.console_handler.setFormatter(formatter)
+
+    def create_file_handler():
+        # For appending to file
+        file_handler = ReportFileHandler(log_file_path, mode="a", rotation=rotation)
+        file_handler.setFormatter(formatter)
+        return file_handler
+
+    file_handler = context.get_handler(log_file_path, create_file_handler)
+
+    # Log to the console and to this file only
+    context.activate([context.console_handler, file_handler])
+
+
+def rotate_log_file(log_file_path, rotation, file_handler=None):
+    """
+    Rotates a log file if it's due for rotation, closing the handler writing to it first.
+
+    Args:
+        log_file_path (str): The path to the log file.
+        rotation (LogRotation): The rotation policy.
+        file_handler (ReportFileHandler, optional): The open handler of the log file. It
+            rotates its file with `rotation` from now on.
+    """
+    if file_handler is not None:
+        file_handler.rotation = rotation
+        file_handler.rotate_if_needed()
+    else:
+        rotation.rotate_if_needed(log_file_path)
+
+
+class LoggingContext:
+    """
+    The handlers of the log files of a run.
+
+    The handler of each log file is created once and kept in a cache, up to
+    `MAX_OPEN_LOG_FILES` of them: the least recently used ones are closed beyond that. The
+    root logger only has the handlers of the file being logged to, so logging many files
+    costs the same for each file, and a file's log never goes to another file.
+
+    Used as a context manager, a LoggingContext holds the handlers set up within it, and closes
+    them when it ends. Outside of any, the handlers belong to a context of the whole process,
+    closed by `logging.shutdown` at exit.
+
+    Attributes:
+        console_handler (logging.Handler): The console handler, None until it's needed.
+        handlers (OrderedDict): The cached handler of each log file path, least recently used
+            first.
+        active_handlers (list): The handlers added to the root logger.
+        suspended_handlers (list): The handlers of the enclosing context removed from the root
+            logger while this context is entered.
+        max_open_files (int): The most handlers kept in `handlers`.
+    """
+
+    def __init__(self, max_open_files=MAX_OPEN_LOG_FILES):
+        """
+        Initializes the LoggingContext class.
+
+        Args:
+            max_open_files (int): The most handlers of log files kept open.
+        """
+        self.console_handler = None
+        self.handlers = OrderedDict()
+        self.active_handlers = []
+        self.suspended_handlers = []
+        self.max_open_files = max_open_files
+
+    def __enter__(self):
+        # The handlers of the enclosing context stop receiving records until this one ends
+        root_logger = logging.getLogger()
+        self.suspended_handlers = [
+            handler
+            for handler in current_logging_context().active_handlers
+            if handler in root_logger.handlers
+        ]
+        for handler in self.suspended_handlers:
+            root_logger.removeHandler(handler)
+        LOGGING_CONTEXTS.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        LOGGING_CONTEXTS.remove(self)
+        for handler in self.suspended_handlers:
+            logging.getLogger().addHandler(handler)
+        self.suspended_handlers = []
+
+    def get_handler(self, key, create_handler):
+        """
+        Returns the cached handler of a log file, creating it if needed.
+
+        Args:
+            key (hashable): The key of the handler, e.g. the path of its log file.
+            create_handler (callable): Creates the handler, called without arguments.
+
+        Returns:
+            logging.Handler: The handler.
+        """
+        handler = self.handlers.get(key)
+        if handler is not None:
+            self.handlers.move_to_end(key)
+            return handler
+
+        handler = self.handlers[key] = create_handler()
+        while len(self.handlers) > self.max_open_files:
+            _, evicted_handler = self.handlers.popitem(last=False)
+            if evicted_handler in self.active_handlers:
+                self.active_handlers.remove(evicted_handler)
+                logging.getLogger().removeHandler(evicted_handler)
+            evicted_handler.close()
+        return handler
+
+    def activate(self, handlers):
+        """
+        Makes some handlers the only ones of the context on the root logger.
+
+        Args:
+            handlers (list): The handlers to add to the root logger.
+        """
+        self.detach()
+        self.active_handlers = list(handlers)
+        self.attach()
+
+    def attach(self):
+        """
+        Adds the active handlers to the root logger.
+        """
+        root_logger = logging.getLogger()
+        for handler in self.active_handlers:
+            if handler not in root_logger.handlers:
+                root_logger.addHandler(handler)
+
+    def detach(self):
+        """
+        Removes the active handlers from the root logger, without closing them.
+        """
+        root_logger = logging.getLogger()
+        for handler in self.active_handlers:
+            root_logger.removeHandler(handler)
+
+    def close(self):
+        """
+        Removes the handlers from the root logger and closes them.
+
+        Side Effects:
+            - Waits for the records of queued handlers to be written, see `QueuedLogHandler`.
+        """
+        self.detach()
+        self.active_handlers = []
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        if self.console_handler is not None:
+            self.console_handler.close()
+            self.console_handler = None
+
+
+# The contexts entered, innermost last, after the context of the whole process
+LOGGING_CONTEXTS = [LoggingContext()]
+
+
+def current_logging_context():
+    """
+    Returns the LoggingContext that handlers are set up in.
+
+    Returns:
+        LoggingContext: The innermost context entered, or the context of the whole process.
+    """
+    return LOGGING_CONTEXTS[-1]
+
 
 def format_process_data_logs(results):
     """
@@ -57,67 +243,93 @@ def format_process_data_logs(results):
     Returns:
         str: A formatted string representing the process data logs.
     """
-    log_lines = []
+    return "".join(iter_process_data_logs(results))
+
+
+def iter_process_data_logs(results):
+    """
+    Formats the process data results into a log-friendly string, piece by piece.
+
+    The pieces are yielded as they're formatted, so the whole log is never held in memory:
+    they're lines with the line break before them, or parts of a line for the long lists of
+    duplicate indices.
 
+    Args:
+        results (dict): The results dictionary containing process data.
+
+    Yields:
+        str: The pieces of the process data logs, see `format_process_data_logs`.
+    """
     # Log distinct story count from the results
-    log_lines.append(f"Number of distinct stories: {results['distinct_stories_count']}")
+    yield f"Number of distinct stories: {results['distinct_stories_count']}"
 
-    # Group logs for each document ID
-    grouped_logs = {}
+    # The logs are grouped by document ID, in the order the documents first appear in the
+    # results. Only the IDs are collected, the messages are formatted one document at a time.
+    for document_id in list_document_ids(results):
+        yield f"\n\nDocument ID {document_id}:"
+        yield from iter_document_logs(results, document_id)
 
-    # Missing indices (sorted numerically)
-    for document_id, missing_indices in results.get("missing", {}).items():
-        grouped_logs.setdefault(document_id, []).append(
-            f"Missing indices: {sorted(missing_indices)}"
-        )
 
-    # Identical duplicates
-    for document_id, duplicate_indices in results.get("identical_duplicates", {}).items():
-        if duplicate_indices:
-            duplicates = [
-                f"index: {index}, repeated: {count} {'time' if count == 1 else 'times'}"
-                for index, count in duplicate_indices.items()
-            ]
-            grouped_logs.setdefault(document_id, []).append(
-                f"Identical duplicate indices: {', '.join(duplicates)}"
-            )
+def iter_document_logs(results, document_id):
+    """
+    Formats the process data logs of a document, piece by piece.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        document_id (str): The ID of the document.
 
-    # Different duplicates
-    for document_id, duplicate_indices in results.get("different_duplicates", {}).items():
+    Yields:
+        str: The pieces of the messages of the document, each message starting with a line
+        break.
+    """
+    # Missing indices (sorted numerically)
+    missing = results.get("missing", {})
+    if document_id in missing:
+        yield f"\n    - Missing indices: {sorted(missing[document_id])}"
+
+    # Identical and different duplicates
+    for key, label in [
+        ("identical_duplicates", "Identical"),
+        ("different_duplicates", "Different"),
+    ]:
+        duplicate_indices = results.get(key, {}).get(document_id)
         if duplicate_indices:
-            duplicates = [
-                f"index: {index}, repeated: {count} {'time' if count == 1 else 'times'}"
-                for index, count in duplicate_indices.items()
-            ]
-            grouped_logs.setdefault(document_id, []).append(
-                f"Different duplicate indices: {', '.join(duplicates)}"
-            )
+            yield f"\n    - {label} duplicate indices: "
+            separator = ""
+            for index, count in duplicate_indices.items():
+                times = "time" if count == 1 else "times"
+                yield f"{separator}index: {index}, repeated: {count} {times}"
+                separator = ", "
 
     # Indexing errors (Invalid Type and Out of Range errors)
-    for document_id, errors in results.get("indexing_errors", {}).items():
-        if "invalid_type" in errors and errors["invalid_type"]:
-            invalid_type_errors = "\n        ".join(errors["invalid_type"])
-            grouped_logs.setdefault(document_id, []).append(
-                f"Invalid Type Errors:\n        {invalid_type_errors}"
-            )
-
-        # Sort out-of-range errors numerically
-        if "out_of_range" in errors and errors["out_of_range"]:
-            out_of_range_errors = sorted(errors["out_of_range"])
-            out_of_range_errors_str = "\n        ".join(
-                f"Out of range index: {error}" for error in out_of_range_errors
-            )
-            grouped_logs.setdefault(document_id, []).append(
-                f"Out of Range Errors:\n        {out_of_range_errors_str}"
-            )
-
-    # Print logs grouped by document ID
-    for document_id, messages in grouped_logs.items():
-        log_lines.append(f"\nDocument ID {document_id}:")
-        for message in messages:
-            log_lines.append(f"    - {message}")
+    errors = results.get("indexing_errors", {}).get(document_id)
+    if not isinstance(errors, dict):
+        # Not a document, e.g. the 'invalid_document_ids' list
+        errors = {}
+    if errors.get("invalid_type"):
+        yield "\n    - Invalid Type Errors:"
+        for error in errors["invalid_type"]:
+            yield f"\n        {error}"
+
+    # Sort out-of-range errors numerically
+    if errors.get("out_of_range"):
+        yield "\n    - Out of Range Errors:"
+        for error in sorted(errors["out_of_range"]):
+            yield f"\n        Out of range index: {error}"
+
+    # Records received after their document was finalized by an eviction policy
+    late_records = results.get("late_records", {})
+    if document_id in late_records:
+        yield (
+            "\n    - Records received after the document was finalized: "
+            f"{late_records[document_id]}"
+        )
 
-    return "\n".join(log_lines)
+    # Status changes since the previous file, when the analytics state is kept across runs
+    status_changes = results.get("status_changes", {})
+    if document_id in status_changes:
+        previous_status, status = status_changes[document_id]
+        yield f"\n    - Status: {previous_status or 'new'} -> {status}"
 
 
 def format_rp_entity_id_logs(errors):
@@ -130,33 +342,51 @@ def format_rp_entity_id_logs(errors):
     Returns:
         str: A formatted string representing the RP_ENTITY_ID validation logs.
     """
-    if not errors:
-        return ""
+    return "".join(iter_rp_entity_id_logs(errors))
 
-    log_lines = ["--- RP Entity ID Validation Logs ---"]
-    grouped_logs = {}
 
-    # Group errors by document ID
-    for error in errors:
-        rp_entity_id, rp_document_id, document_index = error
-        if rp_entity_id is None:
-            message = f"Missing RP_ENTITY_ID at index {document_index}"
-        else:
-            message = f"Invalid RP_ENTITY_ID: '{rp_entity_id}' at index {document_index}"
+def iter_rp_entity_id_logs(errors):
+    """
+    Formats the RP_ENTITY_ID validation errors into a log-friendly string, line by line.
 
-        # Append the message to the grouped logs for each document ID
-        grouped_logs.setdefault(rp_document_id, []).append(message)
+    Args:
+        errors (list): A list of tuples containing invalid RP_ENTITY_IDs and their corresponding document IDs and indices.
 
-    # Format the logs for each document ID
-    for rp_document_id, messages in grouped_logs.items():
-        log_lines.append(f"\nDocument ID {rp_document_id}:")
-        for message in messages:
-            log_lines.append(f"    - {message}")
+    Yields:
+        str: The lines of the RP_ENTITY_ID validation logs, see `format_rp_entity_id_logs`,
+        with the line break before them. Nothing if there are no errors.
+    """
+    if not errors:
+        return
 
-    return "\n".join(log_lines)
+    yield "--- RP Entity ID Validation Logs ---"
 
+    # Group errors by document ID. The groups hold the error tuples, the messages are
+    # formatted as they're written.
+    grouped_errors = {}
+    for error in errors:
+        grouped_errors.setdefault(error[1], []).append(error)
 
-def log(results, errors, processed_file="", log_directory=None, log_filename=None):
+    # Format the logs for each document ID
+    for rp_document_id, document_errors in grouped_errors.items():
+        yield f"\n\nDocument ID {rp_document_id}:"
+        for rp_entity_id, _, document_index in document_errors:
+            if rp_entity_id is None:
+                yield f"\n    - Missing RP_ENTITY_ID at index {document_index}"
+            else:
+                yield f"\n    - Invalid RP_ENTITY_ID: '{rp_entity_id}' at index {document_index}"
+
+
+def log(
+    results,
+    errors,
+    processed_file="",
+    log_directory=None,
+    log_filename=None,
+    queued=False,
+    results_format=None,
+    rotation=None,
+):
     """
     Logs all process data results and RP_ENTITY_ID validation errors.
 
@@ -166,23 +396,488 @@ def log(results, errors, processed_file="", log_directory=None, log_filename=Non
         processed_file (str): The name of the processed file to include in the log header.
         log_directory (str): The directory where the log file will be stored.
         log_filename (str): The name of the log file where logs will be stored. If None, defaults to '<processed_file>_logs'.
+        queued (bool): If True, the log is formatted and written to the log file by a
+            background thread, and the console only gets its summary (see
+            `setup_queued_logging`). The function then returns once the log is queued, and
+            `results` and `errors` must not change afterwards.
+        results_format (str, optional): "jsonl" or "parquet" to also write the results as
+            one record per document to '<processed_file>_results.<results_format>' in the log
+            directory, see `write_results`. They're written before the log, even when it's
+            queued.
+        rotation (LogRotation, optional): Rotates the log file once it's too large or too
+            old, instead of appending to it forever.
+
+    The log is a single record, whose message is written to the console and the log file as
+    it's formatted (see `ReportStreamHandler`), so the whole log is never held in memory.
     """
     if log_filename is None:
         log_filename = f"{processed_file}_logs.txt"
 
+    if results_format:
+        write_results(results, errors, processed_file, log_directory, results_format)
+
+    if queued:
+        setup_queued_logging(log_directory, log_filename, rotation)
+        logging.info(LogReport(results, errors, processed_file))
+        return
+
     # Set up logging configuration
-    setup_logging(log_directory, log_filename)
+    setup_logging(log_directory, log_filename, rotation)
+    logging.info(LogReport(results, errors, processed_file))
+
+
+def format_log(results, errors, processed_file=""):
+    """
+    Formats the complete log of a processed file.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file, the header of the log.
+
+    Returns:
+        str: The header, the process data logs and the RP_ENTITY_ID logs.
+    """
+    return "".join(iter_log(results, errors, processed_file))
+
 
-    # Call format_process_data_logs with results to get detailed logs
-    process_data_logs = format_process_data_logs(results)
+def iter_log(results, errors, processed_file=""):
+    """
+    Formats the complete log of a processed file, piece by piece.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file, the header of the log.
 
-    # Call format_rp_entity_id_logs to log RP_ENTITY_ID issues
-    rp_entity_id_logs = format_rp_entity_id_logs(errors)
+    Yields:
+        str: The pieces of the log, see `format_log`.
+    """
+    yield f"{processed_file}\n\n"
 
-    # Combine all logs into a single string and log
     # We always log process data logs because there's the story count,
     # but RP_ENTITY_ID logs are optional
-    complete_logs = f"{processed_file}\n\n{process_data_logs}"
-    if rp_entity_id_logs:
-        complete_logs += f"\n\n{rp_entity_id_logs}"
-    logging.info(complete_logs)
\ No newline at end of file
+    yield from iter_process_data_logs(results)
+    if errors:
+        yield "\n\n"
+        yield from iter_rp_entity_id_logs(errors)
+
+
+def write_log(sink, results, errors, processed_file=""):
+    """
+    Writes the complete log of a processed file to a file-like sink, as it's formatted.
+
+    Args:
+        sink (TextIO): Any object with a `write(str)` method, e.g. a text file or a StringIO.
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file, the header of the log.
+
+    Side Effects:
+        - Writes the text of `format_log` to `sink`, in pieces of about
+          `LOG_WRITE_SIZE` characters. Line buffered streams like the console flush every
+          write, so the small pieces of the log are joined first.
+    """
+    pieces = []
+    size = 0
+    try:
+        for piece in iter_log(results, errors, processed_file):
+            pieces.append(piece)
+            size += len(piece)
+            if size >= LOG_WRITE_SIZE:
+                sink.write("".join(pieces))
+                pieces.clear()
+                size = 0
+    finally:
+        # Also when formatting failed, so the sink has every piece formatted before
+        if pieces:
+            sink.write("".join(pieces))
+
+
+def summarize_results(results, errors):
+    """
+    Counts the documents with issues in the results of a file.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+
+    Returns:
+        dict: The `distinct_stories`, `missing_documents`, `duplicate_documents` and
+        `validation_errors` counts of a summary, see `format_batch_summary`.
+    """
+    return {
+        "distinct_stories": results["distinct_stories_count"],
+        "missing_documents": len(results.get("missing", {})),
+        "duplicate_documents": len(
+            {
+                document_id
+                for key in ("identical_duplicates", "different_duplicates")
+                for document_id, indices in results.get(key, {}).items()
+                if indices
+            }
+        ),
+        "validation_errors": len(errors),
+    }
+
+
+class LogReport:
+    """
+    The log of a processed file, formatted only when a handler writes it.
+
+    Logged as the message of a record, its text is the one of `format_log`. The handlers of
+    `setup_logging` write it to their stream piece by piece (see `ReportStreamHandler`). With
+    `setup_queued_logging`, it's formatted by the background thread writing the log file, and
+    the console shows its summary instead (see `SummaryFormatter`).
+
+    Attributes:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file.
+    """
+
+    __slots__ = ("results", "errors", "processed_file")
+
+    def __init__(self, results, errors, processed_file=""):
+        """
+        Initializes the LogReport class.
+
+        Args:
+            results (dict): The results dictionary containing process data.
+            errors (list): The RP_ENTITY_ID validation errors.
+            processed_file (str): The name of the processed file.
+        """
+        self.results = results
+        self.errors = errors
+        self.processed_file = processed_file
+
+    def __str__(self):
+        return format_log(self.results, self.errors, self.processed_file)
+
+    def write(self, sink):
+        """
+        Writes the log to a file-like sink as it's formatted, see `write_log`.
+
+        Args:
+            sink (TextIO): The object to write the log to.
+        """
+        write_log(sink, self.results, self.errors, self.processed_file)
+
+    def summary(self):
+        """
+        Formats the summary of the log on one line, see `format_file_summary`.
+
+        Returns:
+            str: The name of the file and its counts.
+        """
+        summary = {"file": self.processed_file, "error": None}
+        summary.update(summarize_results(self.results, self.errors))
+        return format_file_summary(summary)
+
+
+class SummaryFormatter(logging.Formatter):
+    """
+    Formats LogReport messages as their one line summary, and the other messages as they are.
+    """
+
+    def format(self, record):
+        if isinstance(record.msg, LogReport):
+            # A copy, as the other handlers of the record write the whole log
+            record = logging.makeLogRecord(
+                dict(record.__dict__, msg=record.msg.summary(), args=None)
+            )
+        return super().format(record)
+
+
+class ReportStreamHandler(logging.StreamHandler):
+    """
+    A StreamHandler writing LogReport messages to its stream as they're formatted.
+
+    The record is formatted with a placeholder message, and the log is written in its place,
+    so the output is the same as formatting the whole log into the record, without ever
+    holding it in memory. The other messages are handled like by a StreamHandler.
+
+    An error while formatting the log isn't swallowed by `handleError` like the errors of
+    other records: the part of the log already written is followed by a line marking it as
+    incomplete, and the error is raised to the caller.
+    """
+
+    # Stands for the message when formatting a LogReport record
+    PLACEHOLDER = "\x00log report\x00"
+
+    def emit(self, record):
+        if not isinstance(record.msg, LogReport):
+            super().emit(record)
+            return
+
+        try:
+            placeholder_record = logging.makeLogRecord(
+                dict(record.__dict__, msg=self.PLACEHOLDER, args=None)
+            )
+            before, after = self.format(placeholder_record).split(self.PLACEHOLDER, 1)
+            stream = self.open_stream()
+            stream.write(before)
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+            return
+
+        try:
+            record.msg.write(stream)
+        except Exception as e:
+            # A truncated log must not look complete
+            stream.write(f"{self.terminator}[Incomplete log: {type(e).__name__}: {e}]")
+            stream.write(self.terminator)
+            self.flush()
+            raise
+        stream.write(after + self.terminator)
+        self.flush()
+
+    def open_stream(self):
+        """
+        Gets the stream to write to.
+
+        Returns:
+            TextIO: The stream of the handler.
+        """
+        return self.stream
+
+
+class ReportFileHandler(ReportStreamHandler, logging.FileHandler):
+    """
+    A FileHandler writing LogReport messages to its file as they're formatted.
+
+    With a LogRotation, the file is rotated before a record when it's due, so long running
+    handlers (like the one of a watch run) don't append to the same file forever.
+
+    Attributes:
+        rotation (LogRotation): The rotation policy of the file, or None.
+    """
+
+    def __init__(self, filename, mode="a", encoding=None, delay=False, rotation=None):
+        """
+        Initializes the ReportFileHandler class.
+
+        Args:
+            filename (str): The path to the log file.
+            mode (str): The mode the file is opened with.
+            encoding (str, optional): The encoding of the file.
+            delay (bool): Whether the file is only opened by the first record.
+            rotation (LogRotation, optional): Rotates the file once it's too large or too old.
+        """
+        super().__init__(filename, mode, encoding, delay)
+        self.rotation = rotation
+
+    def emit(self, record):
+        if self.rotation is not None:
+            try:
+                self.rotate_if_needed()
+            except OSError:
+                # The record is still written, to the file as it is
+                self.handleError(record)
+        super().emit(record)
+
+    def rotate_if_needed(self):
+        """
+        Rotates the log file if it's due for rotation, see `LogRotation.should_rotate`.
+
+        The file is closed first, and opened again by the next record.
+        """
+        if self.rotation is None:
+            return
+        with self.lock:
+            if self.rotation.should_rotate(self.baseFilename):
+                if self.stream is not None:
+                    self.stream.close()
+                    self.stream = None
+                self.rotation.rotate(self.baseFilename)
+
+    def open_stream(self):
+        # Like FileHandler.emit, reopens the file if the handler was closed
+        if self.stream is None:
+            self.stream = self._open()
+        return self.stream
+
+
+class QueuedLogHandler(QueueHandler):
+    """
+    Hands the log records to a background thread, which writes them with its own handlers.
+
+    The records are queued as they are, so their messages (e.g. a LogReport) are formatted by
+    the background thread. Closing the handler waits for the queued records to be written,
+    then closes the handlers of the thread. `logging.shutdown` does it at exit.
+
+    Attributes:
+        listener (QueueListener): The background thread, None once the handler is closed.
+    """
+
+    def __init__(self, *handlers):
+        """
+        Initializes the QueuedLogHandler class, and starts its background thread.
+
+        Args:
+            *handlers (logging.Handler): The handlers writing the records.
+        """
+        super().__init__(queue.SimpleQueue())
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record):
+        # The records don't leave the process: their messages are formatted by the listener
+        return record
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+        super().close()
+
+
+def setup_queued_logging(log_directory, log_filename, rotation=None):
+    """
+    Sets up logging to a log file from a background thread, with a summary on the console.
+
+    Unlike `setup_logging`, logging a record only queues it. The records are written to the
+    log file, in the format of `setup_logging`, by the thread of a QueuedLogHandler. The
+    console gets the summary of LogReport messages instead of the whole log. Like in
+    `setup_logging`, the handler of each file is cached in the current LoggingContext.
+
+    Args:
+        log_directory (str): The directory where the log file will be stored.
+        log_filename (str): The name of the log file where logs will be stored.
+        rotation (LogRotation, optional): Rotates the log file once it's too large or too old.
+
+    Returns:
+        QueuedLogHandler: The handler added to the root logger. Closing it (or the
+        LoggingContext) waits for the log to be written.
+    """
+    log_file_path = os.path.join(log_directory, log_filename)
+    os.makedirs(log_directory, exist_ok=True)
+    context = current_logging_context()
+
+    # Rotate the log file before the separator, so that a new file starts without one
+    if rotation is not None:
+        queued_handler = context.handlers.get(("queued", log_file_path))
+        file_handler = queued_handler.listener.handlers[0] if queued_handler else None
+        rotate_log_file(log_file_path, rotation, file_handler)
+
+    # If the file exists, add a separator before appending new logs
+    if os.path.exists(log_file_path):
+        with open(log_file_path, "a") as f:
+            f.write("\n\n-----\n\n")
+
+    def create_queued_handler():
+        file_handler = ReportFileHandler(log_file_path, mode="a", rotation=rotation)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(SummaryFormatter("%(asctime)s - %(message)s"))
+        return QueuedLogHandler(file_handler, console_handler)
+
+    handler = context.get_handler(("queued", log_file_path), create_queued_handler)
+    logging.getLogger().setLevel(logging.INFO)
+    context.activate([handler])
+    return handler
+
+
+def format_batch_summary(summaries):
+    """
+    Formats the summary of a batch of processed files.
+
+    Args:
+        summaries (list): One dictionary per file, in input order, with the keys:
+            - file (str): The name of the file.
+            - error (str): The error that stopped its processing, or None.
+            - distinct_stories (int): The number of distinct stories.
+            - missing_documents (int): The number of documents with missing indices.
+            - duplicate_documents (int): The number of documents with duplicate indices.
+            - validation_errors (int): The number of RP_ENTITY_ID validation errors.
+            - seconds (float): The time spent on the file.
+
+    Returns:
+        str: A formatted string with the number of processed and failed files, then one line
+        per file.
+    """
+    failed = [summary for summary in summaries if summary["error"]]
+    log_lines = [f"Files processed: {len(summaries) - len(failed)}, failed: {len(failed)}"]
+
+    for summary in summaries:
+        log_lines.append(f"    - {format_file_summary(summary)}")
+    return "\n".join(log_lines)
+
+
+def format_file_summary(summary):
+    """
+    Formats the summary of a single processed file on one line.
+
+    Args:
+        summary (dict): The summary of the file, see `format_batch_summary`. The `seconds`
+            are optional.
+
+    Returns:
+        str: The name of the file and its counts, or the error that stopped its processing.
+    """
+    if summary["error"]:
+        return f"{summary['file']}: failed: {summary['error']}"
+    line = (
+        f"{summary['file']}: {summary['distinct_stories']} distinct stories, "
+        f"{summary['missing_documents']} with missing indices, "
+        f"{summary['duplicate_documents']} with duplicates, "
+        f"{summary['validation_errors']} RP_ENTITY_ID errors"
+    )
+    if "seconds" in summary:
+        line += f" ({summary['seconds']:.1f}s)"
+    return line
+
+
+def log_batch_summary(
+    summaries, log_directory, log_filename="batch_summary_logs.txt", rotation=None
+):
+    """
+    Logs the summary of a batch of processed files.
+
+    Args:
+        summaries (list): The summaries of the files, see `format_batch_summary`.
+        log_directory (str): The directory where the log file will be stored.
+        log_filename (str): The name of the log file.
+        rotation (LogRotation, optional): Rotates the log file once it's too large or too old.
+    """
+    setup_logging(log_directory, log_filename, rotation)
+    logging.info(format_batch_summary(summaries))
+
+
+def get_watch_logger(log_directory, log_filename="watch_logs.txt", rotation=None):
+    """
+    Returns the logger of a watch run, logging to both the console and a log file.
+
+    Unlike `setup_logging`, the handlers are only added the first time, so a resident process
+    can log every file it processes without piling up handlers. The logger doesn't propagate
+    to the root logger, whose handlers are added and removed for the log of each file.
+
+    Args:
+        log_directory (str): The directory where the log file will be stored.
+        log_filename (str): The name of the log file.
+        rotation (LogRotation, optional): Rotates the log file once it's too large or too old,
+            checked before every record.
+
+    Returns:
+        logging.Logger: The watch logger.
+    """
+    logger = logging.getLogger("document_analytics.watch")
+    if logger.handlers:
+        return logger
+
+    os.makedirs(log_directory, exist_ok=True)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    formatter = logging.Formatter("%(asctime)s - %(message)s")
+    for handler in (
+        logging.StreamHandler(),
+        ReportFileHandler(os.path.join(log_directory, log_filename), mode="a", rotation=rotation),
+    ):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    return logger
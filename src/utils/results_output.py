@@ -0,0 +1,338 @@
+"""
+This module writes the results of a processed file as machine-readable records.
+
+Every document with an issue gets one record: its missing indices, duplicates, indexing
+errors, late records, status change and RP_ENTITY_ID validation errors, in the order of the
+text log. The records are written as they're built, either as JSON lines or, with PyArrow
+installed, as a Parquet file written in row groups of `RESULTS_BATCH_SIZE` documents.
+
+Record fields:
+    - file (str): The name of the processed file.
+    - document_id (str): The RP_DOCUMENT_ID.
+    - missing_indices (list): The missing indices, sorted.
+    - identical_duplicates, different_duplicates (list): `{"index", "count"}` objects.
+    - invalid_type_errors (list): The invalid type error messages.
+    - out_of_range_indices (list): The out of range indices, sorted.
+    - late_records (int): The records received after the document was finalized.
+    - previous_status, status (str): The status change of the document, when the analytics
+      state is kept across runs, else None.
+    - rp_entity_id_errors (list): `{"rp_entity_id", "index"}` objects, the RP_ENTITY_ID being
+      None when it's missing.
+
+The JSON lines keep the values as they were in the records. Parquet columns have a single
+type, so the values read as they were from the records (the document IDs, the RP_ENTITY_IDs
+and the `DOCUMENT_RECORD_INDEX` values of the duplicates, of the out of range indices and
+of the validation errors) are written as strings there.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the installed packages
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the installed packages
+    pa = None
+    pq = None
+
+# The output formats of `write_results`
+RESULTS_FORMATS = ("jsonl", "parquet")
+
+# The number of documents in each row group of a Parquet file
+RESULTS_BATCH_SIZE = 10000
+
+
+def list_document_ids(results):
+    """
+    Lists the documents with issues in the results, in the order of the text log.
+
+    A document comes in the order it first appears in the missing indices, the duplicates,
+    the indexing errors, the late records and the status changes.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+
+    Returns:
+        list: The RP_DOCUMENT_IDs.
+    """
+    document_ids = dict.fromkeys(results.get("missing", {}))
+    for key in ("identical_duplicates", "different_duplicates"):
+        for document_id, duplicate_indices in results.get(key, {}).items():
+            if duplicate_indices:
+                document_ids.setdefault(document_id)
+    for document_id, errors in results.get("indexing_errors", {}).items():
+        # The entries that aren't documents (the 'invalid_document_ids' list) are skipped
+        if not isinstance(errors, dict):
+            continue
+        if errors.get("invalid_type") or errors.get("out_of_range"):
+            document_ids.setdefault(document_id)
+    for key in ("late_records", "status_changes"):
+        document_ids.update(dict.fromkeys(results.get(key, {})))
+    return list(document_ids)
+
+
+def iter_document_records(results, errors, processed_file=""):
+    """
+    Builds the record of every document with an issue, one at a time.
+
+    The documents of the results come first, in the order of `list_document_ids`, then the
+    documents that only have RP_ENTITY_ID validation errors.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file.
+
+    Yields:
+        dict: The record of a document, see the module docstring.
+    """
+    # The groups hold the error tuples, the objects are built with their record
+    grouped_errors = {}
+    for error in errors:
+        grouped_errors.setdefault(error[1], []).append(error)
+
+    for document_id in list_document_ids(results):
+        yield build_document_record(
+            results, document_id, grouped_errors.pop(document_id, []), processed_file
+        )
+    for document_id, document_errors in grouped_errors.items():
+        yield build_document_record(results, document_id, document_errors, processed_file)
+
+
+def build_document_record(results, document_id, errors, processed_file=""):
+    """
+    Builds the record of a document.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        document_id (str): The RP_DOCUMENT_ID.
+        errors (list): The RP_ENTITY_ID validation errors of the document.
+        processed_file (str): The name of the processed file.
+
+    Returns:
+        dict: The record, see the module docstring.
+    """
+    missing_indices = results.get("missing", {}).get(document_id)
+    indexing_errors = results.get("indexing_errors", {}).get(document_id)
+    if not isinstance(indexing_errors, dict):
+        indexing_errors = {}
+    previous_status, status = results.get("status_changes", {}).get(document_id, (None, None))
+    return {
+        "file": processed_file,
+        "document_id": document_id,
+        "missing_indices": sorted(missing_indices) if missing_indices else [],
+        "identical_duplicates": list_duplicates(results, "identical_duplicates", document_id),
+        "different_duplicates": list_duplicates(results, "different_duplicates", document_id),
+        "invalid_type_errors": list(indexing_errors.get("invalid_type", [])),
+        "out_of_range_indices": sorted(indexing_errors.get("out_of_range", [])),
+        "late_records": results.get("late_records", {}).get(document_id, 0),
+        "previous_status": previous_status,
+        "status": status,
+        "rp_entity_id_errors": [
+            {"rp_entity_id": rp_entity_id, "index": document_index}
+            for rp_entity_id, _, document_index in errors
+        ],
+    }
+
+
+def list_duplicates(results, key, document_id):
+    """
+    Lists the duplicate indices of a document.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        key (str): "identical_duplicates" or "different_duplicates".
+        document_id (str): The RP_DOCUMENT_ID.
+
+    Returns:
+        list: `{"index", "count"}` objects, in the order of the results.
+    """
+    duplicate_indices = results.get(key, {}).get(document_id) or {}
+    return [{"index": index, "count": count} for index, count in duplicate_indices.items()]
+
+
+def check_results_format(results_format):
+    """
+    Checks that records can be written in a format.
+
+    Args:
+        results_format (str): One of `RESULTS_FORMATS`.
+
+    Raises:
+        ValueError: If the format isn't one of `RESULTS_FORMATS`.
+        ImportError: If the format is Parquet and PyArrow is not installed.
+    """
+    if results_format not in RESULTS_FORMATS:
+        raise ValueError(
+            f"Unknown results format: {results_format}, expected one of {RESULTS_FORMATS}"
+        )
+    if results_format == "parquet" and pq is None:
+        raise ImportError("Parquet results require PyArrow: pip install pyarrow")
+
+
+def write_results(
+    results, errors, processed_file, output_directory, results_format="jsonl", filename=None
+):
+    """
+    Writes the record of every document with an issue to a file, as they're built.
+
+    Args:
+        results (dict): The results dictionary containing process data.
+        errors (list): The RP_ENTITY_ID validation errors.
+        processed_file (str): The name of the processed file.
+        output_directory (str): The directory where the file will be stored.
+        results_format (str): "jsonl" or "parquet", see `RESULTS_FORMATS`.
+        filename (str, optional): The name of the file. Defaults to
+            '<processed_file>_results.<results_format>'.
+
+    Returns:
+        str: The path to the file.
+
+    Raises:
+        ValueError: If the format isn't one of `RESULTS_FORMATS`.
+        ImportError: If the format is Parquet and PyArrow is not installed.
+
+    Side Effects:
+        - Writes the records next to the file, then moves them over it, so downstream jobs
+          never read a partly written file. A file from a previous run is replaced.
+    """
+    check_results_format(results_format)
+    if filename is None:
+        filename = f"{processed_file}_results.{results_format}"
+    os.makedirs(output_directory, exist_ok=True)
+    output_path = os.path.join(output_directory, filename)
+    temp_path = f"{output_path}.tmp"
+
+    records = iter_document_records(results, errors, processed_file)
+    try:
+        if results_format == "parquet":
+            write_results_parquet(temp_path, records)
+        else:
+            with open(temp_path, "wb") as output_file:
+                write_results_jsonl(output_file, records)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return output_path
+
+
+def write_results_jsonl(output_file, records):
+    """
+    Writes records as JSON lines.
+
+    Records are serialized by orjson when it's installed. The ones orjson can't serialize, e.g.
+    with integers beyond 64 bits, are serialized by `json` like without orjson.
+
+    Args:
+        output_file (BinaryIO): The binary file to write to.
+        records (iterable): The records, see `iter_document_records`.
+    """
+    write = output_file.write
+    for record in records:
+        if orjson is not None:
+            try:
+                write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+                continue
+            except TypeError:
+                pass
+        write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        write(b"\n")
+
+
+def write_results_parquet(output_path, records, batch_size=None):
+    """
+    Writes records as a Parquet file, one row group of `batch_size` records at a time.
+
+    Args:
+        output_path (str): The path to the Parquet file.
+        records (iterable): The records, see `iter_document_records`.
+        batch_size (int, optional): The number of records in each row group. Defaults to
+            `RESULTS_BATCH_SIZE`.
+
+    Raises:
+        ImportError: If PyArrow is not installed.
+    """
+    check_results_format("parquet")
+    batch_size = batch_size or RESULTS_BATCH_SIZE
+    schema = parquet_schema()
+    with pq.ParquetWriter(output_path, schema) as writer:
+        batch = []
+        for record in records:
+            batch.append(parquet_row(record))
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch.clear()
+        # A file without records still has the schema, and no row groups
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+
+
+def parquet_schema():
+    """
+    Builds the schema of the Parquet records.
+
+    Returns:
+        pyarrow.Schema: The columns of the records, see the module docstring.
+    """
+    duplicates = pa.list_(pa.struct([("index", pa.string()), ("count", pa.int64())]))
+    return pa.schema(
+        [
+            ("file", pa.string()),
+            ("document_id", pa.string()),
+            ("missing_indices", pa.list_(pa.int64())),
+            ("identical_duplicates", duplicates),
+            ("different_duplicates", duplicates),
+            ("invalid_type_errors", pa.list_(pa.string())),
+            ("out_of_range_indices", pa.list_(pa.string())),
+            ("late_records", pa.int64()),
+            ("previous_status", pa.string()),
+            ("status", pa.string()),
+            (
+                "rp_entity_id_errors",
+                pa.list_(pa.struct([("rp_entity_id", pa.string()), ("index", pa.string())])),
+            ),
+        ]
+    )
+
+
+def parquet_row(record):
+    """
+    Converts the raw values of a record to strings, for the Parquet schema.
+
+    Args:
+        record (dict): The record, see `iter_document_records`.
+
+    Returns:
+        dict: The record, with the document ID, the duplicate and out of range indices, and
+        the RP_ENTITY_IDs and indices of the validation errors as strings. None stays None.
+    """
+    record["document_id"] = to_string(record["document_id"])
+    for key in ("identical_duplicates", "different_duplicates"):
+        for duplicate in record[key]:
+            duplicate["index"] = to_string(duplicate["index"])
+    record["out_of_range_indices"] = [
+        to_string(index) for index in record["out_of_range_indices"]
+    ]
+    for error in record["rp_entity_id_errors"]:
+        error["rp_entity_id"] = to_string(error["rp_entity_id"])
+        error["index"] = to_string(error["index"])
+    return record
+
+
+def to_string(value):
+    """
+    Converts a raw value of the records to a string, keeping None.
+
+    Args:
+        value: The value, e.g. an RP_DOCUMENT_ID or a `DOCUMENT_RECORD_INDEX`.
+
+    Returns:
+        str: The value as a string, or None.
+    """
+    return None if value is None else str(value)
@@ -0,0 +1,15 @@
+"""
+This module configures pytest for the tests.
+
+The entry point modules (`main`, `pipeline` and `service`) import the packages of `src` the
+way they're run, e.g. `from helpers.data_loader import ...`, so `src` is put on the import
+path for their tests to import them the same way.
+"""
+
+import sys
+from pathlib import Path
+
+SRC_DIRECTORY = str(Path(__file__).resolve().parents[1] / "src")
+
+if SRC_DIRECTORY not in sys.path:
+    sys.path.insert(0, SRC_DIRECTORY)
@@ -117,4 +117,43 @@ format_process_data_logs_sample_data = {
             "    - Out of Range Errors:\n        Out of range index: 2\n        Out of range index: 4"
         ),
     },
+    "late_records": {
+        "results": {
+            "distinct_stories_count": 2,
+            "missing": {"DOC123": [2]},
+            "identical_duplicates": {},
+            "different_duplicates": {},
+            "indexing_errors": {},
+            "late_records": {"DOC123": 1, "DOC456": 3},
+        },
+        "expected_result": (
+            "Number of distinct stories: 2\n"
+            "\nDocument ID DOC123:\n"
+            "    - Missing indices: [2]\n"
+            "    - Records received after the document was finalized: 1\n"
+            "\nDocument ID DOC456:\n"
+            "    - Records received after the document was finalized: 3"
+        ),
+    },
+    "status_changes": {
+        "results": {
+            "distinct_stories_count": 3,
+            "missing": {"DOC456": [3]},
+            "identical_duplicates": {},
+            "different_duplicates": {},
+            "indexing_errors": {},
+            "status_changes": {
+                "DOC123": ("incomplete", "complete"),
+                "DOC456": (None, "incomplete"),
+            },
+        },
+        "expected_result": (
+            "Number of distinct stories: 3\n"
+            "\nDocument ID DOC456:\n"
+            "    - Missing indices: [3]\n"
+            "    - Status: new -> incomplete\n"
+            "\nDocument ID DOC123:\n"
+            "    - Status: incomplete -> complete"
+        ),
+    },
 }
@@ -13,7 +13,21 @@ import os
 import tempfile
 import pytest
 import patoolib
-from src.helpers.data_loader import load_json_data, extract_rar_file, cleanup_temp_directory
+from src.helpers.data_loader import (
+    load_json_data,
+    extract_rar_file,
+    cleanup_temp_directory,
+    iter_json_records,
+    iter_line_offsets,
+    get_rar_stream_command,
+    is_batch_input,
+    list_input_files,
+    list_rar_members,
+    RAR_STREAM_COMMANDS,
+)
+from src.helpers.json_decoder import JSON_DECODERS, decode_json_line, get_json_decoder
+from src.helpers import projection
+from src.helpers.projection import ProjectedRecord, decode_projected_line
 
 # Sample JSON data
 sample_json_data = [{"key1": "value1"}, {"key2": "value2"}]
@@ -227,3 +241,377 @@ def test_load_json_data_file_not_found(mocker):
         load_json_data(file_path)
 
     mock_open.assert_called_once_with(file_path, "r", encoding="utf-8")
+
+
+def test_iter_json_records_reports_parse_errors(mocker):
+    """
+    Test that iter_json_records yields records lazily and reports invalid lines
+    through the callback instead of printing them.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+
+    Asserts:
+        The valid records are yielded and the invalid line is passed to the callback.
+    """
+    lines = [json.dumps(sample_json_data[0]), "{not json", json.dumps(sample_json_data[1])]
+    mocker.patch("builtins.open", mocker.mock_open(read_data="\n".join(lines)))
+    mock_print = mocker.patch("builtins.print")
+    parse_errors = []
+
+    records = iter_json_records("test.json", on_error=lambda line, e: parse_errors.append(line))
+
+    # Nothing is read until the generator is consumed
+    assert not parse_errors
+    assert list(records) == sample_json_data
+    assert parse_errors == ["{not json"]
+    mock_print.assert_not_called()
+
+
+def test_iter_json_records_from_rar_cleans_up(mocker, setup_temp_dir):
+    """
+    Test that iter_json_records deletes the temporary directory of a .rar archive
+    once the records are exhausted.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+        setup_temp_dir (str): The path to the temporary directory.
+
+    Asserts:
+        The records are yielded and the temporary directory is cleaned up.
+    """
+    temp_dir = setup_temp_dir
+    extracted_file_path = os.path.join(temp_dir, "extracted.json")
+    with open(extracted_file_path, "w", encoding="utf-8") as file:
+        file.write("\n".join(json.dumps(item) for item in sample_json_data))
+
+    # Force the temporary directory fallback used when no streaming tool is installed
+    mocker.patch("src.helpers.data_loader.get_rar_stream_command", return_value=None)
+    mocker.patch("src.helpers.data_loader.create_temp_directory", return_value=temp_dir)
+    mocker.patch(
+        "src.helpers.data_loader.extract_rar_members", return_value=[extracted_file_path]
+    )
+
+    assert list(iter_json_records("test.rar")) == sample_json_data
+    assert not os.path.exists(temp_dir)
+
+
+@pytest.mark.skipif(get_rar_stream_command() is None, reason="No .rar streaming tool installed")
+def test_iter_json_records_streams_rar_without_temp_directory(mocker):
+    """
+    Test that .rar archives are streamed through a pipe when a streaming tool is installed.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+
+    Asserts:
+        The records are read without creating a temporary directory.
+    """
+    rar_path = "test/sample_data/e2e_sample_data/file_with_errors.rar"
+    mock_create_temp_directory = mocker.patch("src.helpers.data_loader.create_temp_directory")
+
+    assert list_rar_members(rar_path, get_rar_stream_command())[0] == ["file_with_errors"]
+
+    records = iter_json_records(rar_path)
+    first_record = next(records)
+    records.close()
+
+    assert first_record["RP_DOCUMENT_ID"] == "0B31D33076B73E35F140F4701F69168C"
+    mock_create_temp_directory.assert_not_called()
+
+
+def test_list_rar_members_skips_directories(mocker):
+    """
+    Test that list_rar_members only returns files.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+
+    Asserts:
+        Directory entries and empty lines are ignored.
+    """
+    mock_run = mocker.patch(
+        "subprocess.run",
+        return_value=mocker.Mock(returncode=0, stdout="shards/\nshards/00.jsonl\n\n", stderr=""),
+    )
+    commands = {"list": ["bsdtar", "-tf"], "extract": ["bsdtar", "-xOf"]}
+
+    assert list_rar_members("test.rar", commands) == (["shards/00.jsonl"], commands)
+    mock_run.assert_called_once_with(
+        ["bsdtar", "-tf", "test.rar"], capture_output=True, text=True, check=False
+    )
+
+
+def test_list_rar_members_falls_back_to_the_next_tool(mocker):
+    """
+    Test that list_rar_members tries the next installed tool when the first one can't list
+    the archive, and that no commands are returned when none can.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+
+    Asserts:
+        The members are listed by the second tool, whose commands are returned to stream them.
+    """
+    mocker.patch("shutil.which", return_value="/usr/bin/tool")
+    mock_run = mocker.patch(
+        "subprocess.run",
+        side_effect=[
+            mocker.Mock(returncode=1, stdout="", stderr="Unsupported archive format"),
+            mocker.Mock(returncode=0, stdout="00.jsonl\n", stderr=""),
+        ],
+    )
+    unrar_commands = RAR_STREAM_COMMANDS["unrar"]
+    bsdtar_commands = RAR_STREAM_COMMANDS["bsdtar"]
+
+    assert list_rar_members("test.rar", unrar_commands) == (["00.jsonl"], bsdtar_commands)
+    assert [call.args[0] for call in mock_run.call_args_list] == [
+        unrar_commands["list"] + ["test.rar"],
+        bsdtar_commands["list"] + ["test.rar"],
+    ]
+
+    mock_run.side_effect = None
+    mock_run.return_value = mocker.Mock(returncode=1, stdout="", stderr="Damaged archive")
+    assert list_rar_members("test.rar", unrar_commands) == ([], None)
+
+
+def test_iter_json_records_extracts_rar_no_tool_can_list(mocker, setup_temp_dir):
+    """
+    Test that a .rar archive no streaming tool can list is extracted with patool instead.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+        setup_temp_dir (str): The path to the temporary directory.
+
+    Asserts:
+        The records of the extracted file are yielded, and the temporary directory is removed.
+    """
+    temp_dir = setup_temp_dir
+    rar_path = os.path.join(temp_dir, "test.rar")
+    with open(rar_path, "wb") as file:
+        file.write(b"Rar!\x1a\x07")
+    extracted_file_path = os.path.join(temp_dir, "extracted.json")
+    with open(extracted_file_path, "w", encoding="utf-8") as file:
+        file.write("\n".join(json.dumps(item) for item in sample_json_data))
+
+    mocker.patch(
+        "src.helpers.data_loader.get_rar_stream_command",
+        return_value=RAR_STREAM_COMMANDS["bsdtar"],
+    )
+    mocker.patch("src.helpers.data_loader.list_rar_members", return_value=([], None))
+    mocker.patch("src.helpers.data_loader.create_temp_directory", return_value=temp_dir)
+    mock_extract = mocker.patch(
+        "src.helpers.data_loader.extract_rar_members", return_value=[extracted_file_path]
+    )
+
+    assert list(iter_json_records(rar_path)) == sample_json_data
+    mock_extract.assert_called_once_with(rar_path, temp_dir)
+    assert not os.path.exists(temp_dir)
+
+
+def installed_json_decoders():
+    """
+    Returns the names of the JSON decoders installed.
+
+    Returns:
+        list: The installed decoders, see `JSON_DECODERS`.
+    """
+    names = []
+    for name in JSON_DECODERS:
+        try:
+            get_json_decoder(name)
+        except ValueError:
+            continue
+        names.append(name)
+    return names
+
+
+@pytest.mark.parametrize("name", installed_json_decoders())
+def test_decode_json_line_matches_json(name):
+    """
+    Test that every JSON decoder gives the records and errors of `json.loads`.
+
+    Args:
+        name (str): The name of the decoder.
+
+    Asserts:
+        Valid lines (including the ones only `json` accepts) are decoded like `json.loads`,
+        and invalid lines raise the `json.JSONDecodeError` of the stripped line.
+    """
+    loads = get_json_decoder(name)
+    lines = ['{"key1": "value1"}\n', '{"key": NaN}', '{"key": 18446744073709551615}']
+    for line in lines:
+        assert decode_json_line(line, loads) == json.loads(line.strip())
+        assert decode_json_line(line.encode("utf-8"), loads) == json.loads(line.strip())
+
+    for line in [' {"RP_ENTITY_ID":,}\r\n', b'{"RP_ENTITY_ID":,}\n', b"\n"]:
+        with pytest.raises(json.JSONDecodeError) as error:
+            decode_json_line(line, loads)
+        text = line.decode("utf-8") if isinstance(line, bytes) else line
+        with pytest.raises(json.JSONDecodeError) as expected_error:
+            json.loads(text.strip())
+        assert error.value.doc == text.strip()
+        assert str(error.value) == str(expected_error.value)
+
+
+@pytest.mark.parametrize("name", installed_json_decoders())
+def test_decode_json_line_keeps_large_integers(name):
+    """
+    Test that every JSON decoder keeps the integers beyond 64 bits, at any depth.
+
+    Args:
+        name (str): The name of the decoder.
+
+    Asserts:
+        The records are those of `json.loads`, with integers and not floats.
+    """
+    loads = get_json_decoder(name)
+    line = json.dumps({"A": 2**70, "B": [{"C": -(2**70)}], "D": -(2**63) - 1, "E": 1.5e300})
+
+    for document in [line, line.encode("utf-8")]:
+        record = decode_json_line(document, loads)
+        assert record == json.loads(line)
+        assert record["A"] == 2**70 and isinstance(record["A"], int)
+        assert isinstance(record["B"][0]["C"], int) and isinstance(record["D"], int)
+
+
+def test_get_json_decoder_unknown():
+    """
+    Test that an unknown JSON decoder is rejected.
+
+    Asserts:
+        A ValueError is raised.
+    """
+    with pytest.raises(ValueError):
+        get_json_decoder("yaml")
+
+
+def test_iter_json_records_binary_matches_text(setup_temp_dir):
+    """
+    Test that reading a file in binary chunks gives the records and errors of text mode.
+
+    Args:
+        setup_temp_dir (str): The path to the temporary directory.
+
+    Asserts:
+        Both modes yield the same records and report the same lines and errors.
+    """
+    file_path = os.path.join(setup_temp_dir, "records.json")
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.write('{"TITLE": "Café"}\r\n{not json\n\n{"key2": "value2"}')
+
+    results = {}
+    for binary in (False, True):
+        parse_errors = []
+        records = list(
+            iter_json_records(
+                file_path,
+                on_error=lambda line, e, errors=parse_errors: errors.append((line, str(e))),
+                binary=binary,
+            )
+        )
+        results[binary] = (records, parse_errors)
+
+    assert results[True] == results[False]
+    assert results[True][0] == [{"TITLE": "Café"}, {"key2": "value2"}]
+    assert [line for line, _ in results[True][1]] == ["{not json", ""]
+
+
+@pytest.mark.parametrize(
+    "file_path",
+    [
+        "test/sample_data/e2e_sample_data/file_with_errors.rar",
+        "test/sample_data/e2e_sample_data/file_with_errors",
+    ],
+)
+def test_iter_line_offsets_resumes_at_offset(file_path, setup_temp_dir):
+    """
+    Test that reading from the end offset of any line yields the lines after it.
+
+    Args:
+        file_path (str): The .rar archive, or the name of its member to extract.
+        setup_temp_dir (str): The path to the temporary directory.
+
+    Asserts:
+        The offsets add up the line lengths, and resuming skips exactly the lines before.
+    """
+    if not file_path.endswith(".rar"):
+        # The plain file is the member of the archive, extracted into the temporary directory
+        extract_rar_file(f"{file_path}.rar", setup_temp_dir)
+        file_path = os.path.join(setup_temp_dir, os.path.basename(file_path))
+    elif get_rar_stream_command() is None:
+        pytest.skip("No .rar streaming tool installed")
+
+    lines = list(iter_line_offsets(file_path))
+    assert lines[-1][0] == sum(len(line) for _, line in lines)
+
+    for position in (0, 1, len(lines) // 2, len(lines) - 1):
+        start_offset = lines[position - 1][0] if position else 0
+        assert list(iter_line_offsets(file_path, start_offset)) == lines[position:]
+
+
+def test_list_input_files(tmp_path):
+    """
+    Test that a file, a directory and a glob pattern are expanded into the files to process.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+
+    Asserts:
+        Directories list their visible files, patterns match recursively, and a pattern
+        matching nothing raises FileNotFoundError.
+    """
+    (tmp_path / "nested").mkdir()
+    for name in ("b.jsonl", "a.rar", ".hidden", "nested/c.jsonl"):
+        (tmp_path / name).write_text("{}\n")
+
+    assert list_input_files(str(tmp_path / "b.jsonl")) == [str(tmp_path / "b.jsonl")]
+    assert list_input_files(str(tmp_path)) == [str(tmp_path / "a.rar"), str(tmp_path / "b.jsonl")]
+    assert list_input_files(str(tmp_path / "**" / "*.jsonl")) == [
+        str(tmp_path / "b.jsonl"),
+        str(tmp_path / "nested" / "c.jsonl"),
+    ]
+    with pytest.raises(FileNotFoundError):
+        list_input_files(str(tmp_path / "*.csv"))
+
+    assert is_batch_input(str(tmp_path))
+    assert is_batch_input(str(tmp_path / "*.jsonl"))
+    assert not is_batch_input(str(tmp_path / "b.jsonl"))
+
+
+@pytest.mark.parametrize("use_msgspec", [True, False])
+def test_decode_projected_line(mocker, use_msgspec):
+    """
+    Test that projected decoding keeps the analytics fields and fingerprints the line, with
+    and without msgspec.
+
+    Args:
+        mocker (pytest_mock.plugin.MockerFixture): The mocker fixture.
+        use_msgspec (bool): Whether the msgspec projection is used.
+
+    Asserts:
+        The fields, the missing fields and the fingerprint equality behave like the full
+        record, and invalid lines raise the error of `json.loads`.
+    """
+    if use_msgspec and projection.PROJECTED_DECODER is None:
+        pytest.skip("msgspec is not installed")
+    if not use_msgspec:
+        mocker.patch("src.helpers.projection.PROJECTED_DECODER", None)
+
+    line = b'{"RP_DOCUMENT_ID": "DOC1", "RP_ENTITY_ID": null, "DOCUMENT_RECORD_INDEX": 2, "TITLE": "a"}\n'
+    record = decode_projected_line(line)
+
+    assert isinstance(record, ProjectedRecord)
+    assert record.get("RP_DOCUMENT_ID") == "DOC1"
+    assert record["DOCUMENT_RECORD_INDEX"] == 2
+    assert "RP_ENTITY_ID" in record and record.get("RP_ENTITY_ID") is None
+    assert "DOCUMENT_RECORD_COUNT" not in record
+    assert record.get("DOCUMENT_RECORD_COUNT", 0) == 0
+    assert "TITLE" not in record
+    assert record == decode_projected_line(line.decode("utf-8").strip())
+    assert record != decode_projected_line(line.replace(b'"a"', b'"b"'))
+
+    assert decode_projected_line(b"[1, 2]") == [1, 2]
+    with pytest.raises(json.JSONDecodeError) as error:
+        decode_projected_line(b' {"RP_DOCUMENT_ID": "DOC1",}\n')
+    assert error.value.doc == '{"RP_DOCUMENT_ID": "DOC1",}'
@@ -32,8 +32,21 @@ from test.sample_data.processor_sample_data.identify_missing_indices_sample_data
 from test.sample_data.processor_sample_data.get_field_sample_data import get_field_sample_data
 
 
+import importlib.util
+import json
 import pytest
-from src.document_processor import DataProcessor
+from src.helpers.columnar import batch_records
+from src.helpers.projection import decode_projected_line
+from src.utils.logging import format_process_data_logs
+from src.utils.validation import RecordValidator, validate_rp_entity_ids
+from src.document_processor import (
+    DataProcessor,
+    DocumentRecord,
+    EvictionPolicy,
+    IndexSet,
+    PartialAnalytics,
+    record_digest,
+)
 
 
 @pytest.fixture
@@ -298,3 +311,434 @@ def test_process_analytics(scenario):
     processor = DataProcessor(sample_data)
     actual_results = processor.process_analytics()
     assert actual_results == expected_results, f"Failed on scenario '{scenario}'"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_stream(scenario):
+    """
+    Tests that the process_stream method gives the same results as process_analytics
+    when the records are consumed once from a generator.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    processor = DataProcessor([])
+    actual_results = processor.process_stream(record for record in sample_data)
+    assert actual_results == expected_results, f"Failed on scenario '{scenario}'"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_partial_analytics_merge(scenario):
+    """
+    Tests that merging the PartialAnalytics of three consecutive shards, in either grouping,
+    gives the same results as a single run over all the records.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    first_split, second_split = len(sample_data) // 3, 2 * len(sample_data) // 3
+    shards = [
+        sample_data[:first_split],
+        sample_data[first_split:second_split],
+        sample_data[second_split:],
+    ]
+
+    first, second, third = (PartialAnalytics.from_records(shard) for shard in shards)
+    left_results = first.merge(second).merge(third).results()
+
+    first, second, third = (PartialAnalytics.from_records(shard) for shard in shards)
+    right_results = first.merge(second.merge(third)).results()
+
+    assert left_results == expected_results, f"Failed on scenario '{scenario}' (left)"
+    assert right_results == expected_results, f"Failed on scenario '{scenario}' (right)"
+
+
+def test_partial_analytics_merge_rechecks_indices_across_shards():
+    """
+    Tests that records accepted by a shard before its document count was known are range
+    checked against the count seen in an earlier shard, and that duplicates spanning shards
+    are detected.
+    """
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 5, "DOCUMENT_RECORD_COUNT": None},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+    ]
+    expected_results = DataProcessor(records).process_analytics()
+
+    partial = PartialAnalytics.from_records(records[:1])
+    partial.merge(PartialAnalytics.from_records(records[1:]))
+
+    assert partial.results() == expected_results
+    assert expected_results["indexing_errors"]["DOC1"] == {
+        "count_mismatch": [3],
+        "out_of_range": [5],
+    }
+    assert expected_results["identical_duplicates"] == {"DOC1": {1: 1}}
+    assert expected_results["different_duplicates"] == {"DOC1": {1: 1}}
+
+
+@pytest.mark.parametrize("shard_size", [1, 2, 3, 10])
+def test_partial_analytics_merge_keeps_the_order_of_a_single_pass(shard_size):
+    """
+    Tests that merged partials list documents, duplicate indices and errors in the order a
+    single pass logs them, under the raw index of their first duplicate, so that the text log
+    is the same.
+
+    Args:
+        shard_size (int): The number of records of each shard.
+    """
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 3, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 2.0, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 3, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC3", "DOCUMENT_RECORD_INDEX": "x", "DOCUMENT_RECORD_COUNT": 1},
+        {"RP_DOCUMENT_ID": "", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 5, "DOCUMENT_RECORD_COUNT": 4},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 0},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3, "X": 1},
+    ]
+    expected_results = DataProcessor(records).process_analytics()
+
+    partial = PartialAnalytics()
+    for start in range(0, len(records), shard_size):
+        partial.merge(PartialAnalytics.from_records(records[start : start + shard_size]))
+    results = partial.results()
+
+    assert list(expected_results["identical_duplicates"].items()) == [
+        ("DOC2", {2: 1}),
+        ("DOC1", {3: 1, 1: 1}),
+    ]
+    assert isinstance(next(iter(expected_results["identical_duplicates"]["DOC2"])), float)
+    assert list(expected_results["indexing_errors"]) == ["DOC3", "invalid_document_ids", "DOC1"]
+    assert format_process_data_logs(results) == format_process_data_logs(expected_results)
+    for key, value in expected_results.items():
+        if isinstance(value, dict):
+            assert list(results[key].items()) == list(value.items()), key
+            for document_id, document_value in value.items():
+                if isinstance(document_value, dict):
+                    assert list(results[key][document_id]) == list(document_value)
+    assert results == expected_results
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_analytics_with_digests(scenario):
+    """
+    Tests that comparing duplicates by digest gives the same results as comparing full records,
+    for both DataProcessor and PartialAnalytics.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    processor = DataProcessor(sample_data, store_digests=True)
+    partial = PartialAnalytics.from_records(sample_data, store_digests=True)
+    assert processor.process_analytics() == expected_results, f"Failed on scenario '{scenario}'"
+    assert partial.results() == expected_results, f"Failed on scenario '{scenario}' (partial)"
+    assert all(
+        isinstance(data, bytes)
+        for doc_data in processor.document_records.values()
+        for data in doc_data["data"].values()
+    ), f"Failed on scenario '{scenario}' (stored records)"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(identify_missing_indices_sample_data.keys()),
+)
+def test_identify_missing_indices_compact(scenario):
+    """
+    Tests the identify_missing_indices method on compact document records.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = identify_missing_indices_sample_data[scenario]["sample_data"]
+    expected_results = identify_missing_indices_sample_data[scenario]["expected_results"]
+    processor = DataProcessor([], compact=True)
+    for document_id, doc_data in sample_data.items():
+        document_record = DocumentRecord()
+        document_record["expected_count"] = doc_data["expected_count"]
+        for index in doc_data["indices"]:
+            document_record["indices"].add(index)
+        processor.document_records[document_id] = document_record
+    processor.identify_missing_indices()
+    assert (
+        processor.results.get("missing") == expected_results["missing"]
+    ), f"Failed on scenario '{scenario}' (missing)"
+    assert (
+        processor.results.get("extra_indices") == expected_results["extra_indices"]
+    ), f"Failed on scenario '{scenario}' (extra_indices)"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_analytics_compact(scenario):
+    """
+    Tests that compact document records give the same results as the dictionary layout.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    processor = DataProcessor(sample_data, compact=True)
+    assert processor.process_analytics() == expected_results, f"Failed on scenario '{scenario}'"
+    assert all(
+        isinstance(doc_data, DocumentRecord) for doc_data in processor.document_records.values()
+    ), f"Failed on scenario '{scenario}' (document records)"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_analytics_with_eviction_at_end(scenario):
+    """
+    Tests that finalizing every document through an eviction policy at the end of the stream
+    gives the same results as `process_analytics`.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    processor = DataProcessor(sample_data, eviction=EvictionPolicy(evict_completed=False))
+    assert processor.process_analytics() == expected_results, f"Failed on scenario '{scenario}'"
+    assert not processor.document_records, f"Failed on scenario '{scenario}' (document records)"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_analytics_with_projected_records(scenario):
+    """
+    Tests that projected records give the same results as full records, apart from the
+    records stored with invalid document IDs.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    records = [decode_projected_line(json.dumps(record)) for record in sample_data]
+
+    for store_digests in (False, True):
+        results = DataProcessor(records, store_digests=store_digests).process_analytics()
+        for error in results["indexing_errors"].get("invalid_document_ids", []):
+            error["record"] = sample_data[records.index(error["record"])]
+        assert results == expected_results, f"Failed on scenario '{scenario}'"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_batch(scenario):
+    """
+    Tests that processing columnar batches of various sizes gives the same results as
+    processing the records one at a time.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    pytest.importorskip("numpy")
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+
+    for batch_size in (1, 2, 3, len(sample_data) or 1):
+        processor = DataProcessor([])
+        for batch in batch_records(sample_data, batch_size):
+            processor.process_batch(batch)
+        actual_results = processor.finalize_analytics()
+        assert actual_results == expected_results, f"Failed on scenario '{scenario}'"
+
+
+@pytest.mark.parametrize(
+    "scenario",
+    list(process_analytics_sample_data.keys()),
+)
+def test_process_analytics_with_validator(scenario):
+    """
+    Tests that validating the records while processing them gives the results of
+    process_analytics and the errors of validate_rp_entity_ids, record by record and in batches.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    expected_errors = validate_rp_entity_ids(sample_data)
+
+    processor = DataProcessor(sample_data, validator=RecordValidator())
+    assert processor.process_analytics() == expected_results, f"Failed on scenario '{scenario}'"
+    assert processor.validation_errors == expected_errors, f"Failed on scenario '{scenario}'"
+
+    if importlib.util.find_spec("numpy"):
+        processor = DataProcessor([], validator=RecordValidator())
+        for batch in batch_records(sample_data, 2):
+            processor.process_batch(batch)
+        assert processor.finalize_analytics() == expected_results
+        assert processor.validation_errors == expected_errors
+
+
+def test_document_groups():
+    """
+    Tests that only the documents whose records are complete and consistent on their own are
+    stored in bulk.
+    """
+    pytest.importorskip("numpy")
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": " ", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC3", "DOCUMENT_RECORD_INDEX": 3, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC4", "DOCUMENT_RECORD_INDEX": True, "DOCUMENT_RECORD_COUNT": 1},
+    ]
+    (batch,) = batch_records(records)
+    assert batch.document_groups() == [
+        ("DOC1", [0, 3], 2, [2, 1]),
+        ("DOC2", [1, 4], None, None),
+        ("DOC3", [5], None, None),
+        ("DOC4", [6], None, None),
+    ]
+
+
+def test_eviction_of_completed_documents():
+    """
+    Tests that complete documents are finalized as soon as their last index is seen, and that
+    their later records are counted as late records.
+    """
+    evicted = []
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2},
+    ]
+    processor = DataProcessor(
+        records,
+        eviction=EvictionPolicy(
+            on_document_evicted=lambda document_id, results: evicted.append((document_id, results))
+        ),
+    )
+    for record in records[:4]:
+        processor.process_record(record)
+    assert list(processor.document_records) == ["DOC2"]
+    assert evicted == [("DOC1", {"identical_duplicates": {"DOC1": {1: 1}}})]
+
+    results = processor.process_stream(records[4:])
+    assert evicted[1] == ("DOC2", {"missing": {"DOC2": [2]}})
+    assert results["distinct_stories_count"] == 2
+    assert results["late_records"] == {"DOC1": 1}
+    assert not results["missing"] and not results["identical_duplicates"]
+
+
+def test_eviction_after_record_distance():
+    """
+    Tests that documents that weren't seen for a number of records are finalized.
+    """
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+        {"RP_DOCUMENT_ID": "DOC3", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+    ]
+    processor = DataProcessor(
+        records, eviction=EvictionPolicy(evict_completed=False, max_record_distance=2)
+    )
+    for record in records:
+        processor.process_record(record)
+    assert list(processor.document_records) == ["DOC2", "DOC3"]
+    assert processor.results["missing"] == {"DOC1": [2, 3]}
+
+    results = processor.finalize_analytics()
+    assert results["missing"] == {"DOC1": [2, 3], "DOC3": [2]}
+    assert results["distinct_stories_count"] == 3
+
+
+def test_index_set():
+    """
+    Tests that IndexSet behaves like a set of indices, including values outside the bitmap.
+    """
+    indices = IndexSet()
+    for index in [3, 1, 1, 10**9, -1, "2", 70]:
+        indices.add(index)
+    assert set(indices) == {1, 3, 70, 10**9, -1, "2"}
+    assert len(indices) == 6
+    assert 3 in indices and 10**9 in indices and "2" in indices
+    assert 2 not in indices and "3" not in indices
+    assert indices.missing(5) == [2, 4, 5]
+    assert indices.greater_than(5) == [70, 10**9]
+
+
+def test_record_digest():
+    """
+    Tests that record digests ignore key order but not values.
+    """
+    record = {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "TITLE": "Café"}
+    reordered = {"TITLE": "Café", "DOCUMENT_RECORD_INDEX": 1, "RP_DOCUMENT_ID": "DOC1"}
+    changed = {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "TITLE": "Cafe"}
+    assert len(record_digest(record)) == 16
+    assert record_digest(record) == record_digest(reordered)
+    assert record_digest(record) != record_digest(changed)
+    assert record_digest({"A": 1, "B": [2, {"C": True}]}) == record_digest(
+        {"B": [2.0, {"C": 1}], "A": 1.0}
+    )
+    assert record_digest({"A": 0}) == record_digest({"A": -0.0})
+    assert record_digest({"A": 1.5}) != record_digest({"A": 1})
+
+
+def test_process_analytics_with_digests_of_equal_values():
+    """
+    Tests that comparing duplicates by digest counts the same identical and different
+    duplicates as comparing full records, for values that are equal but serialize differently
+    (1 and 1.0, True and 1), and for NaN, which the JSON decoder parses into a single object.
+    """
+    lines = [
+        '{"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2}',
+        '{"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1.0, "DOCUMENT_RECORD_COUNT": 2.0}',
+        '{"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2, '
+        '"SCORE": 1}',
+        '{"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2, '
+        '"SCORE": true}',
+        '{"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1, '
+        '"SCORE": NaN}',
+        '{"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1, '
+        '"SCORE": NaN}',
+        '{"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1, '
+        '"SCORE": 0.5}',
+    ]
+    records = [json.loads(line) for line in lines]
+    expected_results = DataProcessor([json.loads(line) for line in lines]).process_analytics()
+
+    assert expected_results["identical_duplicates"]["DOC1"] == {1: 1, 2: 1}
+    assert expected_results["identical_duplicates"]["DOC2"] == {1: 1}
+    assert expected_results["different_duplicates"] == {"DOC2": {1: 1}}
+    assert DataProcessor(records, store_digests=True).process_analytics() == expected_results
+    assert PartialAnalytics.from_records(records, store_digests=True).results() == (
+        expected_results
+    )
@@ -0,0 +1,136 @@
+"""
+This module contains tests for the http_body helper functions.
+"""
+
+import io
+import pytest
+from src.helpers.http_body import is_archive_data, open_request_body
+
+LINES = [b'{"RP_DOCUMENT_ID": "DOC1"}\n', b"not json\n", b'{"RP_DOCUMENT_ID": "DOC2"}']
+
+
+def chunked(data, sizes):
+    """
+    Encodes data with `Transfer-Encoding: chunked`.
+
+    Args:
+        data (bytes): The data to encode.
+        sizes (list): The sizes of the first chunks, the rest of the data is the last one.
+
+    Returns:
+        bytes: The encoded data, ended by the last empty chunk.
+    """
+    chunks = []
+    for size in sizes:
+        chunks.append(data[:size])
+        data = data[size:]
+    chunks.append(data)
+    return b"".join(b"%x\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks if chunk) + (
+        b"0\r\n\r\n"
+    )
+
+
+def connection(data):
+    """
+    Builds the input stream of a connection, like the `rfile` of a request handler.
+
+    Args:
+        data (bytes): The bytes received on the connection.
+
+    Returns:
+        BufferedReader: The stream.
+    """
+    return io.BufferedReader(io.BytesIO(data))
+
+
+def test_open_request_body_with_content_length():
+    """
+    Tests that a body with a Content-Length yields its lines, and stops at its end.
+    """
+    stream = connection(b"".join(LINES) + b"GET /next HTTP/1.1\r\n")
+    body = open_request_body(stream, {"Content-Length": str(len(b"".join(LINES)))})
+    assert list(body) == LINES
+    assert stream.read() == b"GET /next HTTP/1.1\r\n"
+
+
+def test_open_request_body_chunked():
+    """
+    Tests that a chunked body is read across chunk boundaries, ignoring chunk extensions and
+    trailers.
+    """
+    data = b"".join(LINES)
+    chunks = [data[:5], data[5:30], data[30:]]
+    encoded = b"".join(b"%x;ext=1\r\n%s\r\n" % (len(chunk), chunk) for chunk in chunks)
+    stream = connection(encoded + b"0\r\nTrailer: value\r\n\r\nGET /next HTTP/1.1\r\n")
+
+    body = open_request_body(stream, {"Transfer-Encoding": "chunked"})
+    assert list(body) == LINES
+    assert stream.read() == b"GET /next HTTP/1.1\r\n"
+
+
+def test_open_request_body_errors():
+    """
+    Tests that a body without a length is refused, and that a truncated body raises
+    ConnectionError.
+    """
+    with pytest.raises(ValueError):
+        open_request_body(connection(b""), {})
+    with pytest.raises(ValueError):
+        open_request_body(connection(b""), {"Content-Length": "-1"})
+
+    body = open_request_body(connection(LINES[0]), {"Content-Length": "100"})
+    with pytest.raises(ConnectionError):
+        body.read()
+
+    body = open_request_body(connection(b"5\r\nab"), {"Transfer-Encoding": "chunked"})
+    with pytest.raises(ConnectionError):
+        body.read()
+
+
+def test_is_archive_data():
+    """
+    Tests that archives are recognized from their first bytes, without consuming them.
+    """
+    with open("test/sample_data/e2e_sample_data/file_with_errors.rar", "rb") as file:
+        archive = file.read()
+    lines = b"".join(LINES)
+
+    for data, expected in [
+        (archive, True),
+        (b"Rar!\x1a\x07\x01\x00", True),
+        (lines, False),
+        (b"", False),
+    ]:
+        body = open_request_body(connection(data), {"Content-Length": str(len(data))})
+        assert is_archive_data(body) == expected
+        assert body.read() == data
+
+
+def test_is_archive_data_across_chunks():
+    """
+    Tests that an archive is recognized when its signature is split across small chunks, and
+    that a short body isn't.
+    """
+    archive = b"Rar!\x1a\x07\x01\x00" + b"".join(LINES)
+    for data, sizes, expected in [
+        (archive, [2, 1, 3], True),
+        (b"PK\x03\x04rest", [1, 1, 1, 1], True),
+        (b"".join(LINES), [2, 2], False),
+        (b"PK", [1], False),
+    ]:
+        body = open_request_body(connection(chunked(data, sizes)), {"Transfer-Encoding": "chunked"})
+        assert is_archive_data(body) == expected
+        assert body.read() == data
+
+
+def test_request_body_readinto_empty_buffer():
+    """
+    Tests that reading into an empty buffer reads nothing, rather than failing.
+    """
+    body = open_request_body(connection(LINES[0]), {"Content-Length": str(len(LINES[0]))})
+    assert body.raw.readinto(bytearray()) == 0
+    assert body.read() == LINES[0]
+
+    body = open_request_body(connection(chunked(LINES[0], [3])), {"Transfer-Encoding": "chunked"})
+    assert body.raw.readinto(memoryview(bytearray())) == 0
+    assert body.read() == LINES[0]
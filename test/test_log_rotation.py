@@ -0,0 +1,85 @@
+"""
+This module contains tests for the log_rotation helper class and functions.
+"""
+
+import gzip
+import os
+import time
+import pytest
+from src.utils.log_rotation import LogRotation, list_log_segments
+
+
+def write_log_file(log_file_path, text, mtime):
+    """
+    Writes a log file, last modified at a given time.
+
+    Args:
+        log_file_path (Path): The path to the log file.
+        text (str): The content of the log file.
+        mtime (float): The modification time, as a timestamp.
+    """
+    log_file_path.write_text(text)
+    os.utime(log_file_path, (mtime, mtime))
+
+
+def test_log_rotation_should_rotate(tmp_path):
+    """
+    Tests that a log file is due for rotation once it reached max_bytes, or when it was last
+    written in another period, and never when it's missing or empty.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_file_path = tmp_path / "feed_logs.txt"
+    now = time.mktime((2024, 1, 31, 12, 0, 0, 0, 0, -1))
+    by_size = LogRotation(max_bytes=10)
+    daily = LogRotation(period="daily")
+
+    assert not by_size.should_rotate(str(log_file_path), now)
+    write_log_file(log_file_path, "", now - 3 * 86400)
+    assert not daily.should_rotate(str(log_file_path), now)
+
+    write_log_file(log_file_path, "123456789", now - 3600)
+    assert not by_size.should_rotate(str(log_file_path), now)
+    assert not daily.should_rotate(str(log_file_path), now)
+    assert LogRotation(period="hourly").should_rotate(str(log_file_path), now)
+
+    write_log_file(log_file_path, "1234567890", now - 13 * 3600)
+    assert by_size.should_rotate(str(log_file_path), now)
+    assert daily.should_rotate(str(log_file_path), now)
+    assert not LogRotation(period="weekly").should_rotate(str(log_file_path), now)
+
+    with pytest.raises(ValueError):
+        LogRotation(period="monthly")
+    with pytest.raises(ValueError):
+        LogRotation(max_bytes=0)
+
+
+def test_log_rotation_rotate_and_prune(tmp_path):
+    """
+    Tests that rotated segments are named after the last write of their log file, numbered
+    within the same second, compressed, and pruned to the newest backup_count.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_file_path = tmp_path / "feed_logs.txt"
+    rotation = LogRotation(max_bytes=1, backup_count=2, compress=True)
+    start = time.mktime((2024, 1, 31, 23, 59, 59, 0, 0, -1))
+
+    segments = []
+    for number, mtime in enumerate([start, start, start + 1]):
+        write_log_file(log_file_path, f"log {number}\n", mtime)
+        segments.append(rotation.rotate_if_needed(str(log_file_path)))
+
+    assert [os.path.basename(segment) for segment in segments] == [
+        "feed_logs.txt.20240131-235959.gz",
+        "feed_logs.txt.20240131-235959-1.gz",
+        "feed_logs.txt.20240201-000000.gz",
+    ]
+    assert not log_file_path.exists()
+    assert list_log_segments(str(log_file_path)) == segments[1:]
+    with gzip.open(segments[2], "rt") as segment:
+        assert segment.read() == "log 2\n"
+    assert os.stat(segments[2]).st_mtime == start + 1
+    assert rotation.rotate_if_needed(str(log_file_path)) is None
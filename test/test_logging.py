@@ -11,7 +11,21 @@ from test.sample_data.logging_sample_data.format_process_data_logs_sample_data i
 import os
 import logging
 import pytest
-from src.utils.logging import format_rp_entity_id_logs, format_process_data_logs, setup_logging
+from src.utils import logging as logging_utils
+from src.utils.log_rotation import LogRotation
+from src.utils.logging import (
+    LoggingContext,
+    LogReport,
+    ReportFileHandler,
+    format_batch_summary,
+    format_process_data_logs,
+    format_rp_entity_id_logs,
+    QueuedLogHandler,
+    get_watch_logger,
+    log,
+    setup_logging,
+    write_log,
+)
 
 
 @pytest.mark.parametrize("scenario", list(format_rp_entity_id_logs_sample_data.keys()))
@@ -42,6 +56,30 @@ def test_format_process_data_logs(scenario):
     assert result == expected_result, f"Failed on scenario '{scenario}'"
 
 
+def test_format_batch_summary():
+    """
+    Tests that the batch summary counts the failed files and has one line per file.
+    """
+    summaries = [
+        {
+            "file": "morning.jsonl",
+            "error": None,
+            "distinct_stories": 273,
+            "missing_documents": 3,
+            "duplicate_documents": 1,
+            "validation_errors": 5,
+            "seconds": 1.26,
+        },
+        {"file": "broken.rar", "error": "ValueError: bad archive"},
+    ]
+    assert format_batch_summary(summaries) == (
+        "Files processed: 1, failed: 1\n"
+        "    - morning.jsonl: 273 distinct stories, 3 with missing indices, 1 with duplicates, "
+        "5 RP_ENTITY_ID errors (1.3s)\n"
+        "    - broken.rar: failed: ValueError: bad archive"
+    )
+
+
 def test_setup_logging_creates_log_directory_and_file(mocker):
     """
     Test that the setup_logging function creates the log directory and log file.
@@ -176,3 +214,279 @@ def test_setup_logging_adds_separator_to_existing_log_file(mocker):
     logger = logging.getLogger()
     for handler in logger.handlers[:]:
         logger.removeHandler(handler)
+
+
+def test_get_watch_logger_adds_handlers_once(tmp_path):
+    """
+    Test that the watch logger only gets its handlers once, and doesn't log to the root logger.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_directory = str(tmp_path / "logs")
+    logger = get_watch_logger(log_directory)
+    try:
+        assert get_watch_logger(log_directory) is logger
+        assert len(logger.handlers) == 2
+        assert not logger.propagate
+
+        logger.info("file.jsonl: failed: ValueError")
+        with open(os.path.join(log_directory, "watch_logs.txt")) as log_file:
+            assert log_file.read().endswith(" - file.jsonl: failed: ValueError\n")
+    finally:
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def test_log_queued_writes_the_same_log(tmp_path, capsys):
+    """
+    Test that a queued log writes the same log file as a synchronous one, and only its summary
+    to the console.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        capsys (pytest.CaptureFixture): Captures the console output.
+    """
+    results = format_process_data_logs_sample_data["combined_errors"]["results"]
+    errors = [("ABC", "DOC1", 3), (None, "DOC2", 1)]
+
+    log_contents = {}
+    for queued in (False, True):
+        log_directory = tmp_path / str(queued)
+        with LoggingContext() as context:
+            log(results, errors, "feed.jsonl", str(log_directory), queued=queued)
+            if queued:
+                assert [type(handler) for handler in context.active_handlers] == [
+                    QueuedLogHandler
+                ]
+
+        with open(log_directory / "feed.jsonl_logs.txt") as log_file:
+            # Without the timestamp of the record
+            log_contents[queued] = log_file.read().split(" - ", 1)[1]
+        console = capsys.readouterr().err
+
+    assert log_contents[True] == log_contents[False]
+    assert console.split(" - ", 1)[1] == (
+        "feed.jsonl: 5 distinct stories, 0 with missing indices, 0 with duplicates, "
+        "2 RP_ENTITY_ID errors\n"
+    )
+
+
+def test_setup_logging_switches_log_files(tmp_path):
+    """
+    Test that setting up another log file switches the root logger to it instead of adding
+    handlers, that the handler of a file is reused, and that they're closed with the context.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_directory = str(tmp_path)
+    root_logger = logging.getLogger()
+    handlers = list(root_logger.handlers)
+
+    with LoggingContext() as context:
+        setup_logging(log_directory, "a.txt")
+        logging.info("first")
+        file_handler = context.handlers[os.path.join(log_directory, "a.txt")]
+        for message, log_filename in [("second", "b.txt"), ("third", "a.txt")]:
+            setup_logging(log_directory, log_filename)
+            logging.info(message)
+            assert len(root_logger.handlers) == len(handlers) + 2
+
+        assert context.handlers[os.path.join(log_directory, "a.txt")] is file_handler
+        assert len(context.handlers) == 2
+
+    assert root_logger.handlers == handlers
+    assert file_handler.stream is None
+
+    with open(tmp_path / "a.txt") as log_file:
+        a_log = log_file.read()
+    with open(tmp_path / "b.txt") as log_file:
+        b_log = log_file.read()
+    assert "first" in a_log and "third" in a_log and "second" not in a_log
+    assert "\n\n-----\n\n" in a_log
+    assert b_log.endswith(" - second\n") and b_log.count("\n") == 1
+
+
+def test_logging_context_limits_open_files(tmp_path):
+    """
+    Test that a context closes the least recently used handlers beyond its limit, and that a
+    nested context gives the root logger back to the enclosing one.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_directory = str(tmp_path)
+    root_logger = logging.getLogger()
+
+    with LoggingContext(max_open_files=2) as outer:
+        setup_logging(log_directory, "a.txt")
+        outer_handlers = list(outer.active_handlers)
+        first_handler = outer.handlers[os.path.join(log_directory, "a.txt")]
+
+        with LoggingContext() as inner:
+            setup_logging(log_directory, "inner.txt")
+            assert not any(handler in root_logger.handlers for handler in outer_handlers)
+            assert all(handler in root_logger.handlers for handler in inner.active_handlers)
+        assert all(handler in root_logger.handlers for handler in outer_handlers)
+
+        setup_logging(log_directory, "b.txt")
+        setup_logging(log_directory, "c.txt")
+        assert list(outer.handlers) == [
+            os.path.join(log_directory, "b.txt"),
+            os.path.join(log_directory, "c.txt"),
+        ]
+        assert first_handler.stream is None
+
+
+@pytest.mark.parametrize("scenario", list(format_process_data_logs_sample_data.keys()))
+def test_write_log_streams_the_log(scenario, monkeypatch):
+    """
+    Tests that write_log writes the same text as the formatters, in several writes when it's
+    longer than LOG_WRITE_SIZE.
+
+    Args:
+        scenario (str): The process data scenario.
+        monkeypatch (pytest.MonkeyPatch): Shrinks LOG_WRITE_SIZE.
+    """
+    results = format_process_data_logs_sample_data[scenario]["results"]
+    rp_entity_id_data = format_rp_entity_id_logs_sample_data["missing_and_invalid_ids"]
+    errors = rp_entity_id_data["errors"]
+    expected = (
+        f"feed.jsonl\n\n{format_process_data_logs_sample_data[scenario]['expected_result']}"
+        f"\n\n{rp_entity_id_data['expected_result']}"
+    )
+    monkeypatch.setattr(logging_utils, "LOG_WRITE_SIZE", 64)
+
+    writes = []
+
+    class Sink:
+        def write(self, text):
+            writes.append(text)
+
+    write_log(Sink(), results, errors, "feed.jsonl")
+    assert "".join(writes) == expected
+    assert len(writes) > 1
+    assert all(len(text) < 64 + 100 for text in writes)
+
+
+def test_report_file_handler_writes_the_formatted_log(tmp_path):
+    """
+    Tests that a ReportFileHandler writes a LogReport record like a FileHandler writes its
+    text, and other records as they are.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    results = format_process_data_logs_sample_data["combined_errors"]["results"]
+    errors = [("ABC", "DOC1", 3), (None, "DOC2", 1)]
+    report = LogReport(results, errors, "feed.jsonl")
+
+    log_contents = []
+    for handler_class, message in [
+        (ReportFileHandler, report),
+        (logging.FileHandler, str(report)),
+    ]:
+        log_path = tmp_path / f"{handler_class.__name__}.txt"
+        handler = handler_class(str(log_path))
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s <end>"))
+        for record_message in (message, "done"):
+            handler.handle(logging.makeLogRecord({"msg": record_message, "levelname": "INFO"}))
+        handler.close()
+        log_contents.append(log_path.read_text())
+
+    assert log_contents[0] == log_contents[1]
+    assert log_contents[0].startswith("[INFO] feed.jsonl\n\nNumber of distinct stories")
+    assert log_contents[0].endswith(" <end>\n[INFO] done <end>\n")
+
+
+def test_setup_logging_rotates_log_files(tmp_path):
+    """
+    Test that setting up a log file rotates it before the separator, and that a handler
+    rotates its file between records, reopening it.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_directory = str(tmp_path)
+    log_file_path = os.path.join(log_directory, "a.txt")
+    rotation = LogRotation(max_bytes=10)
+
+    with LoggingContext() as context:
+        setup_logging(log_directory, "a.txt", rotation)
+        logging.info("first run")
+        file_handler = context.handlers[log_file_path]
+
+        # Set up again in the same run, with the handler of the file still open
+        setup_logging(log_directory, "a.txt", rotation)
+        logging.info("second run")
+        logging.info("next record")
+
+    segments = sorted(name for name in os.listdir(log_directory) if name != "a.txt")
+    assert len(segments) == 2
+    with open(os.path.join(log_directory, segments[0])) as segment:
+        assert segment.read().endswith(" - first run\n")
+    with open(os.path.join(log_directory, segments[1])) as segment:
+        assert segment.read().endswith(" - second run\n")
+    with open(log_file_path) as log_file:
+        assert log_file.read().endswith(" - next record\n")
+    assert file_handler.stream is None
+
+
+def test_write_log_skips_invalid_document_ids(tmp_path):
+    """
+    Tests that the list of invalid document IDs in the indexing errors isn't mistaken for a
+    document, when the log is formatted and when it's streamed to a log file.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    results = {
+        "distinct_stories_count": 1,
+        "missing": {"DOC1": [2]},
+        "identical_duplicates": {},
+        "different_duplicates": {},
+        "indexing_errors": {
+            "invalid_document_ids": [{"RP_DOCUMENT_ID": None, "RP_ENTITY_ID": "ABC"}],
+            "DOC1": {"out_of_range": [5]},
+        },
+    }
+    expected = (
+        "feed.jsonl\n\nNumber of distinct stories: 1\n"
+        "\nDocument ID DOC1:\n"
+        "    - Missing indices: [2]\n"
+        "    - Out of Range Errors:\n        Out of range index: 5\n\n"
+        "--- RP Entity ID Validation Logs ---\n"
+        "\nDocument ID None:\n"
+        "    - Missing RP_ENTITY_ID at index 1"
+    )
+    errors = [(None, None, 1)]
+
+    with LoggingContext():
+        log(results, errors, "feed.jsonl", str(tmp_path))
+    with open(tmp_path / "feed.jsonl_logs.txt") as log_file:
+        assert log_file.read().split(" - ", 1)[1] == f"{expected}\n"
+
+
+def test_report_stream_handler_raises_formatting_errors(tmp_path):
+    """
+    Tests that an error while streaming a log is raised, and that the part already written is
+    marked as incomplete.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_path = tmp_path / "log.txt"
+    handler = ReportFileHandler(str(log_path))
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    report = LogReport({"distinct_stories_count": 1, "missing": None}, [], "feed.jsonl")
+    try:
+        with pytest.raises(TypeError):
+            handler.handle(logging.makeLogRecord({"msg": report}))
+    finally:
+        handler.close()
+
+    log_contents = log_path.read_text()
+    assert log_contents.startswith("feed.jsonl\n\nNumber of distinct stories: 1\n")
+    assert "[Incomplete log: TypeError: " in log_contents
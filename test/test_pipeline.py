@@ -0,0 +1,421 @@
+"""
+This module contains tests for the pipeline functions.
+
+The pipeline is imported the way `main` runs it (see conftest.py), so the records and
+processors it's compared with come from the same modules.
+"""
+
+import json
+import zipfile
+import zlib
+from test.sample_data.processor_sample_data.process_analytics_sample_data import (
+    process_analytics_sample_data,
+)
+import pytest
+import pipeline
+from document_processor import DataProcessor, EvictionPolicy
+from utils.logging import format_process_data_logs
+from utils.validation import DEFAULT_VALIDATOR
+
+RECORDS = [
+    {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+    {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+    {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 3, "DOCUMENT_RECORD_COUNT": 3},
+    {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 3},
+    {"RP_DOCUMENT_ID": "DOC3", "DOCUMENT_RECORD_INDEX": 5, "DOCUMENT_RECORD_COUNT": 2},
+    {"RP_DOCUMENT_ID": None, "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+    {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1, "X": 1},
+]
+
+
+def to_json_lines(records):
+    """
+    Serializes records as JSON lines.
+
+    Args:
+        records (list): The records.
+
+    Returns:
+        str: One JSON line per record.
+    """
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def write_archive(archive_path, members):
+    """
+    Writes a .rar test archive. It's a ZIP archive, read by the same tools.
+
+    Args:
+        archive_path (Path): The path to the archive.
+        members (dict): The records of every member, by member name.
+    """
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for member, records in members.items():
+            archive.writestr(member, to_json_lines(records))
+
+
+def single_pass(records):
+    """
+    Analyzes records in a single pass, as the reference of the other runs.
+
+    Args:
+        records (list): The records.
+
+    Returns:
+        tuple: The results and validation errors, see `pipeline.analyze_records`.
+    """
+    return pipeline.analyze_records(record for record in records)
+
+
+@pytest.mark.parametrize("scenario", list(process_analytics_sample_data.keys()))
+def test_merge_partial_results_equals_single_pass(scenario):
+    """
+    Tests that merging the partial results of consecutive shards gives the results and the
+    validation errors of a single pass over all the records.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    records = process_analytics_sample_data[scenario]["sample_data"]
+    split = len(records) // 2
+    shards = [records[:split], records[split:]]
+
+    merged = pipeline.merge_partial_results(
+        pipeline.analyze_records_partial(shard) for shard in shards
+    )
+
+    assert merged == single_pass(records), f"Failed on scenario '{scenario}'"
+    assert merged[0] == DataProcessor(records).process_analytics()
+    assert merged[1] == [
+        error for record in records for error in DEFAULT_VALIDATOR.record_errors(record)
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_analyze_rar_archive_streams_every_member(tmp_path, max_workers):
+    """
+    Tests that every member of a .rar archive is analyzed, in this process or in worker
+    processes, and that the merged results are those of the members read one after the
+    other.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        max_workers (int): The maximum number of worker processes.
+    """
+    archive_path = tmp_path / "feed.rar"
+    write_archive(archive_path, {"first.jsonl": RECORDS[:3], "second.jsonl": RECORDS[3:]})
+
+    results = pipeline.analyze_rar_archive(str(archive_path), max_workers)
+
+    assert results == single_pass(RECORDS)
+    assert results[0]["identical_duplicates"] == {"DOC1": {1: 1}}
+    assert results[0]["different_duplicates"] == {"DOC2": {1: 1}}
+    assert pipeline.analyze_file(str(archive_path), max_workers) == results
+
+
+@pytest.mark.parametrize("streamed", [True, False])
+def test_analyze_rar_archive_analyzes_a_single_member_like_a_plain_file(
+    tmp_path, monkeypatch, streamed
+):
+    """
+    Tests that the only member of an archive is analyzed by a DataProcessor, so that its log
+    is the one of the same records in a plain file.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Makes partial analytics fail, and hides the
+            streaming tools.
+        streamed (bool): Whether the member is streamed through a pipe or extracted.
+    """
+    records = RECORDS[:3] + [RECORDS[2]] + RECORDS[3:] + [RECORDS[0]]
+    archive_path = tmp_path / "feed.rar"
+    write_archive(archive_path, {"feed.jsonl": records})
+    monkeypatch.setattr(pipeline, "analyze_records_partial", None)
+    if not streamed:
+        monkeypatch.setattr(pipeline, "get_rar_stream_command", lambda: None)
+
+    results, errors = pipeline.analyze_rar_archive(str(archive_path))
+    expected_results, expected_errors = single_pass(records)
+
+    assert format_process_data_logs(results) == format_process_data_logs(expected_results)
+    assert list(results["identical_duplicates"].items()) == [("DOC1", {3: 1, 1: 2})]
+    assert (results, errors) == (expected_results, expected_errors)
+
+
+def test_analyze_rar_archive_extracts_without_streaming_tool(tmp_path, monkeypatch):
+    """
+    Tests that the members are extracted to a temporary directory when no streaming tool is
+    installed, and that the directory is removed afterwards.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Hides the streaming tools and the temp directory.
+    """
+    archive_path = tmp_path / "feed.rar"
+    temp_dir = tmp_path / "extracted"
+    temp_dir.mkdir()
+    write_archive(archive_path, {"first.jsonl": RECORDS[:3], "second.jsonl": RECORDS[3:]})
+    monkeypatch.setattr(pipeline, "get_rar_stream_command", lambda: None)
+    monkeypatch.setattr(pipeline, "create_temp_directory", lambda: str(temp_dir))
+
+    assert pipeline.analyze_rar_archive(str(archive_path), max_workers=2) == single_pass(RECORDS)
+    assert not temp_dir.exists()
+
+
+def test_analyze_rar_archive_without_members(tmp_path):
+    """
+    Tests that an archive without any file is reported.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    archive_path = tmp_path / "empty.rar"
+    write_archive(archive_path, {})
+
+    with pytest.raises(FileNotFoundError):
+        pipeline.analyze_rar_archive(str(archive_path))
+
+
+def test_analyze_file_json_lines(tmp_path):
+    """
+    Tests that a JSON lines file gives the same results read as records, as projected records
+    or in columnar batches, and that unparsable lines are skipped. Projected records keep
+    their ProjectedRecord in the invalid document IDs, so that file has none.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    records = [record for record in RECORDS if record["RP_DOCUMENT_ID"]]
+    file_path = tmp_path / "feed.jsonl"
+    file_path.write_text(to_json_lines(records[:4]) + "{not json\n" + to_json_lines(records[4:]))
+    expected_results = single_pass(records)
+
+    assert pipeline.analyze_file(str(file_path)) == expected_results
+    assert pipeline.analyze_file(str(file_path), projected=True) == expected_results
+    assert pipeline.analyze_file(str(file_path), columnar=True)[0] == expected_results[0]
+
+
+def test_analyze_file_columnar_refuses_eviction(tmp_path):
+    """
+    Tests that columnar batches aren't silently processed without the eviction policy given.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    file_path = tmp_path / "feed.jsonl"
+    file_path.write_text(to_json_lines(RECORDS))
+
+    with pytest.raises(ValueError):
+        pipeline.analyze_file(
+            str(file_path), eviction=EvictionPolicy(evict_completed=True), columnar=True
+        )
+
+
+def sharded_feed(size=40):
+    """
+    Builds a feed whose documents are interleaved across shards, with duplicates logged in
+    another order than their indices first appear, unparsable lines, invalid and escaped
+    document IDs, and RP_ENTITY_ID errors.
+
+    Args:
+        size (int): The number of records.
+
+    Returns:
+        tuple: The JSON lines of the feed, and its parsed records.
+    """
+    documents = max(13, size // 30)
+    records = []
+    for number in range(size):
+        document_id = f"DOC{number % documents}"
+        position = number // documents
+        index = (position * position + number) % 5 + 1 if number % 7 else 9
+        records.append(
+            {
+                "RP_DOCUMENT_ID": document_id,
+                "RP_ENTITY_ID": "ABC123" if number % 5 else "BAD",
+                "DOCUMENT_RECORD_INDEX": index,
+                "DOCUMENT_RECORD_COUNT": 5,
+                "VERSION": number % 11 == 3,
+            }
+        )
+    records[20] = dict(records[3])
+    records[30] = dict(records[4], EXTRA=True)
+    records[25] = {"RP_DOCUMENT_ID": None, "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1}
+    records[35] = {"RP_DOCUMENT_ID": 'D"Q', "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1}
+    lines = to_json_lines(records[:10]) + "{not json\n" + to_json_lines(records[10:])
+    return lines, records
+
+
+def list_items(results):
+    """
+    Lists the entries of the results, in order, down to the indices of every document.
+
+    Args:
+        results (dict): The `process_analytics` results.
+
+    Returns:
+        list: `(key, document_id, value)` tuples, where value lists the items of the document
+        entry when it's a dictionary.
+    """
+    return [
+        (key, document_id, list(value.items()) if isinstance(value, dict) else value)
+        for key, documents in results.items()
+        if isinstance(documents, dict)
+        for document_id, value in documents.items()
+    ]
+
+
+@pytest.mark.parametrize("workers,size", [(1, 40), (3, 40), (4, 3000)])
+def test_analyze_file_sharded_equals_single_pass(tmp_path, monkeypatch, workers, size):
+    """
+    Tests that the results merged from the shard workers are those of a single process, in the
+    same order so that the text logs are identical, and validation errors in file order.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Shrinks SHARD_BATCH_SIZE to send several batches.
+        workers (int): The number of shard workers.
+        size (int): The number of records of the feed.
+    """
+    lines, records = sharded_feed(size)
+    file_path = tmp_path / "feed.jsonl"
+    file_path.write_text(lines)
+    monkeypatch.setattr(pipeline, "SHARD_BATCH_SIZE", 4)
+    expected_results, expected_errors = single_pass(records)
+
+    results, errors = pipeline.analyze_file_sharded(str(file_path), workers)
+
+    assert results == expected_results
+    assert format_process_data_logs(results) == format_process_data_logs(expected_results)
+    assert list_items(results) == list_items(expected_results)
+    assert errors == expected_errors
+    assert results["identical_duplicates"] and results["different_duplicates"]
+
+
+def test_get_document_shard():
+    """
+    Tests that a line goes to the shard of its document ID, parsed when it's escaped, and to
+    shard 0 when the document ID is invalid or the line isn't valid JSON.
+    """
+    line = json.dumps({"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1})
+    escaped_line = json.dumps({"RP_DOCUMENT_ID": 'D"Q'})
+    shards = 7
+
+    assert pipeline.get_document_shard(line, shards) == zlib.crc32(b"DOC1") % shards
+    assert pipeline.get_document_shard(escaped_line, shards) == zlib.crc32(b'D"Q') % shards
+    assert pipeline.get_document_shard('{"RP_DOCUMENT_ID": null}', shards) == 0
+    assert pipeline.get_document_shard("{not json", shards) == 0
+
+
+def test_analyze_file_checkpointed_resumes_from_checkpoint(tmp_path, monkeypatch, capsys):
+    """
+    Tests that a run interrupted after a checkpoint resumes from its offset, with the results
+    of an uninterrupted run, and that the checkpoint is deleted once the file was processed.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Interrupts the first run after its first checkpoint.
+        capsys (pytest.CaptureFixture): Captures the offset the run resumes from.
+    """
+    file_path = tmp_path / "feed.jsonl"
+    file_path.write_text(to_json_lines(RECORDS))
+    checkpoint_path = tmp_path / "feed.checkpoint"
+    save_checkpoint = pipeline.save_checkpoint
+
+    def save_checkpoint_and_interrupt(*args):
+        save_checkpoint(*args)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(pipeline, "save_checkpoint", save_checkpoint_and_interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.analyze_file_checkpointed(str(file_path), str(checkpoint_path), 3)
+    assert checkpoint_path.exists()
+
+    monkeypatch.setattr(pipeline, "save_checkpoint", save_checkpoint)
+    capsys.readouterr()
+    results = pipeline.analyze_file_checkpointed(str(file_path), str(checkpoint_path), 3)
+
+    offset = len(to_json_lines(RECORDS[:3]).encode("utf-8"))
+    assert f"Resuming {file_path} from byte {offset}" in capsys.readouterr().out
+    assert results == single_pass(RECORDS)
+    assert not checkpoint_path.exists()
+
+
+def test_analyze_file_checkpointed_refuses_checkpoint_of_another_file(tmp_path):
+    """
+    Tests that a checkpoint taken on another file isn't resumed from.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    checkpoint_path = tmp_path / "feed.checkpoint"
+    other_path = tmp_path / "other.jsonl"
+    other_path.write_text(to_json_lines(RECORDS))
+    processor = DataProcessor([], compact=True)
+    pipeline.save_checkpoint(processor, str(checkpoint_path), str(other_path), 0)
+    file_path = tmp_path / "feed.jsonl"
+    file_path.write_text(to_json_lines(RECORDS))
+
+    with pytest.raises(ValueError):
+        pipeline.analyze_file_checkpointed(str(file_path), str(checkpoint_path))
+
+
+def test_analyze_files_reports_a_bad_file_without_stopping_the_batch(tmp_path):
+    """
+    Tests that files which can't be analyzed are reported in their summaries, while the other
+    files of the batch are analyzed and logged.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    log_directory = tmp_path / "logs"
+    first_path = tmp_path / "first.jsonl"
+    first_path.write_text(to_json_lines(RECORDS))
+    broken_path = tmp_path / "broken.rar"
+    broken_path.write_bytes(b"\x00not an archive\xff")
+    last_path = tmp_path / "last.jsonl"
+    last_path.write_text(to_json_lines(RECORDS[:2]))
+    missing_path = tmp_path / "missing.jsonl"
+    file_paths = [str(first_path), str(broken_path), str(missing_path), str(last_path)]
+
+    summaries = pipeline.analyze_files(file_paths, str(log_directory), max_jobs=2)
+
+    assert [summary["file"] for summary in summaries] == [
+        "first.jsonl",
+        "broken.rar",
+        "missing.jsonl",
+        "last.jsonl",
+    ]
+    assert summaries[1]["error"].startswith("FileNotFoundError: ")
+    assert summaries[2]["error"].startswith("FileNotFoundError: ")
+    assert summaries[0]["error"] is None and summaries[3]["error"] is None
+    assert summaries[0]["distinct_stories"] == single_pass(RECORDS)[0]["distinct_stories_count"]
+    assert summaries[3]["distinct_stories"] == 2
+    assert sorted(path.name for path in log_directory.iterdir()) == [
+        "first.jsonl_logs.txt",
+        "last.jsonl_logs.txt",
+    ]
+
+
+def test_watch_files_processes_a_settled_file_once(tmp_path):
+    """
+    Tests that a file of the watched directory is processed once it settled, and only once,
+    and that the run stops after max_idle_polls polls without anything to do.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    input_directory = tmp_path / "incoming"
+    input_directory.mkdir()
+    log_directory = tmp_path / "logs"
+    (input_directory / "feed.jsonl").write_text(to_json_lines(RECORDS))
+
+    metrics = pipeline.watch_files(
+        str(input_directory), str(log_directory), max_jobs=1, poll_interval=0.05, max_idle_polls=5
+    )
+
+    assert (metrics.files_processed, metrics.files_failed, metrics.files_in_flight) == (1, 0, 0)
+    assert metrics.last_file["file"] == "feed.jsonl"
+    assert (log_directory / "feed.jsonl_logs.txt").exists()
+    with open(log_directory / "watch_metrics.json", encoding="utf-8") as metrics_file:
+        assert json.load(metrics_file)["files_processed"] == 1
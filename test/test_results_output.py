@@ -0,0 +1,206 @@
+"""
+This module contains tests for the results_output functions.
+"""
+
+import json
+import os
+import pytest
+from src.utils import results_output
+from src.utils.results_output import (
+    check_results_format,
+    iter_document_records,
+    list_document_ids,
+    write_results,
+)
+
+RESULTS = {
+    "distinct_stories_count": 3,
+    "missing": {"DOC2": {4, 1}},
+    "identical_duplicates": {"DOC1": {}, "DOC3": {"5": 2}},
+    "different_duplicates": {"DOC1": {2: 1}},
+    "indexing_errors": {
+        "DOC1": {"invalid_type": ["Expected: int, Found: str for index: x"], "out_of_range": [9, 0]}
+    },
+    "late_records": {"DOC2": 3},
+    "status_changes": {"DOC4": (None, "incomplete")},
+}
+ERRORS = [(None, "DOC5", 1), ("BAD", "DOC1", 2), ("WORSE", "DOC5", 3)]
+
+
+def test_list_document_ids():
+    """
+    Tests that documents come in the order they first appear in the results, and that empty
+    duplicates don't count.
+    """
+    assert list_document_ids(RESULTS) == ["DOC2", "DOC3", "DOC1", "DOC4"]
+    assert list_document_ids({"distinct_stories_count": 0}) == []
+
+
+def test_iter_document_records():
+    """
+    Tests the records of the documents with issues, including the documents that only have
+    RP_ENTITY_ID validation errors.
+    """
+    records = list(iter_document_records(RESULTS, ERRORS, "feed.jsonl"))
+
+    assert [record["document_id"] for record in records] == [
+        "DOC2",
+        "DOC3",
+        "DOC1",
+        "DOC4",
+        "DOC5",
+    ]
+    assert all(record["file"] == "feed.jsonl" for record in records)
+    assert records[0]["missing_indices"] == [1, 4]
+    assert records[0]["late_records"] == 3
+    assert records[1]["identical_duplicates"] == [{"index": "5", "count": 2}]
+    assert records[2] == {
+        "file": "feed.jsonl",
+        "document_id": "DOC1",
+        "missing_indices": [],
+        "identical_duplicates": [],
+        "different_duplicates": [{"index": 2, "count": 1}],
+        "invalid_type_errors": ["Expected: int, Found: str for index: x"],
+        "out_of_range_indices": [0, 9],
+        "late_records": 0,
+        "previous_status": None,
+        "status": None,
+        "rp_entity_id_errors": [{"rp_entity_id": "BAD", "index": 2}],
+    }
+    assert (records[3]["previous_status"], records[3]["status"]) == (None, "incomplete")
+    assert records[4]["rp_entity_id_errors"] == [
+        {"rp_entity_id": None, "index": 1},
+        {"rp_entity_id": "WORSE", "index": 3},
+    ]
+
+
+def test_write_results_jsonl(tmp_path):
+    """
+    Tests that the records are written as JSON lines, replacing the file of a previous run.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    output_directory = str(tmp_path / "results")
+    write_results(RESULTS, [], "feed.jsonl", output_directory)
+    output_path = write_results(RESULTS, ERRORS, "feed.jsonl", output_directory)
+
+    assert output_path == os.path.join(output_directory, "feed.jsonl_results.jsonl")
+    with open(output_path, encoding="utf-8") as output_file:
+        records = [json.loads(line) for line in output_file]
+    assert records == json.loads(
+        json.dumps(list(iter_document_records(RESULTS, ERRORS, "feed.jsonl")))
+    )
+    assert os.listdir(output_directory) == ["feed.jsonl_results.jsonl"]
+
+
+@pytest.mark.parametrize("installed", [True, False])
+def test_write_results_jsonl_with_large_integers(tmp_path, monkeypatch, installed):
+    """
+    Tests that values orjson can't serialize, like integers beyond 64 bits, are written like
+    the other values, with or without orjson.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Hides orjson.
+        installed (bool): Whether orjson is used when it's installed.
+    """
+    if not installed:
+        monkeypatch.setattr(results_output, "orjson", None)
+    results = dict(RESULTS, identical_duplicates={"DOC3": {2**70: 1}})
+    errors = [(2**70, "DOC5", 1)]
+
+    output_path = write_results(results, errors, "feed.jsonl", str(tmp_path))
+
+    with open(output_path, encoding="utf-8") as output_file:
+        records = [json.loads(line) for line in output_file]
+    assert records == json.loads(
+        json.dumps(list(iter_document_records(results, errors, "feed.jsonl")))
+    )
+    assert records[-1]["rp_entity_id_errors"] == [{"rp_entity_id": 2**70, "index": 1}]
+
+
+def test_check_results_format(monkeypatch):
+    """
+    Tests that unknown formats are refused, and Parquet without PyArrow.
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Hides PyArrow.
+    """
+    check_results_format("jsonl")
+    with pytest.raises(ValueError):
+        check_results_format("csv")
+
+    monkeypatch.setattr(results_output, "pq", None)
+    with pytest.raises(ImportError):
+        write_results(RESULTS, ERRORS, "feed.jsonl", "unused", "parquet")
+
+
+def test_write_results_parquet(tmp_path, monkeypatch):
+    """
+    Tests that the records are written as a Parquet file, in row groups of RESULTS_BATCH_SIZE
+    records, with the raw indices as strings.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Shrinks RESULTS_BATCH_SIZE.
+    """
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(results_output, "RESULTS_BATCH_SIZE", 2)
+
+    output_path = write_results(RESULTS, ERRORS, "feed.jsonl", str(tmp_path), "parquet")
+    parquet_file = pq.ParquetFile(output_path)
+    rows = parquet_file.read().to_pylist()
+
+    assert parquet_file.num_row_groups == 3
+    assert [row["document_id"] for row in rows] == ["DOC2", "DOC3", "DOC1", "DOC4", "DOC5"]
+    assert rows[2]["out_of_range_indices"] == ["0", "9"]
+    assert rows[2]["different_duplicates"] == [{"index": "2", "count": 1}]
+    assert rows[4]["rp_entity_id_errors"][0] == {"rp_entity_id": None, "index": "1"}
+
+
+RAW_RESULTS = {
+    "distinct_stories_count": 2,
+    "missing": {7: [2]},
+    "identical_duplicates": {True: {"3": 2}},
+    "different_duplicates": {},
+    "indexing_errors": {
+        "invalid_document_ids": [{"RP_DOCUMENT_ID": None, "RP_ENTITY_ID": "ABC"}],
+        7: {"out_of_range": [9]},
+    },
+}
+RAW_ERRORS = [(None, None, 1.0), ("123", 7, "2"), ("BAD", True, None)]
+
+
+def test_iter_document_records_with_invalid_document_ids():
+    """
+    Tests that the list of invalid document IDs in the indexing errors isn't mistaken for a
+    document, and that raw values are kept as they are.
+    """
+    records = list(iter_document_records(RAW_RESULTS, RAW_ERRORS, "feed.jsonl"))
+
+    assert [record["document_id"] for record in records] == [7, True, None]
+    assert records[0]["out_of_range_indices"] == [9]
+    assert records[0]["rp_entity_id_errors"] == [{"rp_entity_id": "123", "index": "2"}]
+    assert records[2]["rp_entity_id_errors"] == [{"rp_entity_id": None, "index": 1.0}]
+
+
+def test_write_results_parquet_with_raw_values(tmp_path):
+    """
+    Tests that the values read as they were from the records are written as strings to
+    Parquet, None staying null.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    output_path = write_results(RAW_RESULTS, RAW_ERRORS, "feed.jsonl", str(tmp_path), "parquet")
+    rows = pq.read_table(output_path).to_pylist()
+
+    assert [row["document_id"] for row in rows] == ["7", "True", None]
+    assert rows[0]["out_of_range_indices"] == ["9"]
+    assert rows[0]["rp_entity_id_errors"] == [{"rp_entity_id": "123", "index": "2"}]
+    assert rows[1]["identical_duplicates"] == [{"index": "3", "count": 2}]
+    assert rows[1]["rp_entity_id_errors"] == [{"rp_entity_id": "BAD", "index": None}]
+    assert rows[2]["rp_entity_id_errors"] == [{"rp_entity_id": None, "index": "1.0"}]
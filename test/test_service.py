@@ -0,0 +1,226 @@
+"""
+This module contains tests for the analytics HTTP service.
+
+The service is imported the way it runs (see conftest.py), and served on a free port by a
+thread of the test process.
+"""
+
+import http.client
+import io
+import json
+import threading
+import zipfile
+import pytest
+import service
+from pipeline import analyze_records
+
+RECORDS = [
+    {
+        "RP_DOCUMENT_ID": "DOC1",
+        "RP_ENTITY_ID": "ABC123",
+        "DOCUMENT_RECORD_INDEX": 1,
+        "DOCUMENT_RECORD_COUNT": 2,
+    },
+    {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+    {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+]
+BODY = b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in RECORDS) + b"{bad\n"
+
+
+def expected_response():
+    """
+    Builds the response expected for BODY, as decoded from JSON.
+
+    Returns:
+        dict: The results, validation errors and parse errors of BODY.
+    """
+    results, errors = analyze_records(record for record in RECORDS)
+    return json.loads(
+        json.dumps(
+            {
+                "results": results,
+                "validation_errors": [
+                    {
+                        "rp_entity_id": rp_entity_id,
+                        "rp_document_id": document_id,
+                        "document_index": index,
+                    }
+                    for rp_entity_id, document_id, index in errors
+                ],
+            }
+        )
+    )
+
+
+def zip_archive(members):
+    """
+    Builds a ZIP archive, which the service reads like a .rar archive.
+
+    Args:
+        members (dict): The content of every member, by member name.
+
+    Returns:
+        bytes: The archive.
+    """
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        for member, content in members.items():
+            archive.writestr(member, content)
+    return data.getvalue()
+
+
+@pytest.fixture
+def server_port():
+    """
+    Fixture serving an AnalyticsServer on a free port, from a background thread.
+
+    Yields:
+        int: The port of the server.
+    """
+    server = service.AnalyticsServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_port
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def request(port, method, path, body=None, headers=None):
+    """
+    Sends a request to the server, and reads its JSON response.
+
+    Args:
+        port (int): The port of the server.
+        method (str): The HTTP method.
+        path (str): The path of the request.
+        body (bytes, optional): The request body, sent with its Content-Length, or chunked
+            when it's an iterable.
+        headers (dict, optional): The request headers.
+
+    Returns:
+        tuple: The status code and the decoded JSON body of the response.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        assert response.getheader("Content-Type") == "application/json"
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_analyze_request_body():
+    """
+    Tests that a JSON lines body is analyzed, with its unparsable lines reported.
+    """
+    response = service.analyze_request_body(io.BufferedReader(io.BytesIO(BODY)))
+
+    assert json.loads(json.dumps(response)) == dict(
+        expected_response(),
+        parse_errors=[{"line": "{bad", "error": response["parse_errors"][0]["error"]}],
+    )
+    assert response["validation_errors"][0] == {
+        "rp_entity_id": None,
+        "rp_document_id": "DOC2",
+        "document_index": 1,
+    }
+
+
+def test_analyze_json_lines(server_port):
+    """
+    Tests that a JSON lines body is answered with its results, validation errors and parse
+    errors, sent with a Content-Length or chunked.
+
+    Args:
+        server_port (int): The port of the server.
+    """
+    status, response = request(server_port, "POST", "/analyze", BODY)
+
+    assert status == 200
+    assert set(response) == {"results", "validation_errors", "parse_errors"}
+    assert {key: response[key] for key in ("results", "validation_errors")} == expected_response()
+    assert [error["line"] for error in response["parse_errors"]] == ["{bad"]
+
+    chunked_status, chunked_response = request(
+        server_port, "POST", "/analyze", iter([BODY[:10], BODY[10:]])
+    )
+    assert (chunked_status, chunked_response) == (status, response)
+
+
+def test_analyze_archive(server_port):
+    """
+    Tests that an archive body is spooled to a file and every member is analyzed.
+
+    Args:
+        server_port (int): The port of the server.
+    """
+    body = zip_archive({"first.jsonl": BODY[: BODY.index(b"\n") + 1], "second.jsonl": BODY})
+    lines = BODY.splitlines(keepends=True)
+    records = [RECORDS[0]] + [json.loads(line) for line in lines[:3]]
+    results, _ = analyze_records(record for record in records)
+
+    status, response = request(server_port, "POST", "/analyze", body)
+
+    assert status == 200
+    assert response["results"] == json.loads(json.dumps(results))
+    assert len(response["validation_errors"]) == 2
+    assert len(response["parse_errors"]) == 1
+
+
+def test_client_errors(server_port):
+    """
+    Tests that a body without a length is answered with 411, and an unreadable archive with
+    400.
+
+    Args:
+        server_port (int): The port of the server.
+    """
+    connection = http.client.HTTPConnection("127.0.0.1", server_port, timeout=10)
+    try:
+        connection.putrequest("POST", "/analyze")
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 411
+        assert "Content-Length" in json.loads(response.read())["error"]
+    finally:
+        connection.close()
+
+    status, response = request(server_port, "POST", "/analyze", b"PK\x03\x04not an archive")
+    assert status == 400
+    assert response["error"].startswith("FileNotFoundError: ")
+
+
+def test_server_error(server_port, monkeypatch):
+    """
+    Tests that an unexpected error is answered with 500, and the server keeps serving.
+
+    Args:
+        server_port (int): The port of the server.
+        monkeypatch (pytest.MonkeyPatch): Makes the analysis fail.
+    """
+
+    def fail(records):  # pylint: disable=unused-argument
+        raise RuntimeError("analysis failed")
+
+    monkeypatch.setattr(service, "analyze_records", fail)
+    assert request(server_port, "POST", "/analyze", BODY) == (
+        500,
+        {"error": "RuntimeError: analysis failed"},
+    )
+
+    monkeypatch.undo()
+    assert request(server_port, "POST", "/analyze", BODY)[0] == 200
+
+
+def test_health_and_unknown_paths(server_port):
+    """
+    Tests the health check, and that unknown paths are answered with 404.
+
+    Args:
+        server_port (int): The port of the server.
+    """
+    assert request(server_port, "GET", "/health") == (200, {"status": "ok"})
+    assert request(server_port, "GET", "/missing")[0] == 404
+    assert request(server_port, "POST", "/missing", BODY)[0] == 404
@@ -0,0 +1,139 @@
+"""
+This module contains tests for the state_store helper functions.
+"""
+
+from test.sample_data.processor_sample_data.process_analytics_sample_data import (
+    process_analytics_sample_data,
+)
+import pickle
+import pytest
+from src.document_processor import DataProcessor
+from src.helpers.state_store import (
+    document_statuses,
+    load_checkpoint,
+    load_state,
+    save_checkpoint,
+    save_state,
+    status_changes,
+)
+from src.utils.validation import RecordValidator
+
+
+@pytest.mark.parametrize("scenario", list(process_analytics_sample_data.keys()))
+def test_results_across_saved_states(scenario, tmp_path):
+    """
+    Tests that processing the records in two runs, with the state saved in between, gives the
+    same results as processing all of them at once.
+
+    Args:
+        scenario (str): The scenario name to test.
+        tmp_path (Path): The pytest temporary directory.
+    """
+    sample_data = process_analytics_sample_data[scenario]["sample_data"]
+    expected_results = process_analytics_sample_data[scenario]["expected_results"]
+    state_path = str(tmp_path / "state.pickle")
+
+    splits = {0, 1, len(sample_data) // 2, max(len(sample_data) - 1, 0), len(sample_data)}
+    for split in sorted(splits):
+        first_run = DataProcessor([], compact=True)
+        assert not load_state(first_run, state_path)
+        for record in sample_data[:split]:
+            first_run.process_record(record)
+        save_state(first_run, state_path)
+
+        second_run = DataProcessor([], compact=True)
+        assert load_state(second_run, state_path)
+        for record in sample_data[split:]:
+            second_run.process_record(record)
+        assert second_run.finalize_analytics() == expected_results, f"Failed on '{scenario}'"
+
+        (tmp_path / "state.pickle").unlink()
+
+
+def test_status_changes(tmp_path):
+    """
+    Tests that the documents completed or first seen by a run are reported.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    state_path = str(tmp_path / "state.pickle")
+    first_run = DataProcessor([])
+    for record in [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC2", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC3", "DOCUMENT_RECORD_INDEX": "x"},
+    ]:
+        first_run.process_record(record)
+    save_state(first_run, state_path)
+
+    second_run = DataProcessor([])
+    load_state(second_run, state_path)
+    before = document_statuses(second_run)
+    assert before == {"DOC1": "incomplete", "DOC2": "incomplete", "DOC3": "no_count"}
+
+    for record in [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 2, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "DOC4", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 1},
+    ]:
+        second_run.process_record(record)
+    assert status_changes(before, document_statuses(second_run)) == {
+        "DOC1": ("incomplete", "complete"),
+        "DOC4": (None, "complete"),
+    }
+
+
+def test_load_state_rejects_other_settings(tmp_path):
+    """
+    Tests that snapshots saved with another duplicate comparison or version aren't loaded.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    state_path = str(tmp_path / "state.pickle")
+    save_state(DataProcessor([], store_digests=True), state_path)
+    with pytest.raises(ValueError):
+        load_state(DataProcessor([]), state_path)
+
+    with open(state_path, "wb") as state_file:
+        pickle.dump({"version": 0}, state_file)
+    with pytest.raises(ValueError):
+        load_state(DataProcessor([], store_digests=True), state_path)
+
+
+def test_checkpoint_round_trip(tmp_path):
+    """
+    Tests that a checkpoint restores the processor, its validation errors and the offset,
+    and that it's refused for another file.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    source_path = tmp_path / "feed.jsonl"
+    source_path.write_text("{}\n")
+    checkpoint_path = str(tmp_path / "checkpoint.pickle")
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+        {"RP_DOCUMENT_ID": "", "RP_ENTITY_ID": "ABC123"},
+        {"RP_DOCUMENT_ID": "DOC1", "DOCUMENT_RECORD_INDEX": 1, "DOCUMENT_RECORD_COUNT": 2},
+    ]
+    uninterrupted = DataProcessor([], validator=RecordValidator())
+    uninterrupted.process_stream(records)
+
+    first_run = DataProcessor([], validator=RecordValidator())
+    assert load_checkpoint(first_run, checkpoint_path, str(source_path)) is None
+    first_run.process_record(records[0])
+    first_run.process_record(records[1])
+    save_checkpoint(first_run, checkpoint_path, str(source_path), 42, {"DOC1": "incomplete"})
+
+    resumed = DataProcessor([], validator=RecordValidator())
+    checkpoint = load_checkpoint(resumed, checkpoint_path, str(source_path))
+    assert checkpoint == (42, {"DOC1": "incomplete"})
+    resumed.process_record(records[2])
+    assert resumed.finalize_analytics() == uninterrupted.results
+    assert resumed.validation_errors == uninterrupted.validation_errors
+    assert ("", None, None) in resumed.validation_errors
+
+    source_path.write_text("{}\n{}\n")
+    with pytest.raises(ValueError):
+        load_checkpoint(DataProcessor([]), checkpoint_path, str(source_path))
@@ -14,10 +14,17 @@ from test.sample_data.validator_sample_data.validate_rp_document_id_sample_data
 from test.sample_data.validator_sample_data.validate_rp_entity_ids_sample_data import (
     validate_rp_entity_ids_sample_data,
 )
+import json
 import pytest
+from src.helpers.columnar import batch_records, validate_record_batch
+from src.helpers.projection import decode_projected_line
 from src.utils.validation import (
+    DEFAULT_RULES,
+    RecordValidator,
+    ValidationRule,
     validate_rp_document_id,
     validate_rp_entity_ids,
+    validate_rp_entity_id,
     check_missing_rp_entity_id,
     validate_rp_entity_id_format,
 )
@@ -95,3 +102,116 @@ def test_validate_rp_entity_ids(scenario):
     expected_result = validate_rp_entity_ids_sample_data[scenario]["expected_result"]
     result = validate_rp_entity_ids(sample_data)
     assert result == expected_result, f"Failed for scenario: {scenario}"
+
+
+@pytest.mark.parametrize("scenario", list(validate_rp_entity_ids_sample_data.keys()))
+def test_validate_rp_entity_id(scenario):
+    """
+    Tests that validating the records one at a time with validate_rp_entity_id gives the
+    same errors as validate_rp_entity_ids.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = validate_rp_entity_ids_sample_data[scenario]["sample_data"]
+    expected_result = validate_rp_entity_ids_sample_data[scenario]["expected_result"]
+    result = [validate_rp_entity_id(record) for record in sample_data]
+    assert [error for error in result if error] == expected_result, f"Failed for scenario: {scenario}"
+
+
+@pytest.mark.parametrize("scenario", list(validate_rp_entity_ids_sample_data.keys()))
+def test_validate_rp_entity_ids_with_projected_records(scenario):
+    """
+    Tests that validate_rp_entity_ids gives the same errors on projected records.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = validate_rp_entity_ids_sample_data[scenario]["sample_data"]
+    expected_result = validate_rp_entity_ids_sample_data[scenario]["expected_result"]
+    records = [decode_projected_line(json.dumps(record)) for record in sample_data]
+    assert validate_rp_entity_ids(records) == expected_result, f"Failed for scenario: {scenario}"
+
+
+@pytest.mark.parametrize("scenario", list(validate_rp_entity_ids_sample_data.keys()))
+def test_validate_record_batch(scenario):
+    """
+    Tests that validating columnar batches gives the same errors as validate_rp_entity_ids.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    pytest.importorskip("numpy")
+    sample_data = validate_rp_entity_ids_sample_data[scenario]["sample_data"]
+    expected_result = validate_rp_entity_ids_sample_data[scenario]["expected_result"]
+    for batch_size in (1, 3, len(sample_data) or 1):
+        result = [
+            error for batch in batch_records(sample_data, batch_size)
+            for error in validate_record_batch(batch)
+        ]
+        assert result == expected_result, f"Failed for scenario: {scenario}"
+
+
+@pytest.mark.parametrize("scenario", list(validate_rp_entity_ids_sample_data.keys()))
+def test_record_validator(scenario):
+    """
+    Tests that RecordValidator gives the same errors as validate_rp_entity_id, in bulk and
+    one record at a time.
+
+    Args:
+        scenario (str): The scenario name to test.
+    """
+    sample_data = validate_rp_entity_ids_sample_data[scenario]["sample_data"]
+    expected_result = validate_rp_entity_ids_sample_data[scenario]["expected_result"]
+    validator = RecordValidator()
+    assert validator.validate(sample_data) == expected_result, f"Failed for scenario: {scenario}"
+    assert [
+        validator.validate_record(record) for record in sample_data
+    ] == [validate_rp_entity_id(record) for record in sample_data]
+
+
+def test_record_validator_rules():
+    """
+    Tests that registered rules read their own fields, run in order, and that only the
+    failures of short-circuiting rules skip the next rules.
+    """
+    records = [
+        {"RP_DOCUMENT_ID": "DOC1", "RP_ENTITY_ID": "ABC123", "DOCUMENT_RECORD_INDEX": 1},
+        {"RP_DOCUMENT_ID": "DOC1", "RP_ENTITY_ID": "abc", "DOCUMENT_RECORD_INDEX": 2},
+        {"RP_DOCUMENT_ID": None, "DOCUMENT_RECORD_INDEX": 3, "RELEVANCE": 101},
+        {"RP_DOCUMENT_ID": "DOC2", "RP_ENTITY_ID": "ABC123", "RELEVANCE": -1},
+    ]
+    relevance_rule = ValidationRule(
+        "relevance",
+        ["RELEVANCE"],
+        lambda relevance: None if relevance is None or 0 <= relevance <= 100 else (relevance,),
+        short_circuit=False,
+    )
+    index_rule = ValidationRule(
+        "index",
+        ["DOCUMENT_RECORD_INDEX"],
+        lambda index: ("no index",) if index is None else None,
+    )
+
+    validator = RecordValidator([relevance_rule, *DEFAULT_RULES], timing=True)
+    validator.register(index_rule)
+    assert validator.fields == (
+        "RELEVANCE", "RP_ENTITY_ID", "RP_DOCUMENT_ID", "DOCUMENT_RECORD_INDEX"
+    )
+    assert validator.validate(records) == [
+        ("abc", "DOC1", 2),
+        (101,),
+        (None, None, 3),
+        (-1,),
+        ("no index",),
+    ]
+    assert validator.counters["relevance"]["checks"] == 4
+    assert validator.counters["relevance"]["errors"] == 2
+    assert validator.counters["rp_document_id"]["errors"] == 1
+    assert validator.counters["missing_rp_entity_id"]["checks"] == 3
+    assert validator.counters["rp_entity_id_format"]["errors"] == 1
+    assert validator.counters["index"]["checks"] == 2
+    assert validator.counters["index"]["seconds"] >= 0
+
+    with pytest.raises(ValueError):
+        validator.register(index_rule)
@@ -0,0 +1,116 @@
+"""
+This module contains tests for the watcher helper classes.
+"""
+
+import json
+import os
+from src.helpers.watcher import DirectoryWatcher, WatchMetrics, percentile
+
+
+def test_directory_watcher_reports_settled_files(tmp_path):
+    """
+    Tests that files are reported once they stopped changing, at most `limit` at a time, and
+    again after they changed.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    watcher = DirectoryWatcher(str(tmp_path), settle_seconds=0)
+    assert watcher.poll() == []
+
+    for name in ("a.jsonl", "b.jsonl", "c.jsonl"):
+        (tmp_path / name).write_text("{}\n")
+    # First seen: not ready until a poll finds them unchanged
+    assert watcher.poll() == []
+
+    (tmp_path / "c.jsonl").write_text("{}\n{}\n")
+    assert watcher.poll(limit=1) == [(str(tmp_path / "a.jsonl"), 3)]
+    assert watcher.poll() == [(str(tmp_path / "b.jsonl"), 3), (str(tmp_path / "c.jsonl"), 6)]
+    assert watcher.poll() == []
+
+    (tmp_path / "a.jsonl").write_text("{}\n{}\n{}\n")
+    assert watcher.poll() == []
+    assert watcher.poll() == [(str(tmp_path / "a.jsonl"), 9)]
+
+
+def test_directory_watcher_waits_for_settle_seconds(tmp_path):
+    """
+    Tests that a file isn't reported before it stayed unchanged for `settle_seconds`.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    watcher = DirectoryWatcher(str(tmp_path / "*.jsonl"), settle_seconds=3600)
+    (tmp_path / "a.jsonl").write_text("{}\n")
+    assert watcher.poll() == []
+    assert watcher.poll() == []
+    assert str(tmp_path / "a.jsonl") in watcher.pending
+
+
+def test_directory_watcher_forgets_removed_files(tmp_path):
+    """
+    Tests that the files removed since they were reported are forgotten, and reported again
+    if they come back, while a missing directory forgets nothing.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    watched_directory = tmp_path / "in"
+    watched_directory.mkdir()
+    watcher = DirectoryWatcher(str(watched_directory), settle_seconds=0)
+    for name in ("a.jsonl", "b.jsonl"):
+        (watched_directory / name).write_text("{}\n")
+    watcher.poll()
+    assert len(watcher.poll()) == 2
+
+    (watched_directory / "a.jsonl").unlink()
+    assert watcher.poll() == []
+    assert list(watcher.reported) == [str(watched_directory / "b.jsonl")]
+
+    (watched_directory / "a.jsonl").write_text("{}\n")
+    watcher.poll()
+    assert watcher.poll() == [(str(watched_directory / "a.jsonl"), 3)]
+
+    watched_directory.rename(tmp_path / "moved")
+    assert watcher.poll() == []
+    (tmp_path / "moved").rename(watched_directory)
+    assert watcher.poll() == []
+    assert len(watcher.reported) == 2
+
+
+def test_watch_metrics(tmp_path):
+    """
+    Tests the counters, throughput and latency percentiles of WatchMetrics, and that they're
+    written as JSON.
+
+    Args:
+        tmp_path (Path): The pytest temporary directory.
+    """
+    metrics = WatchMetrics()
+    metrics.record({"file": "a", "error": None, "seconds": 2.0}, 1000, 2.5)
+    metrics.record({"file": "b", "error": "ValueError: bad", "seconds": 0.0}, 10, 0.5)
+    metrics.record({"file": "c", "error": None, "seconds": 3.0}, 2000, 4.0)
+
+    metrics_path = str(tmp_path / "metrics.json")
+    metrics.write(metrics_path)
+    with open(metrics_path) as metrics_file:
+        snapshot = json.load(metrics_file)
+
+    assert snapshot["files_processed"] == 3
+    assert snapshot["files_failed"] == 1
+    assert snapshot["bytes_processed"] == 3010
+    assert snapshot["bytes_per_second"] == 3010 / 5.0
+    assert snapshot["latency_seconds"] == {"p50": 2.5, "p95": 4.0, "max": 4.0}
+    assert snapshot["last_file"]["file"] == "c"
+    assert snapshot["last_file"]["bytes_per_second"] == 2000 / 3.0
+    assert not os.path.exists(f"{metrics_path}.tmp")
+
+
+def test_percentile():
+    """
+    Tests the nearest rank percentiles.
+    """
+    assert percentile([], 0.5) is None
+    assert percentile([1.0], 0.95) == 1.0
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 0.5) == 3.0
+    assert percentile(list(range(101)), 0.95) == 95